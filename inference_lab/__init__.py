@@ -1,20 +1,28 @@
 """Bidirectional inference toolkit supporting rule/fact management and graph rendering."""
 
-from .knowledge_base import KnowledgeBase
+from .knowledge_base import KnowledgeBase, RuleStore
+from .compact import CompactRuleStore
+from .compiled import CompiledRuleBase
 from .models import Rule
 from .results import ForwardResult, BackwardResult
 from .forward import run_forward_inference
 from .backward import run_backward_inference
+from .cache import InferenceCache, get_inference_cache
 from . import graphs
 from . import web
 
 __all__ = [
     "KnowledgeBase",
+    "RuleStore",
+    "CompactRuleStore",
+    "CompiledRuleBase",
     "Rule",
     "ForwardResult",
     "BackwardResult",
     "run_forward_inference",
     "run_backward_inference",
+    "InferenceCache",
+    "get_inference_cache",
     "graphs",
     "web",
 ]
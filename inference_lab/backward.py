@@ -3,36 +3,327 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Set
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
+from .compiled import CompiledRuleBase, compile_rules
 from .knowledge_base import KnowledgeBase
 from .models import Rule
-from .results import BackwardResult
+from .results import BackwardResult, ProofLog
 from .utils import ensure_choice, normalize_atom
 from . import graphs
 
 BACKWARD_INDEX_MODES = ("min", "max")
+BACKWARD_ENGINES = ("dfs", "tabled")
+BACKWARD_GOAL_MODES = ("sequential", "forest")
 
 
-def _build_lookup(rules: Sequence[Rule]) -> Dict[str, List[Rule]]:
-    mapping: Dict[str, List[Rule]] = {}
-    for rule in rules:
-        mapping.setdefault(rule.conclusion, []).append(rule)
-    return mapping
+class _GoalFrame:
+    """One goal being proved on the explicit stack of ``_GoalProver``."""
+
+    __slots__ = ("goal", "depth", "index", "rules", "rule_pos", "premise_pos", "cycle_floor")
+
+    def __init__(self, goal: str, depth: int, index: int, rules: Sequence[Rule]) -> None:
+        self.goal = goal
+        self.depth = depth
+        self.index = index
+        self.rules = rules
+        self.rule_pos = 0
+        self.premise_pos = -1  # -1: current rule not announced yet
+        # Lowest stack index of an ancestor whose cycle check pruned a branch
+        # below this frame; a failure is only final if it stays >= index.
+        self.cycle_floor = index
+
+
+class _GoalProver:
+    """Depth-first prover with an explicit goal stack.
+
+    The search order is that of a recursive DFS with cycle checks, but the
+    stack lives on the heap, so rule chains of any depth are fine. The
+    explanation is appended to ``events`` as plain tuples in ``ProofEvent``
+    field order and only rendered to text by ``ProofLog`` when read.
+
+    With ``tabled=True`` proven goals are reused from ``known`` and failed
+    goals are tabled in ``failed`` unless the failure relied on a cycle check
+    against a goal still being proved higher up the stack.
+    """
+
+    def __init__(
+        self,
+        compiled: CompiledRuleBase,
+        *,
+        mode: str,
+        tabled: bool,
+        known: Set[str],
+        used_rules: List[int],
+        events: List[tuple],
+    ) -> None:
+        self._compiled = compiled
+        self._descending = mode == "max"
+        self._tabled = tabled
+        self.known = known
+        self.used_rules = used_rules
+        self.events = events
+        self.proven: Set[str] = set()
+        self.failed: Set[str] = set()
+        self.stats: Dict[str, int] = (
+            {"proven_hits": 0, "failure_hits": 0, "tabled_failures": 0} if tabled else {}
+        )
+        self._stack: List[_GoalFrame] = []
+        self._visiting: Dict[str, int] = {}
+
+    def prove(self, goal: str, depth: int) -> bool:
+        outcome = self._enter(goal, depth)
+        if outcome is not None:
+            return outcome
+        emit = self.events.append
+        stack = self._stack
+        child: Optional[bool] = None
+        while True:
+            frame = stack[-1]
+            if child is not None:
+                rule = frame.rules[frame.rule_pos]
+                if child:
+                    frame.premise_pos += 1
+                else:
+                    premise = rule.premises[frame.premise_pos]
+                    emit(("drop_rule", premise, frame.depth, rule.id, None, 0))
+                    frame.rule_pos += 1
+                    frame.premise_pos = -1
+                child = None
+
+            if frame.rule_pos >= len(frame.rules):
+                child = self._leave(frame, False)
+                emit(("failed", frame.goal, frame.depth, None, False, 0))
+                if not stack:
+                    return False
+                continue
+
+            rule = frame.rules[frame.rule_pos]
+            if frame.premise_pos < 0:
+                emit(("try_rule", frame.goal, frame.depth, rule.id, None, 0))
+                frame.premise_pos = 0
+
+            if frame.premise_pos >= len(rule.premises):
+                self.known.add(frame.goal)
+                self.proven.add(frame.goal)
+                self.used_rules.append(rule.id)
+                emit(("proved", frame.goal, frame.depth, rule.id, True, 0))
+                child = self._leave(frame, True)
+                if not stack:
+                    return True
+                continue
+
+            premise = rule.premises[frame.premise_pos]
+            emit(("premise", premise, frame.depth, None, None, 0))
+            child = self._enter(premise, frame.depth + 2)
+
+    def _enter(self, goal: str, depth: int) -> Optional[bool]:
+        """Resolve ``goal`` immediately, or push a frame and return None."""
+
+        emit = self.events.append
+        if goal in self.known:
+            if self._tabled and goal in self.proven:
+                self.stats["proven_hits"] += 1
+            emit(("known", goal, depth, None, True, 0))
+            return True
+        if goal in self.failed:
+            self.stats["failure_hits"] += 1
+            emit(("tabled_failure", goal, depth, None, False, 0))
+            return False
+        if goal in self._visiting:
+            if self._tabled and self._stack:
+                parent = self._stack[-1]
+                parent.cycle_floor = min(parent.cycle_floor, self._visiting[goal])
+            emit(("cycle", goal, depth, None, False, 0))
+            return False
+
+        candidates = self._compiled.rules_concluding(goal)
+        if not candidates:
+            emit(("no_rules", goal, depth, None, False, 0))
+            return False
+
+        ordered = candidates[::-1] if self._descending else candidates
+        frame = _GoalFrame(goal, depth, len(self._stack), ordered)
+        self._visiting[goal] = frame.index
+        self._stack.append(frame)
+        emit(("expand", goal, depth, None, None, len(ordered)))
+        return None
+
+    def _leave(self, frame: _GoalFrame, success: bool) -> bool:
+        self._stack.pop()
+        del self._visiting[frame.goal]
+        if not success and self._tabled:
+            if frame.cycle_floor >= frame.index:
+                self.failed.add(frame.goal)
+                self.stats["tabled_failures"] += 1
+            elif self._stack:
+                parent = self._stack[-1]
+                parent.cycle_floor = min(parent.cycle_floor, frame.cycle_floor)
+        return success
+
+
+def _relevant_rules(
+    compiled: CompiledRuleBase, goals: Sequence[str], known: Set[str]
+) -> Tuple[Set[int], Set[int]]:
+    """Return atom codes and rule positions of the AND/OR graph below ``goals``.
+
+    Only atoms that are not already known are expanded, so the graph stops at
+    given facts.
+    """
+
+    atoms: Set[int] = set()
+    positions: Set[int] = set()
+    pending: List[int] = []
+    for goal in goals:
+        code = compiled.atoms.code(goal)
+        if code is not None and goal not in known and code not in atoms:
+            atoms.add(code)
+            pending.append(code)
+    while pending:
+        code = pending.pop()
+        for position in compiled.producers_of(code):
+            if position in positions:
+                continue
+            positions.add(position)
+            for premise in compiled.premises_of(position):
+                if premise not in atoms and compiled.atoms[premise] not in known:
+                    atoms.add(premise)
+                    pending.append(premise)
+    return atoms, positions
+
+
+def _prove_forest(
+    compiled: CompiledRuleBase,
+    goals: Sequence[str],
+    *,
+    mode: str,
+    known: Set[str],
+    used_rules: List[int],
+    events: List[tuple],
+) -> Tuple[Dict[str, bool], Dict[str, int]]:
+    """Decide every goal over one shared AND/OR proof graph.
+
+    The graph holds only rules reachable backwards from the goals. Its least
+    fixpoint is computed bottom-up with premise counters, round by round
+    (rules of a round in ``mode`` id order), and every derived atom keeps the
+    first rule that derived it as its justification. Because that rule's
+    premises were all derived in earlier rounds, justifications form a DAG
+    from which each goal's proof is read off; subproofs already explained for
+    an earlier goal are referenced instead of repeated.
+    """
+
+    given = set(known)
+    atoms, positions = _relevant_rules(compiled, goals, known)
+    remaining: Dict[int, int] = {}
+    ready: List[int] = []
+    for position in positions:
+        missing = sum(
+            1
+            for premise in compiled.premises_of(position)
+            if compiled.atoms[premise] not in known
+        )
+        remaining[position] = missing
+        if not missing:
+            ready.append(position)
+
+    justification: Dict[str, int] = {}
+    descending = mode == "max"
+    while ready:
+        ready.sort(reverse=descending)
+        next_ready: List[int] = []
+        for position in ready:
+            conclusion = compiled.atoms[compiled.conclusions[position]]
+            if conclusion in known:
+                continue
+            known.add(conclusion)
+            justification[conclusion] = position
+            for watcher in compiled.watchers_of(compiled.conclusions[position]):
+                if watcher in remaining:
+                    remaining[watcher] -= 1
+                    if not remaining[watcher]:
+                        next_ready.append(watcher)
+        ready = next_ready
+
+    status: Dict[str, bool] = {}
+    explained: Set[str] = set()
+    shared = 0
+    for goal in goals:
+        if goal in given:
+            status[goal] = True
+            events.append(("goal_given", goal, 0, None, True, 0))
+            continue
+        events.append(("goal_start", goal, 0, None, None, 0))
+        if goal not in justification:
+            status[goal] = False
+            events.append(("goal_failed", goal, 0, None, False, 0))
+            continue
+        status[goal] = True
+        # Post-order walk: premises are explained before the rule using them.
+        stack: List[Tuple[str, int, bool]] = [(goal, 1, False)]
+        while stack:
+            atom, depth, expanded = stack.pop()
+            if atom in given:
+                events.append(("known", atom, depth, None, True, 0))
+                continue
+            position = justification[atom]
+            rule_id = compiled.rule_ids[position]
+            if expanded:
+                explained.add(atom)
+                used_rules.append(rule_id)
+                events.append(("proved", atom, depth, rule_id, True, 0))
+                continue
+            if atom in explained:
+                shared += 1
+                events.append(("shared", atom, depth, rule_id, True, 0))
+                continue
+            stack.append((atom, depth, True))
+            premises = compiled.rules[position].premises
+            for premise in reversed(premises):
+                stack.append((premise, depth + 1, False))
+        events.append(("goal_done", goal, 0, None, True, 0))
+
+    stats = {
+        "relevant_atoms": len(atoms),
+        "relevant_rules": len(positions),
+        "derived_atoms": len(justification),
+        "shared_subproofs": shared,
+    }
+    return status, stats
 
 
 def run_backward_inference(
-    kb: KnowledgeBase,
+    kb: KnowledgeBase | CompiledRuleBase,
     *,
     goals: Iterable[str],
     index_mode: str = "min",
     initial_facts: Optional[Iterable[str]] = None,
     output_dir: Optional[Path] = None,
     make_graph: bool = True,
+    engine: str = "dfs",
+    goal_mode: str = "sequential",
 ) -> BackwardResult:
+    """Prove ``goals`` depth-first from the rules concluding each goal.
+
+    ``kb`` may be a ``CompiledRuleBase`` built once and reused across calls;
+    a plain ``KnowledgeBase`` is compiled on the fly.
+
+    Both engines run on ``_GoalProver``'s explicit stack. ``engine="tabled"``
+    additionally proves or refutes each subgoal at most once per run and
+    reports its cache hit counts in ``BackwardResult.cache_stats``.
+    ``BackwardResult.steps`` is a ``ProofLog`` rendered on first access.
+
+    ``goal_mode="sequential"`` proves the goals in order and stops at the
+    first failure. ``goal_mode="forest"`` decides every goal in one pass over
+    a shared proof graph (see ``_prove_forest``); ``engine`` is then unused.
+    Either way ``BackwardResult.goal_status`` maps each decided goal to its
+    outcome.
+    """
     mode = ensure_choice(index_mode, BACKWARD_INDEX_MODES, label="index_mode")
+    engine_name = ensure_choice(engine, BACKWARD_ENGINES, label="engine")
+    goal_mode_name = ensure_choice(goal_mode, BACKWARD_GOAL_MODES, label="goal_mode")
 
-    rules = list(kb.iter_rules())
+    compiled = compile_rules(kb)
+    rules = list(compiled.rules)
     if not rules:
         raise ValueError("Knowledge base has no rules.")
 
@@ -46,92 +337,64 @@ def run_backward_inference(
         else set(kb.facts)
     )
     used_rules: List[int] = []
-    steps: List[str] = []
-
-    rules_by_conclusion = _build_lookup(rules)
-    visiting: Set[str] = set()
-
-    def prove(goal: str, depth: int = 0) -> bool:
-        indent = "  " * depth
-        if goal in known:
-            steps.append(f"{indent}- Mục tiêu '{goal}' đã có trong tập tri thức.")
-            return True
-        if goal in visiting:
-            steps.append(f"{indent}- Phát hiện vòng lặp khi chứng minh '{goal}'.")
-            return False
-
-        candidates = rules_by_conclusion.get(goal, [])
-        if not candidates:
-            steps.append(f"{indent}- Không có luật nào kết luận '{goal}'.")
-            return False
-
-        ordered = sorted(
-            candidates,
-            key=lambda item: item.id,
-            reverse=(mode == "max"),
+    events: List[tuple] = []
+    goal_status: Dict[str, bool] = {}
+    if goal_mode_name == "forest":
+        goal_status, cache_stats = _prove_forest(
+            compiled,
+            goal_list,
+            mode=mode,
+            known=known,
+            used_rules=used_rules,
+            events=events,
         )
-        visiting.add(goal)
-        steps.append(
-            f"{indent}- Đang xét {len(ordered)} luật cho mục tiêu '{goal}' "
-            f"(ưu tiên: {mode})."
+    else:
+        prover = _GoalProver(
+            compiled,
+            mode=mode,
+            tabled=engine_name == "tabled",
+            known=known,
+            used_rules=used_rules,
+            events=events,
         )
-
-        for rule in ordered:
-            steps.append(f"{indent}  → Thử luật R{rule.id}: {rule.to_text()}")
-            success = True
-            for premise in rule.premises:
-                steps.append(f"{indent}    • Chứng minh tiền đề '{premise}'")
-                if not prove(premise, depth + 2):
-                    success = False
-                    steps.append(
-                        f"{indent}    x Không chứng minh được '{premise}' nên bỏ luật R{rule.id}."
-                    )
-                    break
-            if success:
-                known.add(goal)
-                used_rules.append(rule.id)
-                steps.append(
-                    f"{indent}  ✓ Mục tiêu '{goal}' được chứng minh nhờ R{rule.id}."
-                )
-                visiting.remove(goal)
-                return True
-
-        visiting.remove(goal)
-        steps.append(f"{indent}- Không chứng minh được '{goal}'.")
-        return False
-
-    overall_success = True
-    for top_goal in goal_list:
-        if top_goal in known:
-            steps.append(f"Mục tiêu '{top_goal}' đã thỏa từ đầu.")
-            continue
-        steps.append(f"\n=== BẮT ĐẦU CHỨNG MINH MỤC TIÊU '{top_goal}' ===")
-        if not prove(top_goal, depth=1):
-            overall_success = False
-            steps.append(f"!!! Thất bại khi chứng minh '{top_goal}'.")
-            break
-        steps.append(f"+++ Hoàn tất mục tiêu '{top_goal}'.")
+        for top_goal in goal_list:
+            if top_goal in known:
+                goal_status[top_goal] = True
+                events.append(("goal_given", top_goal, 0, None, True, 0))
+                continue
+            events.append(("goal_start", top_goal, 0, None, None, 0))
+            goal_status[top_goal] = prover.prove(top_goal, 1)
+            if not goal_status[top_goal]:
+                events.append(("goal_failed", top_goal, 0, None, False, 0))
+                break
+            events.append(("goal_done", top_goal, 0, None, True, 0))
+        cache_stats = prover.stats
 
     graph_files: Dict[str, Path] = {}
     if make_graph:
         out_dir = Path(output_dir or "inference_outputs")
         out_dir.mkdir(parents=True, exist_ok=True)
-        fpg_path = out_dir / "backward_fpg.svg"
-        rendered = graphs.render_fpg(
-            rules,
-            known_facts=known,
-            goal_facts=goal_list,
-            output=fpg_path,
-            given_facts=set(kb.facts),
+        graph_files = graphs.run_graph_tasks(
+            graphs.backward_graph_tasks(
+                rules,
+                known_facts=known,
+                goal_facts=goal_list,
+                given_facts=compiled.facts,
+                output_dir=out_dir,
+            )
         )
-        if rendered:
-            graph_files["fpg"] = rendered
 
     return BackwardResult(
-        success=overall_success and set(goal_list).issubset(known),
+        success=all(goal_status.get(goal, False) for goal in goal_list),
         goals=goal_list,
         final_known=sorted(known),
         used_rules=used_rules,
-        steps=steps,
+        steps=ProofLog(
+            events,
+            mode=mode,
+            rule_text=lambda rule_id: compiled.rule_by_id(rule_id).to_text(),
+        ),
         graph_files=graph_files,
+        cache_stats=cache_stats,
+        goal_status=goal_status,
     )
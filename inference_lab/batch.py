@@ -0,0 +1,194 @@
+"""Vectorised forward chaining over many fact sets at once.
+
+Each row of a boolean fact matrix is one patient / scenario; premise checks
+for every rule and every row are evaluated together with NumPy, one firing
+round at a time, until no row can derive anything new.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    NUMPY_AVAILABLE = False
+    np = None  # type: ignore[assignment]
+
+from .compiled import CompiledRuleBase, compile_rules
+from .knowledge_base import KnowledgeBase
+from .results import ForwardResult
+from .utils import normalize_atom
+
+
+def _require_numpy() -> None:
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("Batch inference requires NumPy (pip install numpy).")
+
+
+def encode_fact_sets(
+    compiled: CompiledRuleBase, fact_sets: Iterable[Iterable[str]]
+) -> "np.ndarray":
+    """Encode fact sets as a ``(rows, atoms)`` boolean matrix.
+
+    Facts that no rule mentions cannot influence inference and are dropped.
+    """
+
+    _require_numpy()
+    rows = [list(facts) for facts in fact_sets]
+    matrix = np.zeros((len(rows), len(compiled.atoms)), dtype=bool)
+    for row, facts in enumerate(rows):
+        for fact in facts:
+            code = compiled.atoms.code(normalize_atom(fact))
+            if code is not None:
+                matrix[row, code] = True
+    return matrix
+
+
+@dataclass
+class BatchForwardResult:
+    """Outcome of ``run_forward_batch``; one ``ForwardResult`` view per row.
+
+    Attributes:
+        compiled: Rule network the batch ran against.
+        goals: Normalised goal atoms (may be empty).
+        facts: ``(rows, atoms)`` boolean matrix of final facts.
+        fire_round: ``(rows, rules)`` matrix holding the round each rule fired
+            in, or ``-1`` if it never fired.
+        extra_facts: Per-row initial facts unknown to the rule network.
+    """
+
+    compiled: CompiledRuleBase
+    goals: List[str]
+    facts: "np.ndarray"
+    fire_round: "np.ndarray"
+    extra_facts: List[Set[str]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return int(self.facts.shape[0])
+
+    def __getitem__(self, row: int) -> ForwardResult:
+        atoms = self.compiled.atoms
+        known = {atoms[int(code)] for code in np.flatnonzero(self.facts[row])}
+        if self.extra_facts:
+            known |= self.extra_facts[row]
+
+        rounds = self.fire_round[row]
+        positions = np.flatnonzero(rounds >= 0)
+        # Rules are positioned in id order, so a stable sort by round keeps
+        # ids ascending within each round.
+        ordered = positions[np.argsort(rounds[positions], kind="stable")]
+        fired = [int(self.compiled.rule_ids[int(p)]) for p in ordered]
+
+        goals = list(self.goals)
+        return ForwardResult(
+            success=bool(goals) and set(goals).issubset(known),
+            goals=sorted(goals),
+            final_facts=sorted(known),
+            fired_rules=fired,
+            trace="none",
+        )
+
+    def __iter__(self) -> Iterator[ForwardResult]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def results(self) -> List[ForwardResult]:
+        return list(self)
+
+
+def run_forward_batch(
+    kb: KnowledgeBase | CompiledRuleBase,
+    fact_sets: "Iterable[Iterable[str]] | np.ndarray",
+    *,
+    goals: Iterable[str] = (),
+    extra_facts: Optional[List[Set[str]]] = None,
+) -> BatchForwardResult:
+    """Run forward chaining to the fixpoint for every row of ``fact_sets``.
+
+    ``fact_sets`` is either an iterable of fact collections or a boolean
+    matrix already encoded against ``kb`` (see ``encode_fact_sets``). With
+    a matrix, ``extra_facts`` may carry each row's facts that no rule
+    mentions so they still appear in ``final_facts``.
+
+    All rules enabled in a row fire together in one round, so unlike
+    ``run_forward_inference`` there is no THOA ordering and no early stop
+    once the goals are reached: ``final_facts`` is the full deductive
+    closure and ``fired_rules`` lists every rule that fired, round by round.
+    ``success`` is identical to the sequential engine's.
+    """
+
+    _require_numpy()
+    compiled = compile_rules(kb)
+    if not len(compiled):
+        raise ValueError("Knowledge base has no rules.")
+    goal_list = [normalize_atom(goal) for goal in goals if normalize_atom(goal)]
+
+    if isinstance(fact_sets, np.ndarray):
+        if fact_sets.ndim != 2 or fact_sets.shape[1] != len(compiled.atoms):
+            raise ValueError(
+                "Fact matrix must have shape (rows, atoms) matching the rule base."
+            )
+        facts = fact_sets.astype(bool, copy=True)
+        if extra_facts is not None:
+            if len(extra_facts) != facts.shape[0]:
+                raise ValueError("extra_facts needs one entry per matrix row.")
+            extra_facts = list(extra_facts)
+    else:
+        rows = [
+            {normalize_atom(fact) for fact in row if normalize_atom(fact)}
+            for row in fact_sets
+        ]
+        facts = encode_fact_sets(compiled, rows)
+        extra_facts = [
+            {fact for fact in row if fact not in compiled.atoms} for row in rows
+        ]
+
+    premises, conclusions, premise_counts, produces = _rule_matrices(compiled)
+    fire_round = np.full((facts.shape[0], len(compiled)), -1, dtype=np.int32)
+    active = np.arange(facts.shape[0])
+    round_no = 0
+    while active.size:
+        state = facts[active]
+        satisfied = state.astype(np.float32) @ premises.T
+        enabled = (
+            (satisfied == premise_counts)
+            & (fire_round[active] < 0)
+            & ~state[:, conclusions]
+        )
+        progressed = enabled.any(axis=1)
+        if not progressed.any():
+            break
+        active = active[progressed]
+        enabled = enabled[progressed]
+        fire_round[active] = np.where(enabled, round_no, fire_round[active])
+        derived = (enabled.astype(np.float32) @ produces) > 0
+        facts[active] |= derived
+        round_no += 1
+
+    return BatchForwardResult(
+        compiled=compiled,
+        goals=goal_list,
+        facts=facts,
+        fire_round=fire_round,
+        extra_facts=extra_facts or [],
+    )
+
+
+def _rule_matrices(
+    compiled: CompiledRuleBase,
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Return premise incidence, conclusion codes, premise counts and the
+    one-hot ``(rules, atoms)`` conclusion matrix."""
+
+    shape = (len(compiled), len(compiled.atoms))
+    premises = np.zeros(shape, dtype=np.float32)
+    for position in range(len(compiled)):
+        premises[position, list(compiled.premises_of(position))] = 1.0
+    conclusions = np.asarray(compiled.conclusions, dtype=np.intp)
+    produces = np.zeros(shape, dtype=np.float32)
+    produces[np.arange(len(compiled)), conclusions] = 1.0
+    return premises, conclusions, premises.sum(axis=1), produces
@@ -0,0 +1,141 @@
+"""Streaming, optionally parallel loading of large rule files."""
+
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Deque, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .models import Rule
+from .utils import parse_rule_text
+
+DEFAULT_CHUNK_LINES = 20_000
+
+ParsedRule = Tuple[Tuple[str, ...], str]
+
+
+class RuleLoadError(NamedTuple):
+    """A rule line that could not be parsed (1-based line number)."""
+
+    line: int
+    text: str
+    message: str
+
+
+@dataclass
+class BulkLoadReport:
+    """Outcome of a bulk rule load.
+
+    Attributes:
+        rules_loaded: Number of rules added to the knowledge base.
+        first_id / last_id: Id range assigned to them (``None`` if empty).
+        errors: Lines that were skipped, in file order.
+        lines: Number of lines read, including blank ones.
+        elapsed: Wall-clock seconds spent reading, parsing and indexing.
+    """
+
+    rules_loaded: int = 0
+    first_id: Optional[int] = None
+    last_id: Optional[int] = None
+    errors: List[RuleLoadError] = field(default_factory=list)
+    lines: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.rules_loaded} rule(s) from {self.lines} line(s), "
+            f"{len(self.errors)} error(s) in {self.elapsed:.2f}s"
+        )
+
+
+def iter_line_chunks(
+    stream: Iterable[str], *, chunk_lines: int = DEFAULT_CHUNK_LINES
+) -> Iterator[Tuple[int, List[str]]]:
+    """Yield ``(first_line_number, lines)`` chunks without reading ahead."""
+
+    iterator = iter(stream)
+    line_no = 1
+    while True:
+        chunk = list(islice(iterator, chunk_lines))
+        if not chunk:
+            return
+        yield line_no, chunk
+        line_no += len(chunk)
+
+
+def parse_rule_chunk(
+    job: Tuple[int, Sequence[str]],
+) -> Tuple[List[ParsedRule], List[RuleLoadError]]:
+    """Parse one chunk of rule lines; runs in worker processes.
+
+    Blank lines are skipped; malformed lines become ``RuleLoadError`` entries
+    instead of aborting the chunk.
+    """
+
+    first_line, lines = job
+    parsed: List[ParsedRule] = []
+    errors: List[RuleLoadError] = []
+    for offset, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        try:
+            premises, conclusion = parse_rule_text(stripped)
+        except ValueError as exc:
+            errors.append(RuleLoadError(first_line + offset, stripped, str(exc)))
+            continue
+        # dict.fromkeys keeps first occurrences, like Rule.from_parts.
+        parsed.append((tuple(dict.fromkeys(premises)), conclusion.strip()))
+    return parsed, errors
+
+
+def parse_rule_stream(
+    stream: Iterable[str],
+    *,
+    start_id: int,
+    workers: Optional[int] = None,
+    chunk_lines: int = DEFAULT_CHUNK_LINES,
+    report: Optional[BulkLoadReport] = None,
+) -> Iterator[Rule]:
+    """Parse ``stream`` into ``Rule`` objects numbered from ``start_id``.
+
+    Chunks are parsed on a process pool when ``workers`` (default: CPU
+    count) is above one, with at most two chunks per worker in flight.
+    Results are consumed in chunk order, so ids follow the line order and do
+    not depend on the number of workers. Errors and line counts are
+    accumulated into ``report``.
+    """
+
+    report = report if report is not None else BulkLoadReport()
+    worker_count = workers if workers is not None else (os.cpu_count() or 1)
+    next_id = start_id
+    for (parsed, errors), line_count in _parsed_chunks(stream, worker_count, chunk_lines):
+        report.lines += line_count
+        report.errors.extend(errors)
+        for premises, conclusion in parsed:
+            yield Rule(next_id, premises, conclusion)
+            next_id += 1
+
+
+def _parsed_chunks(
+    stream: Iterable[str], workers: int, chunk_lines: int
+) -> Iterator[Tuple[Tuple[List[ParsedRule], List[RuleLoadError]], int]]:
+    chunks = iter_line_chunks(stream, chunk_lines=chunk_lines)
+    if workers <= 1:
+        for chunk in chunks:
+            yield parse_rule_chunk(chunk), len(chunk[1])
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Tuple[Future, int]] = deque()
+        for chunk in chunks:
+            pending.append((pool.submit(parse_rule_chunk, chunk), len(chunk[1])))
+            if len(pending) >= 2 * workers:
+                future, size = pending.popleft()
+                yield future.result(), size
+        while pending:
+            future, size = pending.popleft()
+            yield future.result(), size
@@ -0,0 +1,262 @@
+"""Bounded LRU/TTL cache of inference results.
+
+Patients with the same answers produce the same initial facts, so a web
+endpoint can serve a repeated ``(knowledge base, facts, goals, options)``
+query from memory instead of chaining again. Entries are keyed by the
+knowledge base's identity and version, the frozenset of initial facts, the
+goals and the engine options. A ``KnowledgeBase`` whose rules change gets
+a new version, and its older entries are dropped on the next lookup. A
+knowledge base that is garbage collected (e.g. replaced by a reload) has
+its entries dropped as well.
+
+Only graph-free runs are cached. Cached results are shared between
+callers and must be treated as read-only.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from .backward import run_backward_inference
+from .compiled import CompiledRuleBase
+from .forward import run_forward_inference
+from .knowledge_base import KnowledgeBase
+from .results import BackwardResult, ForwardResult
+from .utils import normalize_atom
+
+_Key = Tuple[Hashable, ...]
+
+
+class InferenceCache:
+    """LRU cache of forward/backward results with an optional TTL.
+
+    Attributes:
+        max_entries: Entries kept before the least recently used is evicted.
+        ttl: Seconds an entry stays valid (``None``: until evicted).
+    """
+
+    def __init__(self, *, max_entries: int = 1024, ttl: Optional[float] = 600.0) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[_Key, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # id(kb) -> (weak reference, serial); knowledge bases are unhashable.
+        self._serials: Dict[int, Tuple[weakref.ref, int]] = {}
+        self._next_serial = itertools.count(1)
+        self._versions: Dict[int, Hashable] = {}
+        self._keys_by_serial: Dict[int, Set[_Key]] = {}
+        # Serials of collected knowledge bases; purged by the next operation
+        # rather than from the GC callback, which may run under our lock.
+        self._dead: List[Tuple[int, int]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # Cached engines
+    # ------------------------------------------------------------------
+    def forward(
+        self,
+        kb: KnowledgeBase | CompiledRuleBase,
+        *,
+        goals: Iterable[str],
+        strategy: str = "stack",
+        index_mode: str = "min",
+        initial_facts: Optional[Iterable[str]] = None,
+        agenda: str = "incremental",
+        trace: str = "none",
+    ) -> ForwardResult:
+        """``run_forward_inference`` without graphs, served from the cache."""
+
+        goals = list(goals)
+        facts = None if initial_facts is None else list(initial_facts)
+        return self._get_or_run(
+            kb,
+            ("forward", strategy, index_mode, agenda, trace),
+            goals,
+            facts,
+            lambda: run_forward_inference(
+                kb,
+                goals=goals,
+                strategy=strategy,
+                index_mode=index_mode,
+                initial_facts=facts,
+                agenda=agenda,
+                trace=trace,
+            ),
+        )
+
+    def backward(
+        self,
+        kb: KnowledgeBase | CompiledRuleBase,
+        *,
+        goals: Iterable[str],
+        index_mode: str = "min",
+        initial_facts: Optional[Iterable[str]] = None,
+        engine: str = "dfs",
+        goal_mode: str = "sequential",
+    ) -> BackwardResult:
+        """``run_backward_inference`` without a graph, served from the cache."""
+
+        goals = list(goals)
+        facts = None if initial_facts is None else list(initial_facts)
+        return self._get_or_run(
+            kb,
+            ("backward", index_mode, engine, goal_mode),
+            goals,
+            facts,
+            lambda: run_backward_inference(
+                kb,
+                goals=goals,
+                index_mode=index_mode,
+                initial_facts=facts,
+                make_graph=False,
+                engine=engine,
+                goal_mode=goal_mode,
+            ),
+        )
+
+    # ------------------------------------------------------------------
+    # Invalidation and reporting
+    # ------------------------------------------------------------------
+    def discard(self, kb: Any) -> int:
+        """Drop every entry of ``kb``; returns how many were dropped."""
+
+        with self._lock:
+            entry = self._serials.get(id(kb))
+            if entry is None or entry[0]() is not kb:
+                return 0
+            return self._drop_serial(entry[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_serial.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _get_or_run(
+        self,
+        kb: Any,
+        options: Tuple[str, ...],
+        goals: List[str],
+        facts: Optional[List[str]],
+        run: Callable[[], Any],
+    ) -> Any:
+        fact_key = frozenset(
+            filter(None, map(normalize_atom, kb.facts if facts is None else facts))
+        )
+        goal_key = tuple(filter(None, map(normalize_atom, goals)))
+        version = kb.version if isinstance(kb, KnowledgeBase) else None
+        with self._lock:
+            self._purge_dead()
+            serial = self._serial(kb)
+            if serial is None:
+                self.misses += 1
+        if serial is None:
+            return run()
+        with self._lock:
+            if self._versions.get(serial, version) != version:
+                self._drop_serial(serial)
+            self._versions[serial] = version
+            key = (serial, version, options, goal_key, fact_key)
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._forget(key)
+                self.expirations += 1
+            self.misses += 1
+
+        result = run()
+        expires = now + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            if self._versions.get(serial) == version:
+                self._entries[key] = (expires, result)
+                self._entries.move_to_end(key)
+                self._keys_by_serial.setdefault(serial, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._forget(next(iter(self._entries)))
+                    self.evictions += 1
+        return result
+
+    def _serial(self, kb: Any) -> Optional[int]:
+        entry = self._serials.get(id(kb))
+        if entry is not None and entry[0]() is kb:
+            return entry[1]
+        serial = next(self._next_serial)
+        dead = (id(kb), serial)
+        try:
+            ref = weakref.ref(kb, lambda _: self._dead.append(dead))
+        except TypeError:  # not weak-referenceable: never cached
+            return None
+        self._serials[id(kb)] = (ref, serial)
+        return serial
+
+    def _forget(self, key: _Key) -> None:
+        del self._entries[key]
+        keys = self._keys_by_serial.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+
+    def _drop_serial(self, serial: int) -> int:
+        keys = self._keys_by_serial.pop(serial, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def _purge_dead(self) -> None:
+        while self._dead:
+            key, serial = self._dead.pop()
+            entry = self._serials.get(key)
+            if entry is not None and entry[1] == serial:
+                del self._serials[key]
+            self._drop_serial(serial)
+            self._versions.pop(serial, None)
+
+
+_default_cache: Optional[InferenceCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_inference_cache(
+    *, max_entries: int = 1024, ttl: Optional[float] = 600.0
+) -> InferenceCache:
+    """Return the process-wide cache (created with the first call's limits)."""
+
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = InferenceCache(max_entries=max_entries, ttl=ttl)
+        return _default_cache
@@ -0,0 +1,374 @@
+"""Array-backed rule storage for very large knowledge bases."""
+
+from __future__ import annotations
+
+import sys
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .models import Rule
+
+
+class _CompactData:
+    """Packed rule columns shared by a ``CompactRuleStore`` and its forks.
+
+    Rule ``slot`` ``i`` has id ``ids[i]``, conclusion ``conclusions[i]`` and
+    premises ``premises[offsets[i]:offsets[i + 1]]`` (atom codes). Removed or
+    replaced rules leave a dead slot behind (``alive[i] == 0``).
+    """
+
+    __slots__ = (
+        "atoms",
+        "codes",
+        "ids",
+        "conclusions",
+        "offsets",
+        "premises",
+        "alive",
+        "_slots",
+        "mapped",
+        "owners",
+        "lock",
+    )
+
+    def __init__(self) -> None:
+        self.atoms: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self.ids = array("i")
+        self.conclusions = array("i")
+        self.offsets = array("i", [0])
+        self.premises = array("i")
+        self.alive = bytearray()
+        self._slots: Optional[Dict[int, int]] = {}
+        # Columns are read-only buffers (e.g. an mmap) until the first write.
+        self.mapped = False
+        self.owners = 1
+        self.lock = threading.Lock()
+
+    @property
+    def slots(self) -> Dict[int, int]:
+        """Rule id -> slot of its live rule (built on first use)."""
+
+        if self._slots is None:
+            alive = self.alive
+            self._slots = {
+                rule_id: slot for slot, rule_id in enumerate(self.ids) if alive[slot]
+            }
+        return self._slots
+
+    def copy(self) -> "_CompactData":
+        data = _CompactData()
+        data.atoms = list(self.atoms)
+        data.codes = dict(self.codes)
+        for name in ("ids", "conclusions", "offsets", "premises"):
+            column = array("i")
+            column.frombytes(memoryview(getattr(self, name)).cast("B"))
+            setattr(data, name, column)
+        data.alive = bytearray(self.alive)
+        data._slots = dict(self.slots)
+        return data
+
+    def acquire(self) -> None:
+        with self.lock:
+            self.owners += 1
+
+    def release(self) -> None:
+        with self.lock:
+            self.owners -= 1
+
+
+class _CompactViews:
+    """Id order and atom indexes derived from one version of the columns."""
+
+    __slots__ = ("order", "by_conclusion", "by_premise")
+
+    def __init__(self, data: _CompactData) -> None:
+        order = sorted(
+            (slot for slot in range(len(data.ids)) if data.alive[slot]),
+            key=data.ids.__getitem__,
+        )
+        self.order = array("i", order)
+        conclusion_buckets: Dict[int, array] = {}
+        premise_buckets: Dict[int, array] = {}
+        offsets, premises = data.offsets, data.premises
+        for slot in order:
+            code = data.conclusions[slot]
+            bucket = conclusion_buckets.get(code)
+            if bucket is None:
+                bucket = conclusion_buckets[code] = array("i")
+            bucket.append(slot)
+            for code in premises[offsets[slot] : offsets[slot + 1]]:
+                bucket = premise_buckets.get(code)
+                if bucket is None:
+                    bucket = premise_buckets[code] = array("i")
+                bucket.append(slot)
+        self.by_conclusion = conclusion_buckets
+        self.by_premise = premise_buckets
+
+
+class CompactRuleStore(Sequence[Rule]):
+    """Drop-in ``RuleStore`` replacement keeping rules as packed int arrays.
+
+    Atoms are interned once; premises of all rules live in a single flat
+    ``array('i')`` indexed by offsets, and ``Rule`` objects are only built
+    when a caller reads one. Edits append to the columns (a replaced rule
+    leaves a dead slot) and bump ``version``; the id order and the
+    conclusion/premise indexes are rebuilt on the first read after an edit,
+    which favours large, mostly-read knowledge bases.
+
+    ``fork()``/``snapshot()`` share the columns copy-on-write, exactly like
+    ``RuleStore``. ``memory_usage()`` reports the bytes held per component.
+    """
+
+    def __init__(self, rules: Iterable[Rule] = ()) -> None:
+        self._data = _CompactData()
+        self._lock = threading.RLock()
+        self._read_only = False
+        self._views: Optional[Tuple[int, _CompactViews]] = None
+        self.version = 0
+        with self._lock:
+            data = self._writable()
+            for rule in rules:
+                if rule.id in data.slots:
+                    raise ValueError(f"Rule id {rule.id} already exists.")
+                self._append(data, rule)
+
+    @classmethod
+    def from_columns(
+        cls,
+        *,
+        atoms: Sequence[str],
+        ids: Sequence[int],
+        conclusions: Sequence[int],
+        offsets: Sequence[int],
+        premises: Sequence[int],
+    ) -> "CompactRuleStore":
+        """Wrap packed ``int32`` buffers (e.g. ``memoryview``s of an mmap).
+
+        The buffers are used as they are for reading; the first edit copies
+        them into private arrays.
+        """
+
+        data = _CompactData()
+        data.atoms = list(atoms)
+        data.codes = {atom: code for code, atom in enumerate(data.atoms)}
+        data.ids, data.conclusions = ids, conclusions  # type: ignore[assignment]
+        data.offsets, data.premises = offsets, premises  # type: ignore[assignment]
+        data.alive = bytearray(b"\x01") * len(ids)
+        data._slots = None
+        data.mapped = True
+        store = cls()
+        store._data.release()
+        store._data = data
+        return store
+
+    def __del__(self) -> None:
+        data = getattr(self, "_data", None)
+        if data is not None:
+            data.release()
+
+    # Copy-on-write ----------------------------------------------------
+    def fork(self, *, read_only: bool = False) -> "CompactRuleStore":
+        store = CompactRuleStore.__new__(CompactRuleStore)
+        store._lock = threading.RLock()
+        store._read_only = read_only
+        with self._lock:
+            self._data.acquire()
+            store._data = self._data
+            store._views = self._views
+            store.version = self.version
+        return store
+
+    def snapshot(self) -> "CompactRuleStore":
+        return self.fork(read_only=True)
+
+    @property
+    def read_only(self) -> bool:
+        return self._read_only
+
+    def _writable(self) -> _CompactData:
+        """Return columns owned by this store alone; call with ``_lock`` held."""
+
+        if self._read_only:
+            raise RuntimeError("Rule store snapshot is read-only.")
+        data = self._data
+        with data.lock:
+            shared = data.owners > 1
+        if shared or data.mapped:
+            self._data = data.copy()
+            data.release()
+        self.version += 1
+        return self._data
+
+    # Column access ----------------------------------------------------
+    def _intern(self, data: _CompactData, atom: str) -> int:
+        code = data.codes.get(atom)
+        if code is None:
+            code = len(data.atoms)
+            data.atoms.append(sys.intern(atom))
+            data.codes[data.atoms[code]] = code
+        return code
+
+    def _append(self, data: _CompactData, rule: Rule) -> None:
+        data.slots[rule.id] = len(data.ids)
+        data.ids.append(rule.id)
+        data.conclusions.append(self._intern(data, rule.conclusion))
+        data.premises.extend(self._intern(data, premise) for premise in rule.premises)
+        data.offsets.append(len(data.premises))
+        data.alive.append(1)
+
+    def _rule(self, data: _CompactData, slot: int) -> Rule:
+        atoms = data.atoms
+        return Rule(
+            data.ids[slot],
+            tuple(
+                atoms[code]
+                for code in data.premises[data.offsets[slot] : data.offsets[slot + 1]]
+            ),
+            atoms[data.conclusions[slot]],
+        )
+
+    def _current(self) -> Tuple[_CompactData, _CompactViews]:
+        data = self._data
+        cached = self._views
+        if cached is not None and cached[0] == self.version:
+            return data, cached[1]
+        views = _CompactViews(data)
+        self._views = (self.version, views)
+        return data, views
+
+    # Sequence protocol (id order) ------------------------------------
+    def __len__(self) -> int:
+        data = self._data
+        if data._slots is None:
+            return data.alive.count(1)
+        return len(data._slots)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        data, views = self._current()
+        if isinstance(index, slice):
+            return tuple(self._rule(data, slot) for slot in views.order[index])
+        return self._rule(data, views.order[index])
+
+    def __iter__(self) -> Iterator[Rule]:
+        data, views = self._current()
+        for slot in views.order:
+            yield self._rule(data, slot)
+
+    def __contains__(self, item: object) -> bool:
+        if isinstance(item, Rule):
+            return self.has_id(item.id) and self.get(item.id) == item
+        return False
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CompactRuleStore({len(self)} rule(s), {len(self._data.atoms)} atom(s))"
+
+    # Mutation ---------------------------------------------------------
+    def add(self, rule: Rule) -> None:
+        with self._lock:
+            if rule.id in self._data.slots:
+                raise ValueError(f"Rule id {rule.id} already exists.")
+            self._append(self._writable(), rule)
+
+    def extend(self, rules: Iterable[Rule]) -> int:
+        """Add many rules as one edit (a single version bump); returns the count.
+
+        Nothing is added if any id is already present or repeated.
+        """
+
+        batch = list(rules)
+        with self._lock:
+            ids = {rule.id for rule in batch}
+            if len(ids) != len(batch) or any(i in self._data.slots for i in ids):
+                raise ValueError("Bulk rules contain duplicate or existing ids.")
+            data = self._writable()
+            for rule in batch:
+                self._append(data, rule)
+        return len(batch)
+
+    def replace(self, rule: Rule) -> Rule:
+        with self._lock:
+            previous = self.get(rule.id)
+            data = self._writable()
+            data.alive[data.slots[rule.id]] = 0
+            self._append(data, rule)
+            return previous
+
+    def remove(self, rule_id: int) -> Rule:
+        with self._lock:
+            rule = self.get(rule_id)
+            data = self._writable()
+            data.alive[data.slots.pop(rule_id)] = 0
+            return rule
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._read_only:
+                raise RuntimeError("Rule store snapshot is read-only.")
+            self._data.release()
+            self._data = _CompactData()
+            self.version += 1
+
+    # Lookups ----------------------------------------------------------
+    def get(self, rule_id: int) -> Rule:
+        data = self._data
+        try:
+            slot = data.slots[rule_id]
+        except KeyError as exc:
+            raise KeyError(f"Unknown rule id: {rule_id}") from exc
+        return self._rule(data, slot)
+
+    def has_id(self, rule_id: int) -> bool:
+        return rule_id in self._data.slots
+
+    def max_id(self) -> int:
+        return max(self._data.slots, default=0)
+
+    def concluding(self, atom: str) -> Tuple[Rule, ...]:
+        """Rules whose conclusion is ``atom``, in id order."""
+
+        data, views = self._current()
+        return self._bucket(data, views.by_conclusion, atom)
+
+    def with_premise(self, atom: str) -> Tuple[Rule, ...]:
+        """Rules that use ``atom`` as a premise, in id order."""
+
+        data, views = self._current()
+        return self._bucket(data, views.by_premise, atom)
+
+    def _bucket(
+        self, data: _CompactData, index: Dict[int, array], atom: str
+    ) -> Tuple[Rule, ...]:
+        code = data.codes.get(atom)
+        if code is None or code not in index:
+            return ()
+        return tuple(self._rule(data, slot) for slot in index[code])
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by the columns, atom table and id index."""
+
+        data = self._data
+        columns = sum(
+            column.buffer_info()[1] * column.itemsize
+            for column in (data.ids, data.conclusions, data.offsets, data.premises)
+        ) + sys.getsizeof(data.alive)
+        atoms = (
+            sys.getsizeof(data.atoms)
+            + sys.getsizeof(data.codes)
+            + sum(sys.getsizeof(atom) for atom in data.atoms)
+        )
+        usage = {
+            "rules": len(data.slots),
+            "atoms": len(data.atoms),
+            "columns_bytes": columns,
+            "atom_table_bytes": atoms,
+            "id_index_bytes": sys.getsizeof(data.slots),
+        }
+        usage["total_bytes"] = columns + atoms + usage["id_index_bytes"]
+        return usage
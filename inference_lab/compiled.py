@@ -0,0 +1,256 @@
+"""Integer-interned rule network compiled once from a knowledge base."""
+
+from __future__ import annotations
+
+from array import array
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .knowledge_base import KnowledgeBase
+from .models import Rule
+
+
+class AtomTable:
+    """Bidirectional mapping between atom strings and dense integer codes."""
+
+    def __init__(self, atoms: Iterable[str] = ()) -> None:
+        self._atoms: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for atom in atoms:
+            self.intern(atom)
+
+    def intern(self, atom: str) -> int:
+        code = self._codes.get(atom)
+        if code is None:
+            code = len(self._atoms)
+            self._atoms.append(atom)
+            self._codes[atom] = code
+        return code
+
+    def code(self, atom: str) -> Optional[int]:
+        return self._codes.get(atom)
+
+    def __getitem__(self, code: int) -> str:
+        return self._atoms[code]
+
+    def __len__(self) -> int:
+        return len(self._atoms)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._atoms)
+
+    def __contains__(self, atom: object) -> bool:
+        return atom in self._codes
+
+
+def _csr(buckets: Sequence[Sequence[int]]) -> Tuple[array, array]:
+    """Pack a list of integer lists into (offsets, values) arrays."""
+
+    offsets = array("i", [0])
+    values = array("i")
+    for bucket in buckets:
+        values.extend(bucket)
+        offsets.append(len(values))
+    return offsets, values
+
+
+class _LazyRules(Sequence[Rule]):
+    """``CompiledRuleBase.rules`` for buffer-backed bases: built on access."""
+
+    def __init__(self, compiled: "CompiledRuleBase") -> None:
+        self._compiled = compiled
+        self._cache: List[Optional[Rule]] = [None] * len(compiled.rule_ids)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        rule = self._cache[index]
+        if rule is None:
+            position = index if index >= 0 else index + len(self)
+            rule = self._cache[index] = self._compiled.build_rule(position)
+        return rule
+
+    def __iter__(self) -> Iterator[Rule]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+
+class CompiledRuleBase:
+    """Read-only rule network with atoms interned to ints.
+
+    Rules are addressed by their *position* (0..n-1, in rule id order).
+    Premises, conclusions and both lookup indexes are packed ``array('i')``
+    buffers, so a compiled base can be built once and shared by every
+    request that reasons over the same knowledge base.
+
+    Attributes:
+        atoms: Atom interning table.
+        rules: Original ``Rule`` objects in id order (for graphs and text).
+        facts: Given facts of the source knowledge base.
+        rule_ids: Rule id for each position.
+        premise_offsets / premise_atoms: CSR array of unique premise codes.
+        conclusions: Conclusion code for each position.
+        watch_offsets / watch_rules: atom code -> positions using it as premise.
+        producer_offsets / producer_rules: atom code -> positions concluding it.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Rule],
+        *,
+        facts: Iterable[str] = (),
+        name: str = "knowledge-base",
+    ) -> None:
+        self.name = name
+        self.rules: Tuple[Rule, ...] = tuple(sorted(rules, key=lambda rule: rule.id))
+        self.facts: FrozenSet[str] = frozenset(facts)
+        self.atoms = AtomTable()
+
+        premise_buckets: List[List[int]] = []
+        conclusions = array("i")
+        for rule in self.rules:
+            codes: List[int] = []
+            for premise in rule.premises:
+                code = self.atoms.intern(premise)
+                if code not in codes:
+                    codes.append(code)
+            premise_buckets.append(codes)
+            conclusions.append(self.atoms.intern(rule.conclusion))
+
+        watchers: List[List[int]] = [[] for _ in range(len(self.atoms))]
+        producers: List[List[int]] = [[] for _ in range(len(self.atoms))]
+        for position, codes in enumerate(premise_buckets):
+            for code in codes:
+                watchers[code].append(position)
+            producers[conclusions[position]].append(position)
+
+        self.rule_ids = array("i", (rule.id for rule in self.rules))
+        self.premise_offsets, self.premise_atoms = _csr(premise_buckets)
+        self.conclusions = conclusions
+        self.watch_offsets, self.watch_rules = _csr(watchers)
+        self.producer_offsets, self.producer_rules = _csr(producers)
+        self._positions: Optional[Dict[int, int]] = None
+        self._by_conclusion: Optional[Dict[str, Tuple[Rule, ...]]] = None
+
+    @classmethod
+    def from_knowledge_base(cls, kb: KnowledgeBase) -> "CompiledRuleBase":
+        return cls(kb.rules, facts=kb.facts, name=kb.name)
+
+    @classmethod
+    def from_buffers(
+        cls,
+        *,
+        atoms: Sequence[str],
+        rule_ids: Sequence[int],
+        premise_offsets: Sequence[int],
+        premise_atoms: Sequence[int],
+        conclusions: Sequence[int],
+        watch_offsets: Sequence[int],
+        watch_rules: Sequence[int],
+        producer_offsets: Sequence[int],
+        producer_rules: Sequence[int],
+        facts: Iterable[str] = (),
+        name: str = "knowledge-base",
+    ) -> "CompiledRuleBase":
+        """Wrap already-packed columns (e.g. ``memoryview``s of an mmap).
+
+        Nothing is copied or re-indexed; ``rules`` builds ``Rule`` objects on
+        first access.
+        """
+
+        compiled = cls.__new__(cls)
+        compiled.name = name
+        compiled.facts = frozenset(facts)
+        compiled.atoms = AtomTable(atoms)
+        compiled.rule_ids = rule_ids
+        compiled.premise_offsets = premise_offsets
+        compiled.premise_atoms = premise_atoms
+        compiled.conclusions = conclusions
+        compiled.watch_offsets = watch_offsets
+        compiled.watch_rules = watch_rules
+        compiled.producer_offsets = producer_offsets
+        compiled.producer_rules = producer_rules
+        compiled.rules = _LazyRules(compiled)  # type: ignore[assignment]
+        compiled._positions = None
+        compiled._by_conclusion = None
+        return compiled
+
+    def build_rule(self, position: int) -> Rule:
+        atoms = self.atoms
+        return Rule(
+            int(self.rule_ids[position]),
+            tuple(atoms[code] for code in self.premises_of(position)),
+            atoms[self.conclusions[position]],
+        )
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def iter_rules(self) -> Iterator[Rule]:
+        return iter(self.rules)
+
+    def position_of(self, rule_id: int) -> int:
+        if self._positions is None:
+            self._positions = {
+                rule_id: position for position, rule_id in enumerate(self.rule_ids)
+            }
+        try:
+            return self._positions[rule_id]
+        except KeyError as exc:
+            raise KeyError(f"Unknown rule id: {rule_id}") from exc
+
+    def rule_by_id(self, rule_id: int) -> Rule:
+        return self.rules[self.position_of(rule_id)]
+
+    def premises_of(self, position: int) -> array:
+        return self.premise_atoms[
+            self.premise_offsets[position] : self.premise_offsets[position + 1]
+        ]
+
+    def premise_count(self, position: int) -> int:
+        return self.premise_offsets[position + 1] - self.premise_offsets[position]
+
+    def watchers_of(self, code: int) -> array:
+        return self.watch_rules[self.watch_offsets[code] : self.watch_offsets[code + 1]]
+
+    def producers_of(self, code: int) -> array:
+        return self.producer_rules[
+            self.producer_offsets[code] : self.producer_offsets[code + 1]
+        ]
+
+    def rules_concluding(self, atom: str) -> Tuple[Rule, ...]:
+        """Rules whose conclusion is ``atom``, in id order."""
+
+        if self._by_conclusion is None:
+            self._by_conclusion = {
+                self.atoms[code]: tuple(
+                    self.rules[position] for position in self.producers_of(code)
+                )
+                for code in range(len(self.atoms))
+            }
+        return self._by_conclusion.get(atom, ())
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}: {len(self.rules)} compiled rule(s), "
+            f"{len(self.atoms)} atom(s)"
+        )
+
+
+def compile_rules(kb: "KnowledgeBase | CompiledRuleBase") -> CompiledRuleBase:
+    """Return ``kb`` unchanged if already compiled, otherwise its cached
+    compiled form (see ``KnowledgeBase.compile``)."""
+
+    if isinstance(kb, CompiledRuleBase):
+        return kb
+    return kb.compile()
@@ -2,22 +2,43 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from array import array
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Sequence, Set
 
+from .compiled import CompiledRuleBase, compile_rules
 from .knowledge_base import KnowledgeBase
 from .models import Rule
-from .results import ForwardResult, StepTrace
+from .results import ForwardResult, LazyStepHistory, StepTrace, TraceDelta
 from .utils import ensure_choice, format_atoms, normalize_atom
 from . import graphs
 
 FORWARD_STRUCTURES = ("stack", "queue")
 FORWARD_INDEX_MODES = ("min", "max")
+FORWARD_AGENDA_MODES = ("incremental", "scan")
+FORWARD_TRACE_LEVELS = ("full", "delta", "summary", "none")
 
 
 def _collect_rules(kb: KnowledgeBase) -> List[Rule]:
-    return list(kb.iter_rules())
+    return list(kb.rules)
+
+
+def _push_candidates(
+    thoa: List[int],
+    candidates: List[int],
+    *,
+    structure: str,
+    index_mode: str,
+) -> None:
+    if not candidates:
+        return
+
+    if structure == "stack":
+        candidates.sort(reverse=index_mode == "min")
+    else:  # queue
+        candidates.sort(reverse=index_mode == "max")
+
+    thoa.extend(candidates)
 
 
 def _enqueue_candidates(
@@ -39,16 +60,147 @@ def _enqueue_candidates(
         if set(rule.premises).issubset(known) and rule.conclusion not in known:
             candidates.append(rule.id)
 
-    if not candidates:
-        return
+    _push_candidates(thoa, candidates, structure=structure, index_mode=index_mode)
 
-    if structure == "stack":
-        candidates.sort(reverse=index_mode == "min")
-    else:  # queue
-        candidates.sort(reverse=index_mode == "max")
 
-    for rid in candidates:
-        thoa.append(rid)
+class _PremiseAgenda:
+    """Premise→rule index with a per-rule count of unsatisfied premises.
+
+    Asserting a fact only touches the rules that mention it, so a run costs
+    O(total premises) instead of O(steps × rules × premises). The candidates
+    it reports are exactly those ``_enqueue_candidates`` would find. The
+    index itself lives in the shared ``CompiledRuleBase``; only the counters
+    are allocated per run.
+    """
+
+    def __init__(self, compiled: CompiledRuleBase, known: Set[str]) -> None:
+        self._compiled = compiled
+        self._known = bytearray(len(compiled.atoms))
+        for fact in known:
+            code = compiled.atoms.code(fact)
+            if code is not None:
+                self._known[code] = 1
+
+        offsets = compiled.premise_offsets
+        premise_atoms = compiled.premise_atoms
+        conclusions = compiled.conclusions
+        self._missing = array("i", bytes(4 * len(compiled)))
+        self._initial: List[int] = []
+        for position in range(len(compiled)):
+            missing = 0
+            for index in range(offsets[position], offsets[position + 1]):
+                if not self._known[premise_atoms[index]]:
+                    missing += 1
+            self._missing[position] = missing
+            if missing == 0 and not self._known[conclusions[position]]:
+                self._initial.append(compiled.rule_ids[position])
+
+    def initial_candidates(self) -> List[int]:
+        return list(self._initial)
+
+    def assert_fact(self, fact: str) -> List[int]:
+        """Record a newly known ``fact`` and return the rule ids it enables."""
+
+        compiled = self._compiled
+        code = compiled.atoms.code(fact)
+        if code is None:
+            return []
+        known = self._known
+        known[code] = 1
+
+        enabled: List[int] = []
+        missing = self._missing
+        watch_rules = compiled.watch_rules
+        conclusions = compiled.conclusions
+        for index in range(compiled.watch_offsets[code], compiled.watch_offsets[code + 1]):
+            position = watch_rules[index]
+            missing[position] -= 1
+            if missing[position] == 0 and not known[conclusions[position]]:
+                enabled.append(compiled.rule_ids[position])
+        return enabled
+
+
+class _TraceRecorder:
+    """Collect the step history at the requested verbosity.
+
+    ``full`` snapshots every step, ``delta`` stores only what each step
+    changed, ``summary`` keeps the first and last snapshots and ``none``
+    only counts steps.
+    """
+
+    def __init__(
+        self, level: str, *, structure: str, known: Set[str], rule_ids: Iterable[int]
+    ) -> None:
+        self.level = level
+        self.count = 0
+        self._structure = structure
+        self._initial_facts = set(known) if level == "delta" else set()
+        self._rule_ids = list(rule_ids) if level == "delta" else []
+        self._snapshots: List[StepTrace] = []
+        self._deltas: List[TraceDelta] = []
+        self._last: tuple = ()
+
+    def record(
+        self,
+        *,
+        step: int,
+        rule_id: Optional[int],
+        note: str,
+        known: Set[str],
+        thoa: List[int],
+        remaining: Set[int],
+        fired: List[int],
+        added_fact: Optional[str] = None,
+        pushed: Sequence[int] = (),
+    ) -> None:
+        self.count += 1
+        if self.level == "full" or (self.level == "summary" and self.count == 1):
+            self._snapshots.append(
+                StepTrace(
+                    step=step,
+                    rule_id=rule_id,
+                    known_facts=sorted(known),
+                    thoa=list(thoa),
+                    remaining_rules=sorted(remaining),
+                    fired_rules=list(fired),
+                    note=note,
+                )
+            )
+        elif self.level == "delta":
+            self._deltas.append(
+                TraceDelta(
+                    step=step,
+                    rule_id=rule_id,
+                    added_fact=added_fact,
+                    pushed=list(pushed),
+                    note=note,
+                )
+            )
+        elif self.level == "summary":
+            self._last = (step, rule_id, note, known, thoa, remaining, fired)
+
+    def history(self) -> Sequence[StepTrace]:
+        if self.level == "delta":
+            return LazyStepHistory(
+                self._deltas,
+                initial_facts=self._initial_facts,
+                rule_ids=self._rule_ids,
+                structure=self._structure,
+            )
+        if self.level == "summary" and self._last:
+            step, rule_id, note, known, thoa, remaining, fired = self._last
+            return self._snapshots + [
+                StepTrace(
+                    step=step,
+                    rule_id=rule_id,
+                    known_facts=sorted(known),
+                    thoa=list(thoa),
+                    remaining_rules=sorted(remaining),
+                    fired_rules=list(fired),
+                    note=note,
+                )
+            ]
+        return list(self._snapshots)
 
 
 def _select_rule(thoa: List[int], *, structure: str) -> int:
@@ -60,7 +212,7 @@ def _select_rule(thoa: List[int], *, structure: str) -> int:
 
 
 def run_forward_inference(
-    kb: KnowledgeBase,
+    kb: KnowledgeBase | CompiledRuleBase,
     *,
     goals: Iterable[str],
     strategy: str = "stack",
@@ -68,11 +220,29 @@ def run_forward_inference(
     initial_facts: Optional[Iterable[str]] = None,
     output_dir: Optional[Path] = None,
     make_graphs: bool = False,
+    agenda: str = "incremental",
+    trace: str = "full",
 ) -> ForwardResult:
+    """Run forward chaining until every goal is known or THOA is empty.
+
+    ``agenda="incremental"`` maintains the THOA agenda from a premise index
+    (see ``_PremiseAgenda``); ``agenda="scan"`` re-scans every rule after each
+    firing. Both fire rules in exactly the same order.
+
+    ``kb`` may be a ``CompiledRuleBase`` built once and reused across calls;
+    a plain ``KnowledgeBase`` is compiled on the fly.
+
+    ``trace`` selects how much of ``ForwardResult.history`` is recorded (see
+    ``_TraceRecorder``); callers that only need the step count should pass
+    ``"none"`` and read ``ForwardResult.step_count``.
+    """
     structure = ensure_choice(strategy, FORWARD_STRUCTURES, label="strategy")
     selection = ensure_choice(index_mode, FORWARD_INDEX_MODES, label="index_mode")
+    agenda_mode = ensure_choice(agenda, FORWARD_AGENDA_MODES, label="agenda")
+    trace_level = ensure_choice(trace, FORWARD_TRACE_LEVELS, label="trace")
 
-    rules = _collect_rules(kb)
+    compiled = compile_rules(kb) if agenda_mode == "incremental" else None
+    rules = list(compiled.rules) if compiled is not None else _collect_rules(kb)
     if not rules:
         raise ValueError("Knowledge base has no rules.")
 
@@ -89,88 +259,111 @@ def run_forward_inference(
     thoa: List[int] = []
     fired: List[int] = []
     remaining: Set[int] = {rule.id for rule in rules}
-    rule_index: Dict[int, Rule] = {rule.id: rule for rule in rules}
-    history: List[StepTrace] = []
-
-    _enqueue_candidates(
-        thoa, remaining, known, rules, structure=structure, index_mode=selection
+    rule_by_id = (
+        compiled.rule_by_id
+        if compiled is not None
+        else {rule.id: rule for rule in rules}.__getitem__
     )
-    history.append(
-        StepTrace(
-            step=0,
-            rule_id=None,
-            known_facts=sorted(known),
-            thoa=list(thoa),
-            remaining_rules=sorted(remaining),
-            fired_rules=list(fired),
-            note="Trạng thái ban đầu",
+    given_facts = set(kb.facts)
+    recorder = _TraceRecorder(
+        trace_level, structure=structure, known=known, rule_ids=remaining
+    )
+
+    premise_agenda: Optional[_PremiseAgenda] = None
+    if compiled is not None:
+        premise_agenda = _PremiseAgenda(compiled, known)
+        _push_candidates(
+            thoa,
+            premise_agenda.initial_candidates(),
+            structure=structure,
+            index_mode=selection,
         )
+    else:
+        _enqueue_candidates(
+            thoa, remaining, known, rules, structure=structure, index_mode=selection
+        )
+    recorder.record(
+        step=0,
+        rule_id=None,
+        note="Trạng thái ban đầu",
+        known=known,
+        thoa=thoa,
+        remaining=remaining,
+        fired=fired,
+        pushed=thoa,
     )
 
     step = 0
     while thoa and not goal_set.issubset(known):
         step += 1
         rule_id = _select_rule(thoa, structure=structure)
-        rule = rule_index[rule_id]
+        rule = rule_by_id(rule_id)
         fired.append(rule_id)
         remaining.discard(rule_id)
-        known.add(rule.conclusion)
+        added_fact = rule.conclusion if rule.conclusion not in known else None
+        mark = len(thoa)
 
-        _enqueue_candidates(
-            thoa, remaining, known, rules, structure=structure, index_mode=selection
-        )
-
-        history.append(
-            StepTrace(
-                step=step,
-                rule_id=rule_id,
-                known_facts=sorted(known),
-                thoa=list(thoa),
-                remaining_rules=sorted(remaining),
-                fired_rules=list(fired),
-                note=f"Suy ra {rule.conclusion}",
+        if premise_agenda is not None:
+            if rule.conclusion not in known:
+                known.add(rule.conclusion)
+                _push_candidates(
+                    thoa,
+                    premise_agenda.assert_fact(rule.conclusion),
+                    structure=structure,
+                    index_mode=selection,
+                )
+        else:
+            known.add(rule.conclusion)
+            _enqueue_candidates(
+                thoa, remaining, known, rules, structure=structure, index_mode=selection
             )
+
+        recorder.record(
+            step=step,
+            rule_id=rule_id,
+            note=f"Suy ra {rule.conclusion}",
+            known=known,
+            thoa=thoa,
+            remaining=remaining,
+            fired=fired,
+            added_fact=added_fact,
+            pushed=thoa[mark:],
         )
 
     success = goal_set.issubset(known)
     if not success and not thoa:
-        history.append(
-            StepTrace(
-                step=step + 1,
-                rule_id=None,
-                known_facts=sorted(known),
-                thoa=list(thoa),
-                remaining_rules=sorted(remaining),
-                fired_rules=list(fired),
-                note="Không còn luật khả dụng",
-            )
+        recorder.record(
+            step=step + 1,
+            rule_id=None,
+            note="Không còn luật khả dụng",
+            known=known,
+            thoa=thoa,
+            remaining=remaining,
+            fired=fired,
         )
 
     graph_files: Dict[str, Path] = {}
     if make_graphs:
         out_dir = Path(output_dir or "inference_outputs")
         out_dir.mkdir(parents=True, exist_ok=True)
-        fpg_path = out_dir / "forward_fpg.svg"
-        rpg_path = out_dir / "forward_rpg.svg"
-        # FPG chỉ hiển thị fact nodes, phân biệt GT (given) và fact suy ra
-        fpg_rendered = graphs.render_fpg(
-            rules,
-            known_facts=known,
-            goal_facts=goal_set,
-            output=fpg_path,
-            given_facts=set(kb.facts),
+        graph_files = graphs.run_graph_tasks(
+            graphs.forward_graph_tasks(
+                rules,
+                known_facts=known,
+                goal_facts=goal_set,
+                given_facts=given_facts,
+                output_dir=out_dir,
+                producers=compiled.rules_concluding if compiled is not None else None,
+            )
         )
-        rpg_rendered = graphs.render_rpg(rules, output=rpg_path)
-        if fpg_rendered:
-            graph_files["fpg"] = fpg_rendered
-        if rpg_rendered:
-            graph_files["rpg"] = rpg_rendered
 
     return ForwardResult(
         success=success,
         goals=sorted(goal_set),
         final_facts=sorted(known),
         fired_rules=fired,
-        history=history,
+        history=recorder.history(),
         graph_files=graph_files,
+        trace=trace_level,
+        step_count=recorder.count,
     )
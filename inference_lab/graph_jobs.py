@@ -0,0 +1,161 @@
+"""Background rendering of inference graphs.
+
+Rendering an FPG/RPG through Graphviz takes far longer than the inference
+it illustrates, so a web request can hand the renders to a
+``GraphRenderPool`` and answer at once with a job id. A bounded number of
+worker threads render queued jobs; at most ``max_pending`` jobs wait or run
+at a time, and ``submit`` refuses new work beyond that instead of queueing
+without limit. ``shutdown`` drops queued jobs and stops running ones after
+their current render.
+
+The pool does not own the files a job reports: tasks normally render into
+a shared ``RenderCache``, which may evict them later, so readers of a
+finished job's ``files`` must check that they still exist.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+RenderTask = Callable[[], Optional[Path]]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class GraphJob:
+    """One batch of renders.
+
+    Attributes:
+        files: Rendered file per graph key (``"fpg"``, ``"rpg"``), filled as
+            renders finish.
+        error: Message of the render that failed, if any.
+    """
+
+    id: str
+    status: str = QUEUED
+    files: Dict[str, Path] = field(default_factory=dict)
+    error: Optional[str] = None
+    created: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+
+class GraphRenderPool:
+    """Bounded thread pool running ``GraphJob``s.
+
+    Attributes:
+        workers: Render threads.
+        max_pending: Jobs queued or running before ``submit`` refuses more.
+        keep_finished: Finished jobs remembered for status queries.
+    """
+
+    def __init__(
+        self, *, workers: int = 2, max_pending: int = 16, keep_finished: int = 256
+    ) -> None:
+        if workers < 1 or max_pending < 1:
+            raise ValueError("workers and max_pending must be at least 1.")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="graph-render"
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, GraphJob] = {}
+        self._futures: Dict[str, Future] = {}
+        self._cancelled: set = set()
+        self._finished: List[str] = []
+        self.rejected = 0
+
+    def submit(self, tasks: Dict[str, RenderTask]) -> Optional[GraphJob]:
+        """Queue ``tasks``; returns the job, or ``None`` if the queue is full."""
+
+        job = GraphJob(uuid4().hex)
+        with self._lock:
+            if len(self._futures) >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._jobs[job.id] = job
+            self._futures[job.id] = self._executor.submit(self._run, job, dict(tasks))
+        return job
+
+    def get(self, job_id: str) -> Optional[GraphJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[GraphJob]:
+        """Block until ``job_id`` finishes (or ``timeout`` passes); returns it."""
+
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            wait_futures([future], timeout)
+        return self.get(job_id)
+
+    def shutdown(self, *, wait: bool = False) -> None:
+        with self._lock:
+            for job_id, future in list(self._futures.items()):
+                self._cancelled.add(job_id)
+                if future.cancel():
+                    self._finish(self._jobs[job_id], CANCELLED)
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": len(self._futures),
+                "rejected": self.rejected,
+                "jobs": counts,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _run(self, job: GraphJob, tasks: Dict[str, RenderTask]) -> None:
+        with self._lock:
+            if job.id in self._cancelled:
+                self._finish(job, CANCELLED)
+                return
+            job.status = RUNNING
+        try:
+            for key, task in tasks.items():
+                rendered = task()
+                with self._lock:
+                    if rendered:
+                        job.files[key] = Path(rendered)
+                    if job.id in self._cancelled:
+                        self._finish(job, CANCELLED)
+                        return
+        except Exception as exc:  # noqa: BLE001 - reported through the job
+            with self._lock:
+                job.error = f"{type(exc).__name__}: {exc}"
+                self._finish(job, FAILED)
+            return
+        with self._lock:
+            self._finish(job, DONE)
+
+    def _finish(self, job: GraphJob, status: str) -> None:
+        job.status = status
+        job.finished = time.monotonic()
+        self._futures.pop(job.id, None)
+        self._cancelled.discard(job.id)
+        self._finished.append(job.id)
+        while len(self._finished) > self.keep_finished:
+            self._jobs.pop(self._finished.pop(0), None)
+
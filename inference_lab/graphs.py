@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
-from collections import deque
+import shutil
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import DefaultDict, Dict, Iterable, List, Optional, Sequence, Tuple, Set
+from typing import Callable, DefaultDict, Dict, Iterable, List, Optional, Sequence, Tuple, Set
 
 import networkx as nx
 
@@ -16,10 +17,15 @@ except ImportError:  # pragma: no cover - optional dependency
     GRAPHVIZ_AVAILABLE = False
     Digraph = None  # type: ignore[assignment]
 
+from . import svg_layout
 from .models import Rule
+from .render_cache import RenderCache, graph_key
 
 FACT_NODE = "fact"
 RULE_NODE = "rule"
+RENDERERS = ("auto", "graphviz", "svg")
+# Node attribute holding the layer computed by ``graph_levels``.
+LEVEL = "level"
 
 
 def build_fpg_graph(
@@ -63,30 +69,64 @@ def build_fpg_graph(
             graph.add_node(premise, type=FACT_NODE)
             graph.add_edge(premise, rule.conclusion)
 
+    graph_levels(graph)
     return graph
 
 
-def build_rpg_graph(rules: Sequence[Rule]) -> nx.DiGraph:
-    """Construct a rule precedence graph (RPG)."""
+def build_rpg_graph(
+    rules: Sequence[Rule],
+    *,
+    producers: Optional[Callable[[str], Sequence[Rule]]] = None,
+) -> nx.DiGraph:
+    """Construct a rule precedence graph (RPG).
+
+    ``producers`` maps an atom to the rules concluding it (e.g.
+    ``KnowledgeBase.rules_concluding``); it must cover exactly ``rules``.
+    Without it the conclusion index is built here.
+    """
 
     graph = nx.DiGraph()
-    conclusions: Dict[str, list[int]] = {}
+    if producers is None:
+        conclusions: Dict[str, list[Rule]] = {}
+        for rule in rules:
+            conclusions.setdefault(rule.conclusion, []).append(rule)
+        producers = lambda atom: conclusions.get(atom, ())  # noqa: E731
 
     for rule in rules:
         node = f"R{rule.id}"
         graph.add_node(node, type=RULE_NODE, label=node)
-        conclusions.setdefault(rule.conclusion, []).append(rule.id)
 
     for rule in rules:
         source = f"R{rule.id}"
         for premise in rule.premises:
-            for producer in conclusions.get(premise, []):
-                target = f"R{producer}"
+            for producer in producers(premise):
+                target = f"R{producer.id}"
                 if source != target:
                     graph.add_edge(target, source)
+    graph_levels(graph)
     return graph
 
 
+# (fill, border, pen width) per fact role; shared by both renderers.
+_FACT_COLORS: Dict[Optional[str], Tuple[str, str, str]] = {
+    "given": ("#dbeafe", "#1d4ed8", "2.0"),
+    "derived": ("#e0f2fe", "#0284c7", "1.8"),
+    "goal": ("#d1fae5", "#059669", "2.5"),
+    None: ("#fef3c7", "#d97706", "1.8"),
+}
+_RULE_COLORS = ("#f1f5f9", "#64748b", "1.8")
+_MUTED_COLORS = ("#f8fafc", "#cbd5e1", "1.0")
+
+
+def _node_colors(graph: nx.DiGraph, node: str, *, muted: bool) -> Tuple[str, str, str]:
+    if muted:
+        return _MUTED_COLORS
+    if graph.nodes[node].get("type") == FACT_NODE:
+        role = graph.nodes[node].get("role")
+        return _FACT_COLORS.get(role, _FACT_COLORS[None])
+    return _RULE_COLORS
+
+
 def _apply_fact_style(
     dot: "Digraph | None", node: str, role: str | None, *, muted: bool = False
 ) -> None:
@@ -99,51 +139,10 @@ def _apply_fact_style(
         "fixedsize": "true",
     }
     if muted:
-        dot.node(
-            node,
-            node,
-            fillcolor="#f8fafc",
-            color="#cbd5e1",
-            penwidth="1.0",
-            **base_attrs,
-        )
-        return
-    if role == "given":
-        dot.node(
-            node,
-            node,
-            fillcolor="#dbeafe",
-            color="#1d4ed8",
-            penwidth="2.0",
-            **base_attrs,
-        )
-    elif role == "derived":
-        dot.node(
-            node,
-            node,
-            fillcolor="#e0f2fe",
-            color="#0284c7",
-            penwidth="1.8",
-            **base_attrs,
-        )
-    elif role == "goal":
-        dot.node(
-            node,
-            node,
-            fillcolor="#d1fae5",
-            color="#059669",
-            penwidth="2.5",
-            **base_attrs,
-        )
+        fill, border, pen = _MUTED_COLORS
     else:
-        dot.node(
-            node,
-            node,
-            fillcolor="#fef3c7",
-            color="#d97706",
-            penwidth="1.8",
-            **base_attrs,
-        )
+        fill, border, pen = _FACT_COLORS.get(role, _FACT_COLORS[None])
+    dot.node(node, node, fillcolor=fill, color=border, penwidth=pen, **base_attrs)
 
 
 def _apply_rule_style(dot: "Digraph | None", node: str, *, muted: bool = False) -> None:
@@ -155,9 +154,9 @@ def _apply_rule_style(dot: "Digraph | None", node: str, *, muted: bool = False)
         shape="box",
         width="1.0",
         height="0.6",
-        fillcolor="#f1f5f9" if not muted else "#f8fafc",
-        color="#64748b" if not muted else "#cbd5e1",
-        penwidth="1.8" if not muted else "1.0",
+        fillcolor=(_MUTED_COLORS if muted else _RULE_COLORS)[0],
+        color=(_MUTED_COLORS if muted else _RULE_COLORS)[1],
+        penwidth=(_MUTED_COLORS if muted else _RULE_COLORS)[2],
         margin="0.12,0.08",
         fixedsize="true",
     )
@@ -166,43 +165,78 @@ def _apply_rule_style(dot: "Digraph | None", node: str, *, muted: bool = False)
 def _group_nodes_by_rank(dot: "Digraph", graph: nx.DiGraph) -> None:
     """Group nodes into layers for cleaner left-to-right flow."""
 
-    levels: Dict[str, int] = {}
-    queue: deque[Tuple[str, int]] = deque()
-
-    sources = [node for node in graph.nodes if graph.in_degree(node) == 0]
-    if not sources:
-        sources = list(graph.nodes)
-
-    for node in sources:
-        levels[node] = 0
-        queue.append((node, 0))
-
-    while queue:
-        current, level = queue.popleft()
-        for successor in graph.successors(current):
-            next_level = level + 1
-            if successor not in levels or next_level > levels[successor]:
-                levels[successor] = next_level
-                queue.append((successor, next_level))
-
-    for node in graph.nodes:
-        levels.setdefault(node, 0)
-
     groups: DefaultDict[int, List[str]] = DefaultDict(list)
-    for node, level in levels.items():
+    for node, level in graph_levels(graph).items():
         groups[level].append(node)
 
     for level in sorted(groups):
         nodes = groups[level]
         if len(nodes) <= 1:
             continue
-        nodes.sort(key=lambda n: (graph.nodes[n].get("type") != FACT_NODE, n))
+        nodes.sort(key=partial(_layer_key, graph))
         with dot.subgraph(name=f"rank_{level}") as same_rank:
             same_rank.attr(rank="same")
             for node in nodes:
                 same_rank.node(node)
 
 
+def _layer_key(graph: nx.DiGraph, node: str) -> Tuple[bool, str]:
+    """Order within a layer: facts before rules, then by name."""
+
+    return (graph.nodes[node].get("type") != FACT_NODE, node)
+
+
+def graph_levels(graph: nx.DiGraph, *, refresh: bool = False) -> Dict[str, int]:
+    """Layer of every node, stored on the nodes as the ``level`` attribute.
+
+    A node's layer is the longest path reaching it in the condensation of
+    ``graph`` (one node per strongly connected component), so the nodes of
+    a cycle share a layer and every other edge goes to a higher layer. It
+    is computed in topological order, in O(V + E): nodes not downstream of
+    a cycle directly, the rest over the condensation of what is left. The
+    result is kept on the graph for the renderers and recomputed when a
+    node lacks it or with ``refresh=True`` (needed after edges change).
+    """
+
+    nodes = graph.nodes
+    if not refresh and all(LEVEL in data for _, data in nodes(data=True)):
+        return {node: data[LEVEL] for node, data in nodes(data=True)}
+
+    successors = graph.succ
+    levels = dict.fromkeys(nodes, 0)
+    pending = dict(graph.in_degree())
+    ready = [node for node, degree in pending.items() if not degree]
+    while ready:
+        node = ready.pop()
+        next_level = levels[node] + 1
+        for successor in successors[node]:
+            if levels[successor] < next_level:
+                levels[successor] = next_level
+            pending[successor] -= 1
+            if not pending[successor]:
+                ready.append(successor)
+
+    blocked = [node for node, degree in pending.items() if degree]
+    if blocked:
+        # Cycles and everything below them; levels so far are lower bounds.
+        condensed = nx.condensation(graph.subgraph(blocked))
+        members = condensed.graph["mapping"]
+        component_level = {
+            component: max(levels[node] for node in data["members"])
+            for component, data in condensed.nodes(data=True)
+        }
+        for component in nx.topological_sort(condensed):
+            next_level = component_level[component] + 1
+            for successor in condensed.successors(component):
+                if component_level[successor] < next_level:
+                    component_level[successor] = next_level
+        for node in blocked:
+            levels[node] = component_level[members[node]]
+
+    nx.set_node_attributes(graph, levels, LEVEL)
+    return levels
+
+
 def render_graph(
     graph: nx.DiGraph,
     filename: Path,
@@ -213,10 +247,73 @@ def render_graph(
     dpi: int = 160,
     highlight_nodes: Optional[Set[str]] = None,
     highlight_edges: Optional[Set[Tuple[str, str]]] = None,
+    cache: Optional[RenderCache] = None,
+    renderer: str = "auto",
 ) -> Optional[Path]:
-    if not GRAPHVIZ_AVAILABLE:  # pragma: no cover
+    """Render ``graph`` to ``filename`` (its suffix picks the format).
+
+    ``renderer`` is ``"graphviz"`` (the ``dot`` executable), ``"svg"`` (the
+    in-process layout of ``svg_layout``, SVG only) or ``"auto"``: Graphviz
+    when the package and ``dot`` are installed, else the in-process SVG.
+    Returns ``None`` when no renderer can produce the format.
+
+    With ``cache`` the render is looked up by content and, if new, stored in
+    the cache instead of ``filename``; the cached file is returned.
+    """
+    filename = Path(filename)
+    fmt = filename.suffix.lstrip(".") or "png"
+    engine = _pick_renderer(renderer, fmt)
+    if engine is None:
         return None
+    style = dict(
+        rankdir=rankdir,
+        ratio=ratio,
+        size=size,
+        dpi=dpi,
+        highlight_nodes=highlight_nodes,
+        highlight_edges=highlight_edges,
+    )
+    draw = _render_dot if engine == "graphviz" else _render_svg
+    if cache is None:
+        return draw(graph, filename.with_suffix(""), fmt, **style)
+    return cache.get_or_render(
+        graph_key(graph, {**style, "format": fmt, "renderer": engine}),
+        fmt,
+        lambda target: draw(graph, target, fmt, **style),
+    )
+
 
+@lru_cache(maxsize=None)
+def graphviz_ready() -> bool:
+    """Whether the graphviz package and its ``dot`` executable are installed."""
+
+    return GRAPHVIZ_AVAILABLE and shutil.which("dot") is not None
+
+
+def _pick_renderer(renderer: str, fmt: str) -> Optional[str]:
+    if renderer not in RENDERERS:
+        raise ValueError(f"renderer must be one of {RENDERERS}, got {renderer!r}.")
+    graphviz = GRAPHVIZ_AVAILABLE if renderer == "graphviz" else graphviz_ready()
+    if renderer != "svg" and graphviz:
+        return "graphviz"
+    if renderer != "graphviz" and fmt == "svg":
+        return "svg"
+    return None
+
+
+def _render_dot(
+    graph: nx.DiGraph,
+    target: Path,
+    fmt: str,
+    *,
+    rankdir: str,
+    ratio: str,
+    size: str | None,
+    dpi: int,
+    highlight_nodes: Optional[Set[str]],
+    highlight_edges: Optional[Set[Tuple[str, str]]],
+) -> Path:
+    """Lay ``graph`` out with Graphviz into ``target`` + ``.fmt``."""
     dot = Digraph(comment="Inference graph")
     dot.attr(rankdir=rankdir)
     dot.attr(ratio=ratio)
@@ -271,13 +368,57 @@ def render_graph(
 
     _group_nodes_by_rank(dot, graph)
 
-    filename = Path(filename)
-    base, ext = filename.stem, filename.suffix
-    fmt = ext.lstrip(".") or "png"
-    output = dot.render(filename.with_suffix(""), format=fmt, cleanup=True)
+    output = dot.render(str(target), format=fmt, cleanup=True)
     return Path(output)
 
 
+def _render_svg(
+    graph: nx.DiGraph,
+    target: Path,
+    fmt: str,
+    *,
+    rankdir: str,
+    ratio: str,
+    size: str | None,
+    dpi: int,
+    highlight_nodes: Optional[Set[str]],
+    highlight_edges: Optional[Set[Tuple[str, str]]],
+) -> Path:
+    """Lay ``graph`` out in-process into ``target`` + ``.svg``.
+
+    Uses the same layers, colours and node sizes as the Graphviz renderer;
+    ``ratio``, ``size`` and ``dpi`` do not apply to it.
+    """
+    styles: Dict[str, svg_layout.NodeStyle] = {}
+    for node in graph.nodes:
+        muted = bool(highlight_nodes) and node not in highlight_nodes
+        fill, border, pen = _node_colors(graph, node, muted=muted)
+        if graph.nodes[node].get("type") == FACT_NODE:
+            shape, width, height = "circle", 0.7 * 72, 0.7 * 72
+        else:
+            shape, width, height = "box", 1.0 * 72, 0.6 * 72
+        styles[node] = svg_layout.NodeStyle(
+            shape, width, height, fill, border, float(pen), graph.nodes[node].get("label", "")
+        )
+    edge_styles = {}
+    for edge in graph.edges:
+        if highlight_edges is not None and edge not in highlight_edges:
+            edge_styles[edge] = svg_layout.EdgeStyle("#cbd5e1", 0.9, 0.6)
+        else:
+            edge_styles[edge] = svg_layout.EdgeStyle()
+
+    layout = svg_layout.layered_layout(
+        graph,
+        graph_levels(graph),
+        styles,
+        rankdir=rankdir,
+        order_key=partial(_layer_key, graph),
+    )
+    return svg_layout.write_svg(
+        graph, layout, styles, edge_styles, Path(f"{target}.{fmt}")
+    )
+
+
 def render_fpg(
     rules: Sequence[Rule],
     *,
@@ -287,6 +428,8 @@ def render_fpg(
     given_facts: Iterable[str] = (),
     highlight_rules: Optional[Iterable[int]] = None,
     used_only: bool = False,
+    cache: Optional[RenderCache] = None,
+    renderer: str = "auto",
 ) -> Optional[Path]:
     """
     Render FPG graph to file (always shows only fact nodes).
@@ -299,9 +442,11 @@ def render_fpg(
         given_facts: Set of initial given facts
         highlight_rules: Optional list of rule IDs to highlight (chỉ hiển thị rules này nếu used_only=True)
         used_only: If True, only show subgraph with fired rules
+        cache: Optional render cache to serve/store the file from
+        renderer: "auto", "graphviz" or "svg" (see ``render_graph``)
 
     Returns:
-        Path to rendered file or None if graphviz unavailable
+        Path to rendered file or None if no renderer supports the format
     """
     # Nếu used_only=True, chỉ lấy rules đã được fire
     filtered_rules = rules
@@ -343,6 +488,7 @@ def render_fpg(
         # Filter graph
         if keep_nodes:
             graph = graph.subgraph(keep_nodes).copy()
+            graph_levels(graph, refresh=True)
 
     return render_graph(
         graph,
@@ -351,6 +497,8 @@ def render_fpg(
         ratio="auto",
         size=None,
         dpi=220,
+        cache=cache,
+        renderer=renderer,
     )
 
 
@@ -360,14 +508,18 @@ def render_rpg(
     output: Path,
     highlight_rules: Optional[Iterable[int]] = None,
     used_only: bool = False,
+    producers: Optional[Callable[[str], Sequence[Rule]]] = None,
+    cache: Optional[RenderCache] = None,
+    renderer: str = "auto",
 ) -> Optional[Path]:
     # Nếu used_only=True, chỉ lấy rules đã được fire
     filtered_rules = rules
     if used_only and highlight_rules is not None:
         fired_ids = set(highlight_rules)
         filtered_rules = [r for r in rules if r.id in fired_ids]
+        producers = None  # the index covers all rules, not the filtered ones
 
-    graph = build_rpg_graph(filtered_rules)
+    graph = build_rpg_graph(filtered_rules, producers=producers)
     return render_graph(
         graph,
         output,
@@ -375,4 +527,88 @@ def render_rpg(
         ratio="auto",
         size=None,
         dpi=220,
+        cache=cache,
+        renderer=renderer,
     )
+
+
+RenderTask = Callable[[], Optional[Path]]
+
+
+def forward_graph_tasks(
+    rules: Sequence[Rule],
+    *,
+    known_facts: Iterable[str],
+    goal_facts: Iterable[str],
+    given_facts: Iterable[str],
+    output_dir: Path,
+    producers: Optional[Callable[[str], Sequence[Rule]]] = None,
+    cache: Optional[RenderCache] = None,
+    renderer: str = "auto",
+) -> Dict[str, RenderTask]:
+    """The FPG and RPG renders of a forward run, not yet started.
+
+    ``run_forward_inference(make_graphs=True)`` calls them in place; a web
+    worker pool can run them later instead. With ``cache`` the files come
+    from (and go to) the render cache rather than ``output_dir``.
+    """
+
+    output_dir = Path(output_dir)
+    return {
+        # FPG chỉ hiển thị fact nodes, phân biệt GT (given) và fact suy ra
+        "fpg": partial(
+            render_fpg,
+            rules,
+            known_facts=set(known_facts),
+            goal_facts=set(goal_facts),
+            output=output_dir / "forward_fpg.svg",
+            given_facts=set(given_facts),
+            cache=cache,
+            renderer=renderer,
+        ),
+        "rpg": partial(
+            render_rpg,
+            rules,
+            output=output_dir / "forward_rpg.svg",
+            producers=producers,
+            cache=cache,
+            renderer=renderer,
+        ),
+    }
+
+
+def backward_graph_tasks(
+    rules: Sequence[Rule],
+    *,
+    known_facts: Iterable[str],
+    goal_facts: Iterable[str],
+    given_facts: Iterable[str],
+    output_dir: Path,
+    cache: Optional[RenderCache] = None,
+    renderer: str = "auto",
+) -> Dict[str, RenderTask]:
+    """The FPG render of a backward run, not yet started."""
+
+    return {
+        "fpg": partial(
+            render_fpg,
+            rules,
+            known_facts=set(known_facts),
+            goal_facts=list(goal_facts),
+            output=Path(output_dir) / "backward_fpg.svg",
+            given_facts=set(given_facts),
+            cache=cache,
+            renderer=renderer,
+        )
+    }
+
+
+def run_graph_tasks(tasks: Dict[str, RenderTask]) -> Dict[str, Path]:
+    """Render every task now; keys whose render produced nothing are left out."""
+
+    files: Dict[str, Path] = {}
+    for key, task in tasks.items():
+        rendered = task()
+        if rendered:
+            files[key] = rendered
+    return files
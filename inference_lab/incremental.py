@@ -0,0 +1,106 @@
+"""Deductive closure maintained across fact additions.
+
+``IncrementalClosure`` keeps, for one fact set that grows over time (an
+interview, a monitoring stream), the closure under every rule of a
+``CompiledRuleBase`` together with a per-rule count of unsatisfied
+premises. Adding facts only touches the rules that watch them, so feeding
+``n`` facts one at a time costs the same as one full closure instead of
+``n`` of them. Retracting facts is not incremental: ``reset`` rebuilds.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Iterable, List, Set
+
+from .compiled import CompiledRuleBase
+from .utils import normalize_atom
+
+
+class IncrementalClosure:
+    """Closure of a growing fact set under ``compiled``.
+
+    Attributes:
+        compiled: Rule network the closure is computed over.
+        fired: Rule ids in the order they fired (derivation order, not the
+            THOA order of ``run_forward_inference``).
+    """
+
+    def __init__(self, compiled: CompiledRuleBase, facts: Iterable[str] = ()) -> None:
+        self.compiled = compiled
+        self.reset(facts)
+
+    def reset(self, facts: Iterable[str] = ()) -> None:
+        """Recompute from scratch for ``facts``."""
+
+        compiled = self.compiled
+        self._known = bytearray(len(compiled.atoms))
+        self._facts: Set[str] = set()
+        offsets = compiled.premise_offsets
+        self._missing = array(
+            "i", (offsets[p + 1] - offsets[p] for p in range(len(compiled)))
+        )
+        self.fired: List[int] = []
+        # Rules without premises hold unconditionally.
+        ready = [p for p in range(len(compiled)) if self._missing[p] == 0]
+        self._propagate(ready)
+        self.add(facts)
+
+    @property
+    def facts(self) -> Set[str]:
+        """Every known fact (initial and derived); do not mutate."""
+
+        return self._facts
+
+    def __contains__(self, fact: object) -> bool:
+        return fact in self._facts
+
+    def add(self, facts: Iterable[str]) -> List[str]:
+        """Assert ``facts``; returns the facts that became known, in order."""
+
+        compiled = self.compiled
+        added: List[str] = []
+        ready: List[int] = []
+        for raw in facts:
+            fact = normalize_atom(raw)
+            if not fact or fact in self._facts:
+                continue
+            code = compiled.atoms.code(fact)
+            self._facts.add(fact)
+            added.append(fact)
+            if code is not None:
+                self._known[code] = 1
+                ready.extend(self._enabled_by(code))
+        if ready:
+            added.extend(self._propagate(ready))
+        return added
+
+    def _enabled_by(self, code: int) -> List[int]:
+        compiled = self.compiled
+        missing = self._missing
+        watch_rules = compiled.watch_rules
+        enabled: List[int] = []
+        for index in range(compiled.watch_offsets[code], compiled.watch_offsets[code + 1]):
+            position = watch_rules[index]
+            missing[position] -= 1
+            if missing[position] == 0:
+                enabled.append(position)
+        return enabled
+
+    def _propagate(self, ready: List[int]) -> List[str]:
+        compiled = self.compiled
+        conclusions = compiled.conclusions
+        known = self._known
+        derived: List[str] = []
+        while ready:
+            position = ready.pop()
+            code = conclusions[position]
+            if known[code]:
+                continue
+            known[code] = 1
+            self.fired.append(int(compiled.rule_ids[position]))
+            fact = compiled.atoms[code]
+            self._facts.add(fact)
+            derived.append(fact)
+            ready.extend(self._enabled_by(code))
+        return derived
@@ -2,40 +2,355 @@
 
 from __future__ import annotations
 
+import sys
+import threading
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, Iterator, List, Optional, Sequence, Set
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
+from .bulk import DEFAULT_CHUNK_LINES, BulkLoadReport, parse_rule_stream
+from .compact import CompactRuleStore
 from .models import Rule
 from .utils import normalize_atom, parse_rule_text, split_atoms
 
+if TYPE_CHECKING:  # pragma: no cover - import cycle at runtime
+    from .compiled import CompiledRuleBase
+
+
+class _RuleData:
+    """Rule storage shared by a ``RuleStore`` and its forks until one writes."""
+
+    __slots__ = ("by_id", "by_conclusion", "by_premise", "ordered", "owners", "lock")
+
+    def __init__(self) -> None:
+        self.by_id: Dict[int, Rule] = {}
+        self.by_conclusion: Dict[str, Dict[int, Rule]] = {}
+        self.by_premise: Dict[str, Dict[int, Rule]] = {}
+        self.ordered: Optional[Tuple[Rule, ...]] = None
+        self.owners = 1
+        self.lock = threading.Lock()
+
+    def copy(self) -> "_RuleData":
+        data = _RuleData()
+        data.by_id = dict(self.by_id)
+        data.by_conclusion = {atom: dict(b) for atom, b in self.by_conclusion.items()}
+        data.by_premise = {atom: dict(b) for atom, b in self.by_premise.items()}
+        data.ordered = self.ordered
+        return data
+
+    def acquire(self) -> None:
+        with self.lock:
+            self.owners += 1
+
+    def release(self) -> None:
+        with self.lock:
+            self.owners -= 1
+
+
+class RuleStore(Sequence[Rule]):
+    """Id-ordered rule container with incrementally maintained indexes.
+
+    Rules are keyed by id, so lookup, replacement and removal are O(1) apart
+    from the index buckets of the rule's own atoms. The id-ordered tuple is
+    rebuilt lazily after a change, and ``version`` increases on every change
+    so derived structures (e.g. a compiled rule base) know when to refresh.
+
+    ``fork()`` and ``snapshot()`` are O(1): the new store shares storage with
+    this one, and whichever side writes first copies it (copy-on-write).
+    Snapshots are read-only. Writes and forks of one store are serialised by
+    its lock, so a snapshot always sees a state between two edits.
+    """
+
+    def __init__(self, rules: Iterable[Rule] = ()) -> None:
+        self._data = _RuleData()
+        self._lock = threading.RLock()
+        self._read_only = False
+        self.version = 0
+        for rule in rules:
+            self.add(rule)
+
+    def __del__(self) -> None:
+        data = getattr(self, "_data", None)
+        if data is not None:
+            data.release()
+
+    # Copy-on-write ----------------------------------------------------
+    def fork(self, *, read_only: bool = False) -> "RuleStore":
+        """Return a store sharing this one's rules until either side writes."""
+
+        store = RuleStore.__new__(RuleStore)
+        store._lock = threading.RLock()
+        store._read_only = read_only
+        with self._lock:
+            self._data.acquire()
+            store._data = self._data
+            store.version = self.version
+        return store
+
+    def snapshot(self) -> "RuleStore":
+        return self.fork(read_only=True)
+
+    @property
+    def read_only(self) -> bool:
+        return self._read_only
+
+    def _writable(self) -> _RuleData:
+        """Return storage owned by this store alone; call with ``_lock`` held."""
+
+        if self._read_only:
+            raise RuntimeError("Rule store snapshot is read-only.")
+        data = self._data
+        with data.lock:
+            shared = data.owners > 1
+        if shared:
+            # Copy before letting go: while we still count as an owner no
+            # other sharer may start writing to ``data`` in place.
+            self._data = data.copy()
+            data.release()
+        self._data.ordered = None
+        self.version += 1
+        return self._data
+
+    # Sequence protocol (id order) ------------------------------------
+    def _sorted(self) -> Tuple[Rule, ...]:
+        data = self._data
+        ordered = data.ordered
+        if ordered is None:
+            by_id = data.by_id
+            ordered = tuple(by_id[rule_id] for rule_id in sorted(by_id))
+            data.ordered = ordered
+        return ordered
+
+    def __len__(self) -> int:
+        return len(self._data.by_id)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        return self._sorted()[index]
+
+    def __iter__(self) -> Iterator[Rule]:
+        return iter(self._sorted())
+
+    def __contains__(self, item: object) -> bool:
+        if isinstance(item, Rule):
+            return self._data.by_id.get(item.id) == item
+        return False
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Sequence):
+            return list(self._sorted()) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"RuleStore({list(self._sorted())!r})"
+
+    # Mutation ---------------------------------------------------------
+    def add(self, rule: Rule) -> None:
+        with self._lock:
+            if rule.id in self._data.by_id:
+                raise ValueError(f"Rule id {rule.id} already exists.")
+            data = self._writable()
+            data.by_id[rule.id] = rule
+            self._index(data, rule)
+
+    def extend(self, rules: Iterable[Rule]) -> int:
+        """Add many rules as one edit (a single version bump); returns the count.
+
+        Nothing is added if any id is already present or repeated.
+        """
+
+        batch = list(rules)
+        with self._lock:
+            ids = {rule.id for rule in batch}
+            if len(ids) != len(batch) or any(i in self._data.by_id for i in ids):
+                raise ValueError("Bulk rules contain duplicate or existing ids.")
+            data = self._writable()
+            by_id, by_conclusion, by_premise = data.by_id, data.by_conclusion, data.by_premise
+            for rule in batch:
+                by_id[rule.id] = rule
+                rule_id = rule.id
+                bucket = by_conclusion.get(rule.conclusion)
+                if bucket is None:
+                    bucket = by_conclusion[rule.conclusion] = {}
+                bucket[rule_id] = rule
+                for premise in rule.premises:
+                    bucket = by_premise.get(premise)
+                    if bucket is None:
+                        bucket = by_premise[premise] = {}
+                    bucket[rule_id] = rule
+        return len(batch)
+
+    def replace(self, rule: Rule) -> Rule:
+        with self._lock:
+            previous = self.get(rule.id)
+            data = self._writable()
+            self._unindex(data, previous)
+            data.by_id[rule.id] = rule
+            self._index(data, rule)
+            return previous
+
+    def remove(self, rule_id: int) -> Rule:
+        with self._lock:
+            rule = self.get(rule_id)
+            data = self._writable()
+            del data.by_id[rule_id]
+            self._unindex(data, rule)
+            return rule
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._read_only:
+                raise RuntimeError("Rule store snapshot is read-only.")
+            self._data.release()
+            self._data = _RuleData()
+            self.version += 1
+
+    # Lookups ----------------------------------------------------------
+    def get(self, rule_id: int) -> Rule:
+        try:
+            return self._data.by_id[rule_id]
+        except KeyError as exc:
+            raise KeyError(f"Unknown rule id: {rule_id}") from exc
+
+    def has_id(self, rule_id: int) -> bool:
+        return rule_id in self._data.by_id
+
+    def max_id(self) -> int:
+        return max(self._data.by_id, default=0)
+
+    def concluding(self, atom: str) -> Tuple[Rule, ...]:
+        """Rules whose conclusion is ``atom``, in id order."""
+
+        return self._bucket(self._data.by_conclusion, atom)
+
+    def with_premise(self, atom: str) -> Tuple[Rule, ...]:
+        """Rules that use ``atom`` as a premise, in id order."""
+
+        return self._bucket(self._data.by_premise, atom)
+
+    @staticmethod
+    def _bucket(index: Dict[str, Dict[int, Rule]], atom: str) -> Tuple[Rule, ...]:
+        bucket = index.get(atom)
+        if not bucket:
+            return ()
+        return tuple(bucket[rule_id] for rule_id in sorted(bucket))
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by rule objects, atom strings and indexes."""
+
+        data = self._data
+        rules = sum(
+            sys.getsizeof(rule) + sys.getsizeof(rule.premises)
+            for rule in data.by_id.values()
+        )
+        atoms = sum(
+            sys.getsizeof(atom)
+            for atom in {a for rule in data.by_id.values() for a in rule.premises}
+            | {rule.conclusion for rule in data.by_id.values()}
+        )
+        indexes = sys.getsizeof(data.by_id) + sum(
+            sys.getsizeof(index) + sum(sys.getsizeof(b) for b in index.values())
+            for index in (data.by_conclusion, data.by_premise)
+        )
+        return {
+            "rules": len(data.by_id),
+            "rule_objects_bytes": rules,
+            "atom_bytes": atoms,
+            "index_bytes": indexes,
+            "total_bytes": rules + atoms + indexes,
+        }
+
+    @staticmethod
+    def _index(data: _RuleData, rule: Rule) -> None:
+        data.by_conclusion.setdefault(rule.conclusion, {})[rule.id] = rule
+        for premise in rule.premises:
+            data.by_premise.setdefault(premise, {})[rule.id] = rule
+
+    @staticmethod
+    def _unindex(data: _RuleData, rule: Rule) -> None:
+        for index, atom in [(data.by_conclusion, rule.conclusion)] + [
+            (data.by_premise, premise) for premise in rule.premises
+        ]:
+            bucket = index.get(atom)
+            if bucket is not None:
+                bucket.pop(rule.id, None)
+                if not bucket:
+                    del index[atom]
+
 
 @dataclass
 class KnowledgeBase:
-    """In-memory storage for rules and known facts."""
+    """In-memory storage for rules and known facts.
 
-    rules: List[Rule] = field(default_factory=list)
+    ``rules`` may be passed as any sequence of ``Rule`` objects; it is kept
+    as a ``RuleStore`` (id order, conclusion/premise indexes, version).
+    Pass a ``CompactRuleStore`` instead to keep a very large rule set packed
+    in integer arrays.
+    ``clone()`` and ``snapshot()`` share that store copy-on-write.
+    """
+
+    rules: Sequence[Rule] = field(default_factory=list)
     facts: Set[str] = field(default_factory=set)
     name: str = "knowledge-base"
 
     def __post_init__(self) -> None:
+        if not isinstance(self.rules, (RuleStore, CompactRuleStore)):
+            self.rules = RuleStore(self.rules)
         self._rebuild_index()
+        self._compiled: Optional[Tuple[int, FrozenSet[str], "CompiledRuleBase"]] = None
+        self._read_only = self.rules.read_only
+
+    def _ensure_writable(self) -> None:
+        if self._read_only:
+            raise RuntimeError(f"Knowledge base snapshot '{self.name}' is read-only.")
 
     def _rebuild_index(self) -> None:
-        self._rules_by_id = {rule.id: rule for rule in self.rules}
-        self._next_id = max(self._rules_by_id.keys(), default=0) + 1
+        self._next_id = self.rules.max_id() + 1
+
+    @property
+    def version(self) -> int:
+        """Counter bumped on every rule change."""
+
+        return self.rules.version
 
     # ------------------------------------------------------------------
     # Rule management
     # ------------------------------------------------------------------
     def iter_rules(self) -> Iterator[Rule]:
-        yield from sorted(self.rules, key=lambda rule: rule.id)
+        return iter(self.rules)
 
     def get_rule(self, rule_id: int) -> Rule:
-        try:
-            return self._rules_by_id[rule_id]
-        except KeyError as exc:
-            raise KeyError(f"Unknown rule id: {rule_id}") from exc
+        return self.rules.get(rule_id)
+
+    def rules_concluding(self, atom: str) -> Tuple[Rule, ...]:
+        return self.rules.concluding(atom)
+
+    def rules_with_premise(self, atom: str) -> Tuple[Rule, ...]:
+        return self.rules.with_premise(atom)
+
+    def compile(self) -> "CompiledRuleBase":
+        """Return a compiled rule base, reused until rules or facts change."""
+
+        from .compiled import CompiledRuleBase
+
+        facts = frozenset(self.facts)
+        cached = self._compiled
+        if cached is not None and cached[0] == self.version and cached[1] == facts:
+            return cached[2]
+        compiled = CompiledRuleBase(self.rules, facts=facts, name=self.name)
+        self._compiled = (self.version, facts, compiled)
+        return compiled
 
     def add_rule(
         self,
@@ -44,10 +359,10 @@ class KnowledgeBase:
         *,
         rule_id: Optional[int] = None,
     ) -> Rule:
+        self._ensure_writable()
         rid = self._allocate_rule_id(rule_id)
         rule = Rule.from_parts(rid, premises, conclusion)
-        self.rules.append(rule)
-        self._register_rule(rule)
+        self.rules.add(rule)
         return rule
 
     def add_rule_from_text(self, text: str, *, rule_id: Optional[int] = None) -> Rule:
@@ -61,18 +376,49 @@ class KnowledgeBase:
         premises: Iterable[str] | None = None,
         conclusion: str | None = None,
     ) -> Rule:
+        self._ensure_writable()
         existing = self.get_rule(rule_id)
         updated = existing.with_updates(premises=premises, conclusion=conclusion)
-        index = self.rules.index(existing)
-        self.rules[index] = updated
-        self._rules_by_id[rule_id] = updated
+        self.rules.replace(updated)
         return updated
 
     def remove_rule(self, rule_id: int) -> Rule:
-        rule = self.get_rule(rule_id)
-        self.rules.remove(rule)
-        del self._rules_by_id[rule_id]
-        return rule
+        self._ensure_writable()
+        return self.rules.remove(rule_id)
+
+    def add_rules(self, rows: Iterable[Tuple[Iterable[str], str]]) -> List[Rule]:
+        """Add ``(premises, conclusion)`` rows in one bulk step.
+
+        Premise lists are used as given, without the text parser, so atoms
+        may contain characters that ``split_atoms`` treats as separators.
+        Each distinct atom string is normalised and checked once. New rules
+        get consecutive ids in row order and are returned in that order. A
+        row with an empty atom or no premises raises ``ValueError`` naming
+        its position, and then nothing is added.
+        """
+
+        self._ensure_writable()
+        checked: Dict[str, str] = {}
+
+        def atom_of(raw: object, row: int) -> str:
+            atom = checked.get(raw) if isinstance(raw, str) else None
+            if atom is None:
+                atom = normalize_atom(raw) if isinstance(raw, str) else ""
+                if not atom:
+                    raise ValueError(f"Rule #{row + 1} has an empty or non-text atom: {raw!r}")
+                checked[raw] = atom  # type: ignore[index]
+            return atom
+
+        first_id = self._next_id
+        rules: List[Rule] = []
+        for row, (premises, conclusion) in enumerate(rows):
+            premise_atoms = tuple(dict.fromkeys(atom_of(raw, row) for raw in premises))
+            if not premise_atoms:
+                raise ValueError(f"Rule #{row + 1} is missing premises.")
+            rules.append(Rule(first_id + row, premise_atoms, atom_of(conclusion, row)))
+        self.rules.extend(rules)
+        self._next_id = first_id + len(rules)
+        return rules
 
     def load_rules_from_text(self, text: str) -> None:
         for line in text.splitlines():
@@ -85,11 +431,47 @@ class KnowledgeBase:
         content = Path(path).read_text(encoding="utf-8")
         self.load_rules_from_text(content)
 
+    def load_rules_streaming(
+        self,
+        path: Path,
+        *,
+        workers: Optional[int] = None,
+        chunk_lines: int = DEFAULT_CHUNK_LINES,
+    ) -> BulkLoadReport:
+        """Load a large rule file chunk by chunk, parsing on a process pool.
+
+        New rules get consecutive ids in line order. Malformed lines are
+        reported in ``BulkLoadReport.errors`` (with line numbers) and skipped
+        instead of aborting the load; the indexes are built in one bulk step
+        at the end.
+        """
+
+        self._ensure_writable()
+        started = time.perf_counter()
+        report = BulkLoadReport()
+        with Path(path).open("r", encoding="utf-8") as handle:
+            rules = list(
+                parse_rule_stream(
+                    handle,
+                    start_id=self._next_id,
+                    workers=workers,
+                    chunk_lines=chunk_lines,
+                    report=report,
+                )
+            )
+        report.rules_loaded = self.rules.extend(rules)
+        if rules:
+            report.first_id, report.last_id = rules[0].id, rules[-1].id
+            self._next_id = rules[-1].id + 1
+        report.elapsed = time.perf_counter() - started
+        return report
+
     def export_rules_text(self) -> str:
         lines = [rule.to_text() for rule in self.iter_rules()]
         return "\n".join(lines)
 
     def clear_rules(self) -> None:
+        self._ensure_writable()
         self.rules.clear()
         self._rebuild_index()
 
@@ -98,26 +480,26 @@ class KnowledgeBase:
             rid = self._next_id
             self._next_id += 1
             return rid
-        if preferred in self._rules_by_id:
+        if self.rules.has_id(preferred):
             raise ValueError(f"Rule id {preferred} already exists.")
         if preferred >= self._next_id:
             self._next_id = preferred + 1
         return preferred
 
-    def _register_rule(self, rule: Rule) -> None:
-        self._rules_by_id[rule.id] = rule
-
     # ------------------------------------------------------------------
     # Fact management
     # ------------------------------------------------------------------
     def load_facts_from_text(self, text: str) -> None:
+        self._ensure_writable()
         for atom in split_atoms(text):
             self.facts.add(atom)
 
     def set_facts(self, facts: Iterable[str]) -> None:
+        self._ensure_writable()
         self.facts = {normalize_atom(fact) for fact in facts if normalize_atom(fact)}
 
     def add_fact(self, fact: str) -> str:
+        self._ensure_writable()
         atom = normalize_atom(fact)
         if not atom:
             raise ValueError("Fact cannot be empty.")
@@ -125,21 +507,45 @@ class KnowledgeBase:
         return atom
 
     def remove_fact(self, fact: str) -> None:
+        self._ensure_writable()
         atom = normalize_atom(fact)
         self.facts.discard(atom)
 
     def clear_facts(self) -> None:
+        self._ensure_writable()
         self.facts.clear()
 
     # ------------------------------------------------------------------
     # Convenience
     # ------------------------------------------------------------------
     def clone(self) -> "KnowledgeBase":
-        return KnowledgeBase(
-            rules=list(self.iter_rules()),
-            facts=set(self.facts),
+        """Writable copy; rules are shared until either side edits them."""
+
+        return self._fork(read_only=False)
+
+    def snapshot(self) -> "KnowledgeBase":
+        """Read-only O(1) view of the current rules and facts.
+
+        Later edits of this knowledge base do not show through, so a request
+        can reason over a consistent state while an admin keeps editing.
+        """
+
+        return self._fork(read_only=True)
+
+    def _fork(self, *, read_only: bool) -> "KnowledgeBase":
+        rules = self.rules.fork(read_only=read_only)
+        forked = KnowledgeBase(
+            rules=rules,
+            facts=frozenset(self.facts) if read_only else set(self.facts),
             name=self.name,
         )
+        forked._next_id = self._next_id
+        if self._compiled is not None and self._compiled[0] == rules.version:
+            forked._compiled = self._compiled
+        return forked
+
+    def memory_usage(self) -> Dict[str, int]:
+        return self.rules.memory_usage()
 
     def summary(self) -> str:
         rule_count = len(self.rules)
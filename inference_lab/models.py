@@ -16,7 +16,7 @@ def _dedupe_preserve_order(items: Iterable[str]) -> Tuple[str, ...]:
     return tuple(ordered)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Rule:
     """Inference rule represented by an identifier, premises and conclusion."""
 
@@ -0,0 +1,185 @@
+"""Content-addressed store of rendered graphs.
+
+The same rules, facts and goals always build the same FPG/RPG, so a render
+is identified by a SHA-256 of the built ``nx.DiGraph`` (nodes, edges and
+their attributes, in sorted order) together with the styling parameters
+passed to the renderer. ``RenderCache.get_or_render`` returns the stored
+file for a known key and renders into the cache otherwise; identical
+renders requested at the same time are rendered once. Files live under
+``root/<key[:2]>/<key>.<fmt>`` and are served from there. When the total
+size passes ``max_bytes`` the least recently used renders are deleted.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+import networkx as nx
+
+Renderer = Callable[[Path], Optional[Path]]
+
+
+def graph_key(graph: nx.DiGraph, style: Mapping[str, Any]) -> str:
+    """Hex digest identifying ``graph`` rendered with ``style``."""
+
+    nodes = sorted((str(node), sorted(data.items())) for node, data in graph.nodes(data=True))
+    edges = sorted(
+        (str(source), str(target), sorted(data.items()))
+        for source, target, data in graph.edges(data=True)
+    )
+    payload = json.dumps(
+        {"nodes": nodes, "edges": edges, "style": sorted(style.items())},
+        default=_jsonable,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return sorted(map(str, value))
+    return str(value)
+
+
+class RenderCache:
+    """Size-bounded, least-recently-used store of rendered graph files.
+
+    Attributes:
+        root: Directory holding the renders.
+        max_bytes: Total size kept before the oldest renders are deleted;
+            the newest render is always kept.
+    """
+
+    def __init__(self, root: Path, *, max_bytes: int = 64 * 1024 * 1024) -> None:
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1.")
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (path, size), least recently used first
+        self._entries: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        self._rendering: Dict[str, threading.Lock] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._scan()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_render(self, key: str, fmt: str, render: Renderer) -> Optional[Path]:
+        """The file stored for ``key``; ``render(path)`` produces it if missing.
+
+        ``render`` receives the target path without suffix and returns the
+        written file, or ``None`` when nothing could be rendered.
+        """
+
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            gate = self._rendering.setdefault(key, threading.Lock())
+        with gate:
+            # A concurrent request may have rendered it while we waited.
+            cached = self._lookup(key, count=False)
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                return cached
+            try:
+                path = self._path(key, fmt)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}")
+                try:
+                    rendered = render(temp)
+                finally:
+                    # Sources and partial output of a failed render.
+                    temp.unlink(missing_ok=True)
+                if rendered is None:
+                    return None
+                os.replace(rendered, path)
+                self._store(key, path)
+                return path
+            finally:
+                with self._lock:
+                    self._rendering.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _path(self, key: str, fmt: str) -> Path:
+        return self.root / key[:2] / f"{key}.{fmt}"
+
+    def _lookup(self, key: str, *, count: bool = True) -> Optional[Path]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry[0].exists():
+                # Deleted behind our back (e.g. shutdown cleanup).
+                del self._entries[key]
+                self.bytes -= entry[1]
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def _store(self, key: str, path: Path) -> None:
+        size = path.stat().st_size
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (path, size)
+            self.bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            _, (old, old_size) = self._entries.popitem(last=False)
+            old.unlink(missing_ok=True)
+            self.bytes -= old_size
+            self.evictions += 1
+
+    def _scan(self) -> None:
+        """Index renders left by an earlier process, oldest first."""
+
+        found = []
+        for path in self.root.glob("*/*.*"):
+            if path.name.startswith("."):
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            found.append((stat.st_mtime, path.stem, path, stat.st_size))
+        for _, key, path, size in sorted(found):
+            self._entries[key] = (path, size)
+            self.bytes += size
+        self._evict()
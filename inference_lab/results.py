@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
+from collections import deque
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set
 
 
 @dataclass
@@ -18,14 +19,211 @@ class StepTrace:
     note: str | None = None
 
 
+@dataclass
+class TraceDelta:
+    """Changes made by one forward step (``trace="delta"``)."""
+
+    step: int
+    rule_id: Optional[int]
+    added_fact: Optional[str]
+    pushed: List[int]
+    note: str | None = None
+
+
+class LazyStepHistory(Sequence[StepTrace]):
+    """Read-only ``StepTrace`` view rebuilt on demand from ``TraceDelta`` records.
+
+    Only the initial state and the per-step deltas are stored; full snapshots
+    are replayed when the history is iterated. The first indexed access
+    replays every step once and keeps the snapshots, so indexing in a loop
+    stays linear.
+    """
+
+    def __init__(
+        self,
+        deltas: List[TraceDelta],
+        *,
+        initial_facts: Iterable[str],
+        rule_ids: Iterable[int],
+        structure: str,
+    ) -> None:
+        self.deltas = deltas
+        self._initial_facts = frozenset(initial_facts)
+        self._rule_ids = frozenset(rule_ids)
+        self._structure = structure
+        self._traces: Optional[List[StepTrace]] = None
+
+    def __len__(self) -> int:
+        return len(self.deltas)
+
+    def __iter__(self) -> Iterator[StepTrace]:
+        if self._traces is not None:
+            return iter(self._traces)
+        return self._replay(len(self.deltas))
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if self._traces is None:
+            self._traces = list(self._replay(len(self.deltas)))
+        try:
+            return self._traces[index]
+        except IndexError:
+            raise IndexError("history index out of range") from None
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def _replay(self, stop: int) -> Iterator[StepTrace]:
+        known: Set[str] = set(self._initial_facts)
+        remaining: Set[int] = set(self._rule_ids)
+        thoa: deque[int] = deque()
+        fired: List[int] = []
+        for delta in self.deltas[:stop]:
+            if delta.rule_id is not None:
+                if self._structure == "stack":
+                    thoa.pop()
+                else:
+                    thoa.popleft()
+                fired.append(delta.rule_id)
+                remaining.discard(delta.rule_id)
+            if delta.added_fact is not None:
+                known.add(delta.added_fact)
+            thoa.extend(delta.pushed)
+            yield StepTrace(
+                step=delta.step,
+                rule_id=delta.rule_id,
+                known_facts=sorted(known),
+                thoa=list(thoa),
+                remaining_rules=sorted(remaining),
+                fired_rules=list(fired),
+                note=delta.note,
+            )
+
+
 @dataclass
 class ForwardResult:
+    """Forward chaining outcome.
+
+    ``history`` depends on the ``trace`` level the engine ran with: a list of
+    snapshots (``full``), a ``LazyStepHistory`` (``delta``), the first and
+    last snapshots (``summary``) or nothing (``none``). ``step_count`` is
+    always the number of entries the full history has.
+    """
+
     success: bool
     goals: List[str]
     final_facts: List[str]
     fired_rules: List[int]
-    history: List[StepTrace] = field(default_factory=list)
+    history: Sequence[StepTrace] = field(default_factory=list)
     graph_files: Dict[str, Path] = field(default_factory=dict)
+    trace: str = "full"
+    step_count: int = 0
+
+
+class ProofEvent(NamedTuple):
+    """One structured entry of a backward-chaining explanation.
+
+    ``count`` is the number of candidate rules for ``expand`` events.
+    """
+
+    kind: str
+    goal: str
+    depth: int
+    rule_id: Optional[int] = None
+    outcome: Optional[bool] = None
+    count: int = 0
+
+
+class ProofLog(Sequence[str]):
+    """Backward explanation kept as structured events, rendered lazily.
+
+    The engine appends plain tuples in ``ProofEvent`` field order; the text
+    lines (identical to the ones the recursive engine used to build eagerly)
+    are only produced when the log is read, and then cached.
+    """
+
+    def __init__(
+        self,
+        events: List[tuple],
+        *,
+        mode: str = "min",
+        rule_text: Callable[[int], str] = str,
+    ) -> None:
+        self._raw = events
+        self._mode = mode
+        self._rule_text = rule_text
+        self._lines: Optional[List[str]] = None
+
+    @property
+    def events(self) -> List[ProofEvent]:
+        return [ProofEvent._make(event) for event in self._raw]
+
+    def render(self) -> List[str]:
+        if self._lines is None:
+            self._lines = [self._render_event(*event) for event in self._raw]
+        return self._lines
+
+    def _render_event(
+        self,
+        kind: str,
+        goal: str,
+        depth: int,
+        rule_id: Optional[int],
+        outcome: Optional[bool],
+        count: int,
+    ) -> str:
+        indent = "  " * depth
+        if kind == "premise":
+            return f"{indent}    • Chứng minh tiền đề '{goal}'"
+        if kind == "known":
+            return f"{indent}- Mục tiêu '{goal}' đã có trong tập tri thức."
+        if kind == "try_rule":
+            return f"{indent}  → Thử luật R{rule_id}: {self._rule_text(rule_id)}"
+        if kind == "drop_rule":
+            return f"{indent}    x Không chứng minh được '{goal}' nên bỏ luật R{rule_id}."
+        if kind == "expand":
+            return (
+                f"{indent}- Đang xét {count} luật cho mục tiêu '{goal}' "
+                f"(ưu tiên: {self._mode})."
+            )
+        if kind == "proved":
+            return f"{indent}  ✓ Mục tiêu '{goal}' được chứng minh nhờ R{rule_id}."
+        if kind == "shared":
+            return f"{indent}  ↺ Dùng lại chứng minh '{goal}' (R{rule_id}) đã có ở trên."
+        if kind == "failed":
+            return f"{indent}- Không chứng minh được '{goal}'."
+        if kind == "no_rules":
+            return f"{indent}- Không có luật nào kết luận '{goal}'."
+        if kind == "cycle":
+            return f"{indent}- Phát hiện vòng lặp khi chứng minh '{goal}'."
+        if kind == "tabled_failure":
+            return f"{indent}- Mục tiêu '{goal}' đã thất bại trước đó (bảng thất bại)."
+        if kind == "goal_given":
+            return f"Mục tiêu '{goal}' đã thỏa từ đầu."
+        if kind == "goal_start":
+            return f"\n=== BẮT ĐẦU CHỨNG MINH MỤC TIÊU '{goal}' ==="
+        if kind == "goal_failed":
+            return f"!!! Thất bại khi chứng minh '{goal}'."
+        if kind == "goal_done":
+            return f"+++ Hoàn tất mục tiêu '{goal}'."
+        raise ValueError(f"Unknown proof event kind: {kind}")
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if self._lines is None and isinstance(index, int):
+            return self._render_event(*self._raw[index])
+        return self.render()[index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.render())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Sequence):
+            return self.render() == list(other)
+        return NotImplemented
 
 
 @dataclass
@@ -34,6 +232,8 @@ class BackwardResult:
     goals: List[str]
     final_known: List[str]
     used_rules: List[int]
-    steps: List[str]
+    steps: Sequence[str]
     graph_files: Dict[str, Path] = field(default_factory=dict)
+    cache_stats: Dict[str, int] = field(default_factory=dict)
+    goal_status: Dict[str, bool] = field(default_factory=dict)
 
@@ -0,0 +1,345 @@
+"""In-process layered layout and SVG output for inference graphs.
+
+A Sugiyama-style drawing without Graphviz: nodes sit on the layers given by
+``levels`` (the same layering the Graphviz renderer passes as
+``rank=same`` groups), edges spanning several layers are routed through
+dummy points, a few barycentre sweeps reduce crossings, and each layer's
+nodes are then pulled towards their neighbours without overlapping. Edges
+that point backwards (cycles) are laid out as if reversed; edges between
+nodes of the same layer are drawn as arcs. Sizes are in points, as in
+Graphviz's SVG output.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Set, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import networkx as nx
+
+Point = Tuple[float, float]
+
+SWEEPS = 4
+PAD = 29.0  # 0.4in, Graphviz "pad"
+
+
+@dataclass
+class NodeStyle:
+    """How one node is drawn (colours as CSS strings, sizes in points)."""
+
+    shape: str  # "circle" or "box"
+    width: float
+    height: float
+    fill: str
+    stroke: str
+    stroke_width: float
+    label: str = ""
+
+
+@dataclass
+class EdgeStyle:
+    color: str = "#94a3b8"
+    width: float = 1.1
+    arrow: float = 0.7
+
+
+@dataclass
+class Layout:
+    """Node centres and edge polylines of a layered drawing.
+
+    ``arcs`` are the edges within one layer, whose middle route point is a
+    curve control point rather than a point on the edge.
+    """
+
+    positions: Dict[Hashable, Point] = field(default_factory=dict)
+    routes: Dict[Tuple[Hashable, Hashable], List[Point]] = field(default_factory=dict)
+    arcs: Set[Tuple[Hashable, Hashable]] = field(default_factory=set)
+    width: float = 0.0
+    height: float = 0.0
+
+
+def layered_layout(
+    graph: nx.DiGraph,
+    levels: Mapping[Hashable, int],
+    styles: Mapping[Hashable, NodeStyle],
+    *,
+    rankdir: str = "LR",
+    order_key: Optional[Callable[[Hashable], object]] = None,
+    ranksep: float = 72.0,
+    nodesep: float = 43.0,
+) -> Layout:
+    """Place ``graph`` on the layers ``levels`` and route its edges."""
+
+    horizontal = rankdir in ("LR", "RL")
+    # Extent of a node along the rank axis and along the layer.
+    along = lambda node: styles[node].width if horizontal else styles[node].height  # noqa: E731
+    across = lambda node: styles[node].height if horizontal else styles[node].width  # noqa: E731
+
+    depth = max(levels.values(), default=-1) + 1
+    layers: List[List[Hashable]] = [[] for _ in range(depth)]
+    for node in sorted(graph.nodes, key=order_key or str):
+        layers[levels[node]].append(node)
+
+    # Proper layering: every edge between adjacent layers, through dummies.
+    up: Dict[Hashable, List[Hashable]] = {}
+    down: Dict[Hashable, List[Hashable]] = {}
+    chains: Dict[Tuple[Hashable, Hashable], List[Hashable]] = {}
+    for source, target in graph.edges:
+        low, high = (source, target) if levels[source] <= levels[target] else (target, source)
+        if levels[low] == levels[high]:
+            continue
+        chain = [low]
+        for level in range(levels[low] + 1, levels[high]):
+            dummy = ("__dummy__", source, target, level)
+            layers[level].append(dummy)
+            chain.append(dummy)
+        chain.append(high)
+        for upper, lower in zip(chain, chain[1:]):
+            down.setdefault(upper, []).append(lower)
+            up.setdefault(lower, []).append(upper)
+        chains[(source, target)] = chain if low == source else chain[::-1]
+
+    _reduce_crossings(layers, up, down)
+
+    size_across = lambda node: across(node) if node in styles else 0.0  # noqa: E731
+    coords = _assign_coordinates(layers, up, down, size_across, nodesep)
+
+    # Rank axis: each layer as wide as its widest node.
+    rank_pos: List[float] = []
+    offset = PAD
+    for layer in layers:
+        extent = max((along(node) for node in layer if node in styles), default=0.0)
+        rank_pos.append(offset + extent / 2)
+        offset += extent + ranksep
+    rank_extent = offset - ranksep + PAD if layers else 2 * PAD
+    order_extent = max(
+        (coords[node] + size_across(node) / 2 for layer in layers for node in layer),
+        default=0.0,
+    ) + PAD
+
+    def point(node: Hashable) -> Point:
+        rank = rank_pos[levels[node] if node in styles else node[3]]
+        if rankdir in ("RL", "BT"):
+            rank = rank_extent - rank
+        return (rank, coords[node]) if horizontal else (coords[node], rank)
+
+    layout = Layout(
+        width=rank_extent if horizontal else order_extent,
+        height=order_extent if horizontal else rank_extent,
+    )
+    for node in graph.nodes:
+        layout.positions[node] = point(node)
+    for source, target in graph.edges:
+        chain = chains.get((source, target))
+        if chain is None:
+            layout.routes[(source, target)] = _arc(point(source), point(target), horizontal)
+            layout.arcs.add((source, target))
+        else:
+            layout.routes[(source, target)] = [point(node) for node in chain]
+    return layout
+
+
+def _reduce_crossings(
+    layers: List[List[Hashable]],
+    up: Mapping[Hashable, List[Hashable]],
+    down: Mapping[Hashable, List[Hashable]],
+) -> None:
+    """Barycentre heuristic, alternating downward and upward sweeps."""
+
+    for sweep in range(SWEEPS):
+        if sweep % 2 == 0:
+            order, neighbours = range(1, len(layers)), up
+        else:
+            order, neighbours = range(len(layers) - 2, -1, -1), down
+        for index in order:
+            layer = layers[index]
+            adjacent = layers[index - 1] if sweep % 2 == 0 else layers[index + 1]
+            position = {node: i for i, node in enumerate(adjacent)}
+            keys = {}
+            for i, node in enumerate(layer):
+                linked = [position[other] for other in neighbours.get(node, ()) if other in position]
+                keys[node] = sum(linked) / len(linked) if linked else float(i)
+            layer.sort(key=keys.__getitem__)
+
+
+def _assign_coordinates(
+    layers: Sequence[List[Hashable]],
+    up: Mapping[Hashable, List[Hashable]],
+    down: Mapping[Hashable, List[Hashable]],
+    size: Callable[[Hashable], float],
+    nodesep: float,
+) -> Dict[Hashable, float]:
+    """Coordinate along each layer: packed, then pulled towards neighbours."""
+
+    coords: Dict[Hashable, float] = {}
+    for layer in layers:
+        offset = PAD
+        previous = None
+        for node in layer:
+            if previous is not None:
+                offset += _gap(previous, node, size, nodesep) - (size(previous) + size(node)) / 2
+            coords[node] = offset + size(node) / 2
+            offset += size(node)
+            previous = node
+    for sweep in range(SWEEPS):
+        neighbours = up if sweep % 2 == 0 else down
+        indices = range(len(layers)) if sweep % 2 == 0 else range(len(layers) - 1, -1, -1)
+        for index in indices:
+            layer = layers[index]
+            wanted = []
+            for node in layer:
+                linked = [coords[other] for other in neighbours.get(node, ())]
+                wanted.append(sum(linked) / len(linked) if linked else coords[node])
+            _place(layer, wanted, coords, size, nodesep)
+    low = min(
+        (coords[node] - size(node) / 2 for layer in layers for node in layer), default=PAD
+    )
+    return {node: value - low + PAD for node, value in coords.items()}
+
+
+def _place(
+    layer: List[Hashable],
+    wanted: List[float],
+    coords: Dict[Hashable, float],
+    size: Callable[[Hashable], float],
+    nodesep: float,
+) -> None:
+    """Move ``layer`` as close to ``wanted`` as the spacing allows."""
+
+    placed = list(wanted)
+    for i in range(1, len(layer)):
+        gap = _gap(layer[i - 1], layer[i], size, nodesep)
+        placed[i] = max(placed[i], placed[i - 1] + gap)
+    # Spread the push-down evenly: shift the block back by the mean drift.
+    drift = sum(p - w for p, w in zip(placed, wanted)) / len(layer) if layer else 0.0
+    for node, value in zip(layer, placed):
+        coords[node] = value - drift
+
+
+def _gap(
+    first: Hashable, second: Hashable, size: Callable[[Hashable], float], nodesep: float
+) -> float:
+    """Distance between neighbouring centres; edge bends pack tighter."""
+
+    if size(first) and size(second):
+        return (size(first) + size(second)) / 2 + nodesep
+    return (size(first) + size(second)) / 2 + nodesep / 3
+
+
+def _arc(start: Point, end: Point, horizontal: bool) -> List[Point]:
+    """Control points of an edge between two nodes of the same layer."""
+
+    bulge = 0.35 * math.dist(start, end) + 20.0
+    mid = ((start[0] + end[0]) / 2, (start[1] + end[1]) / 2)
+    control = (mid[0] + bulge, mid[1]) if horizontal else (mid[0], mid[1] - bulge)
+    return [start, control, end]
+
+
+# ----------------------------------------------------------------------
+# SVG output
+# ----------------------------------------------------------------------
+def write_svg(
+    graph: nx.DiGraph,
+    layout: Layout,
+    styles: Mapping[Hashable, NodeStyle],
+    edge_styles: Mapping[Tuple[Hashable, Hashable], EdgeStyle],
+    output: Path,
+    *,
+    font: str = "Arial",
+    font_size: float = 11.0,
+) -> Path:
+    """Write ``layout`` as a standalone SVG file and return its path."""
+
+    width, height = layout.width, layout.height
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}pt" height="{height:.0f}pt"'
+        f' viewBox="0.00 0.00 {width:.2f} {height:.2f}">',
+        "<defs>",
+    ]
+    markers: Dict[Tuple[str, float], str] = {}
+    for edge_style in edge_styles.values():
+        key = (edge_style.color, edge_style.arrow)
+        if key not in markers:
+            marker = markers[key] = f"arrow{len(markers)}"
+            size = 10.0 * edge_style.arrow
+            lines.append(
+                f'<marker id="{marker}" viewBox="0 0 10 10" refX="10" refY="5"'
+                f' markerUnits="userSpaceOnUse" markerWidth="{size:.1f}" markerHeight="{size:.1f}"'
+                ' orient="auto"><path d="M0,0 L10,5 L0,10 L4,5 z"'
+                f" fill={quoteattr(edge_style.color)}/></marker>"
+            )
+    lines.append("</defs>")
+    lines.append('<rect width="100%" height="100%" fill="#ffffff"/>')
+    lines.append(f'<g font-family={quoteattr(font)} font-size="{font_size:g}">')
+
+    # Edges first, as Graphviz's outputorder="edgesfirst".
+    for source, target in graph.edges:
+        edge_style = edge_styles[(source, target)]
+        points = list(layout.routes[(source, target)])
+        points[0] = _boundary(styles[source], points[0], points[1])
+        points[-1] = _boundary(styles[target], points[-1], points[-2])
+        lines.append(
+            f'<g class="edge"><title>{escape(f"{source}->{target}")}</title>'
+            f'<path d="{_path(points, (source, target) in layout.arcs)}" fill="none" stroke={quoteattr(edge_style.color)}'
+            f' stroke-width="{edge_style.width:g}"'
+            f' marker-end="url(#{markers[(edge_style.color, edge_style.arrow)]})"/></g>'
+        )
+
+    for node in graph.nodes:
+        style = styles[node]
+        x, y = layout.positions[node]
+        paint = (
+            f"fill={quoteattr(style.fill)} stroke={quoteattr(style.stroke)}"
+            f' stroke-width="{style.stroke_width:g}"'
+        )
+        if style.shape == "circle":
+            shape = f'<circle cx="{x:.2f}" cy="{y:.2f}" r="{style.width / 2:.2f}" {paint}/>'
+        else:
+            shape = (
+                f'<rect x="{x - style.width / 2:.2f}" y="{y - style.height / 2:.2f}"'
+                f' width="{style.width:.2f}" height="{style.height:.2f}" rx="6" {paint}/>'
+            )
+        label = escape(style.label or str(node))
+        lines.append(
+            f'<g class="node"><title>{escape(str(node))}</title>{shape}'
+            f'<text x="{x:.2f}" y="{y:.2f}" text-anchor="middle"'
+            f' dominant-baseline="central">{label}</text></g>'
+        )
+    lines.append("</g>")
+    lines.append("</svg>")
+
+    output = Path(output)
+    output.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return output
+
+
+def _boundary(style: NodeStyle, centre: Point, towards: Point) -> Point:
+    """Where the segment from ``centre`` to ``towards`` leaves the node."""
+
+    dx, dy = towards[0] - centre[0], towards[1] - centre[1]
+    length = math.hypot(dx, dy)
+    if not length:
+        return centre
+    if style.shape == "circle":
+        scale = (style.width / 2) / length
+    else:
+        scale = min(
+            (style.width / 2) / abs(dx) if dx else math.inf,
+            (style.height / 2) / abs(dy) if dy else math.inf,
+        )
+    scale = min(scale, 1.0)
+    return (centre[0] + dx * scale, centre[1] + dy * scale)
+
+
+def _path(points: Sequence[Point], arc: bool) -> str:
+    if arc:
+        first, control, last = points
+        return (
+            f"M{first[0]:.2f},{first[1]:.2f} "
+            f"Q{control[0]:.2f},{control[1]:.2f} {last[0]:.2f},{last[1]:.2f}"
+        )
+    return "M" + " L".join(f"{x:.2f},{y:.2f}" for x, y in points)
@@ -7,6 +7,7 @@ from typing import Iterable, List, Sequence
 
 
 ATOM_SPLIT_PATTERN = re.compile(r"\s*(?:,|&|\?|\^|and)\s*", re.IGNORECASE)
+CONTROL_CHAR_PATTERN = re.compile(r"[\u0000-\u001F\u007F]")
 
 
 def normalize_atom(atom: str) -> str:
@@ -17,7 +18,7 @@ def split_atoms(raw: str) -> List[str]:
     if not raw:
         return []
     tokens = ATOM_SPLIT_PATTERN.split(raw.strip())
-    return [normalize_atom(token) for token in tokens if normalize_atom(token)]
+    return [atom for token in tokens if (atom := normalize_atom(token))]
 
 
 def parse_rule_text(raw: str) -> tuple[List[str], str]:
@@ -25,7 +26,7 @@ def parse_rule_text(raw: str) -> tuple[List[str], str]:
     if not text:
         raise ValueError("Rule text is empty.")
     # Normalize common arrow variants and strip control chars
-    cleaned = re.sub(r"[\u0000-\u001F\u007F]", "", text)
+    cleaned = CONTROL_CHAR_PATTERN.sub("", text)
     normalized = cleaned.replace("=>", "->").replace("→", "->").replace(":>", "->")
     if "->" in normalized:
         left, right = normalized.split("->", 1)
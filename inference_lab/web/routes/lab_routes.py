@@ -158,6 +158,7 @@ def _handle_forward(request_data: Dict[str, Any], output_dir: Path) -> Dict[str,
         index_mode=index_mode,
         make_graphs=True,
         output_dir=output_dir,
+        trace="delta",
     )
     return _serialize_forward_result(result, output_dir)
 
@@ -165,12 +166,14 @@ def _handle_forward(request_data: Dict[str, Any], output_dir: Path) -> Dict[str,
 def _handle_backward(request_data: Dict[str, Any], output_dir: Path) -> Dict[str, Any]:
     options = request_data["options"]
     index_mode = (options.get("index_mode") or "min").lower()
+    goal_mode = (options.get("goal_mode") or "sequential").lower()
 
     kb = _build_kb(request_data["rules"], request_data["facts"])
     result = run_backward_inference(
         kb,
         goals=request_data["goals"],
         index_mode=index_mode,
+        goal_mode=goal_mode,
         make_graph=True,
         output_dir=output_dir,
     )
@@ -198,7 +201,8 @@ def _serialize_backward_result(
         "goals": result.goals,
         "finalKnown": result.final_known,
         "usedRules": result.used_rules,
-        "steps": result.steps,
+        "goalStatus": result.goal_status,
+        "steps": list(result.steps),
         "graphs": _graph_urls(result.graph_files, output_dir),
     }
 
@@ -18,13 +18,15 @@ from uuid import uuid4
 from flask import (
     Blueprint,
     current_app,
+    g,
+    has_app_context,
     jsonify,
     render_template,
     request,
     url_for,
 )
 
-from inference_lab.forward import run_forward_inference
+from inference_lab.cache import get_inference_cache
 from inference_lab.graphs import GRAPHVIZ_AVAILABLE
 
 # Import Smart Diagnosis Scorer
@@ -32,10 +34,11 @@ from inference_lab.web.diagnosis_scorer import SmartDiagnosisScorer
 
 # Import Medical KB
 try:
-    from medical_kb import MedicalKnowledgeBase, extract_facts_from_form
+    from medical_kb import MedicalKnowledgeBase, extract_facts_from_form, get_registry
 except ImportError:
     MedicalKnowledgeBase = None
     extract_facts_from_form = None
+    get_registry = None
 
 
 # Create blueprint
@@ -49,20 +52,34 @@ medical_bp = Blueprint(
 )
 
 
-# Global KB instance (loaded once)
-_medical_kb = None
+def _medical_registry() -> Any:
+    if get_registry is None:
+        raise RuntimeError(
+            "Medical KB not available. Please ensure medical_kb module is installed."
+        )
+    return get_registry()
 
 
 def get_medical_kb() -> Any:
-    """Get or create Medical KB instance."""
-    global _medical_kb
-    if _medical_kb is None:
-        if MedicalKnowledgeBase is None:
-            raise RuntimeError(
-                "Medical KB not available. Please ensure medical_kb module is installed."
-            )
-        _medical_kb = MedicalKnowledgeBase()
-    return _medical_kb
+    """Get the active Medical KB, pinned for the rest of the request.
+
+    The registry reloads the JSON in the background when it changes; a
+    request that already holds a version keeps it until it finishes.
+    """
+    if has_app_context() and "medical_kb" in g:
+        return g.medical_kb
+    kb = _medical_registry().get()
+    if has_app_context():
+        g.medical_kb = kb
+    return kb
+
+
+def _inference_cache() -> Any:
+    """Process-wide inference result cache (sized by the app config)."""
+    return get_inference_cache(
+        max_entries=current_app.config.get("INFERENCE_CACHE_SIZE", 1024),
+        ttl=current_app.config.get("INFERENCE_CACHE_TTL", 600),
+    )
 
 
 def _analyze_symptoms_without_diagnosis(
@@ -287,14 +304,14 @@ def api_diagnose():
         # Run forward inference
         print(f"[DEBUG] Running inference with facts: {facts}")
         print(f"[DEBUG] Goals: {goals}")
-        result = run_forward_inference(
-            kb.kb,  # Use the internal KnowledgeBase
+        # Không tạo đồ thị; bệnh nhân có cùng facts dùng lại kết quả trong cache
+        result = _inference_cache().forward(
+            kb.compiled,  # Shared compiled rule network
             initial_facts=facts,
             goals=goals,
             strategy="stack",
             index_mode="min",
-            make_graphs=False,  # Tắt tạo đồ thị để tối ưu performance
-            output_dir=output_dir,
+            trace="none",  # Chỉ cần số bước, không cần snapshot từng bước
         )
 
         print(f"[DEBUG] Inference result success: {result.success}")
@@ -480,7 +497,7 @@ def api_diagnose():
             "inference": {
                 "fired_rules": result.fired_rules,
                 "final_facts": result.final_facts,
-                "steps": len(result.history),
+                "steps": result.step_count,
             },
             "graphs": {
                 "fpg": (
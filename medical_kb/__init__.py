@@ -8,12 +8,15 @@ endocrine, and emergency conditions.
 from .loader import MedicalKnowledgeBase
 from .form_generator import generate_form_html, extract_facts_from_form
 from .validator import RuleValidator
+from .registry import KBRegistry, get_registry
 
 __all__ = [
     "MedicalKnowledgeBase",
     "generate_form_html",
     "extract_facts_from_form",
     "RuleValidator",
+    "KBRegistry",
+    "get_registry",
 ]
 
 __version__ = "1.0.0"
@@ -0,0 +1,267 @@
+"""Columnar fact extraction for many stored interview answers at once.
+
+``extract_facts_batch`` produces, for every answer row, exactly the facts
+``extract_facts_from_form`` would, but column by column: each answer column
+is factorised into its distinct values, every ``fact_rules`` test and the
+``loai_dich_mui`` mapping run once per distinct value, numeric thresholds
+are compared as NumPy arrays, and the per-value results are gathered back
+to rows. The output is a boolean fact matrix aligned to the KB's compiled
+atoms, ready for ``inference_lab.batch.run_forward_batch``.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    NUMPY_AVAILABLE = False
+    np = None  # type: ignore[assignment]
+
+from inference_lab.batch import BatchForwardResult, run_forward_batch
+from inference_lab.compiled import CompiledRuleBase
+from inference_lab.utils import normalize_atom
+
+from .conditions import NUMERIC_OPERATORS, ConditionNode, ConditionTest
+from .form_generator import discharge_facts, is_checked, kb_fact_rules
+
+# Marks a row whose answer dict has no entry for a column.
+_MISSING = object()
+
+
+def _require_numpy() -> None:
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("Batch fact extraction requires NumPy (pip install numpy).")
+
+
+class _Column:
+    """One answer column as distinct values plus a per-row code."""
+
+    __slots__ = ("values", "codes", "_floats")
+
+    def __init__(self, values: List[Any], codes: "np.ndarray") -> None:
+        self.values = values
+        self.codes = codes
+        self._floats: Optional["np.ndarray"] = None
+
+    @classmethod
+    def from_array(cls, raw: Sequence[Any]) -> "_Column":
+        if isinstance(raw, np.ndarray) and raw.dtype.kind in "biuf":
+            uniques, codes = np.unique(raw, return_inverse=True)
+            return cls(uniques.tolist(), codes.reshape(-1))
+        builder = _ColumnBuilder(len(raw))
+        for row, value in enumerate(raw):
+            builder.add(row, value)
+        return builder.build()
+
+    def gather(self, per_value: "np.ndarray") -> "np.ndarray":
+        return per_value[self.codes]
+
+    def floats(self) -> "np.ndarray":
+        """Distinct values as floats (0 when missing, NaN if not numeric)."""
+
+        if self._floats is None:
+            converted = np.empty(len(self.values), dtype=np.float64)
+            for code, value in enumerate(self.values):
+                try:
+                    converted[code] = float(0 if value is _MISSING else value)
+                except (TypeError, ValueError):
+                    converted[code] = np.nan
+            self._floats = converted
+        return self._floats
+
+
+class _ColumnBuilder:
+    """Factorises one column's values as rows are fed in (any order).
+
+    Rows never fed in are missing (code 0).
+    """
+
+    __slots__ = ("index", "values", "rows", "codes", "size")
+
+    def __init__(self, size: int) -> None:
+        self.index: Dict[Any, int] = {}
+        self.values: List[Any] = [_MISSING]
+        self.rows: List[int] = []
+        self.codes: List[int] = []
+        self.size = size
+
+    def add(self, row: int, value: Any) -> None:
+        # Keyed by type too: True, 1 and 1.0 are equal but print differently.
+        key = value if type(value) is str else (type(value), value)
+        try:
+            code = self.index.get(key)
+        except TypeError:  # unhashable answers are compared by identity
+            key = (type(value), id(value))
+            code = self.index.get(key)
+        if code is None:
+            code = self.index[key] = len(self.values)
+            self.values.append(value)
+        self.rows.append(row)
+        self.codes.append(code)
+
+    def build(self) -> _Column:
+        codes = np.zeros(self.size, dtype=np.intp)
+        codes[np.asarray(self.rows, dtype=np.intp)] = self.codes
+        return _Column(self.values, codes)
+
+
+class _AnswerColumns:
+    def __init__(self, answers: Any) -> None:
+        self._columns: Dict[str, _Column] = {}
+        if isinstance(answers, Mapping):
+            lengths = {len(column) for column in answers.values()}
+            if len(lengths) > 1:
+                raise ValueError("Answer columns must all have the same length.")
+            self.rows = lengths.pop() if lengths else 0
+            self._raw: Dict[str, Sequence[Any]] = dict(answers)
+            return
+        # Answer dicts are sparse, so they are walked once, item by item.
+        records = answers if isinstance(answers, Sequence) else list(answers)
+        self.rows = len(records)
+        builders: Dict[str, _ColumnBuilder] = {}
+        for row, record in enumerate(records):
+            for name, value in record.items():
+                builder = builders.get(name)
+                if builder is None:
+                    builder = builders[name] = _ColumnBuilder(self.rows)
+                builder.add(row, value)
+        self._raw = {}
+        self._columns = {name: builder.build() for name, builder in builders.items()}
+
+    def names(self) -> Iterable[str]:
+        return dict.fromkeys([*self._raw, *self._columns]).keys()
+
+    def column(self, name: str) -> Optional[_Column]:
+        column = self._columns.get(name)
+        if column is None and name in self._raw:
+            column = self._columns[name] = _Column.from_array(self._raw[name])
+        return column
+
+
+def _evaluate(node: ConditionNode, table: _AnswerColumns) -> "np.ndarray":
+    if not isinstance(node, ConditionTest):
+        kind, parts = node
+        combine = np.logical_or if kind == "or" else np.logical_and
+        result = _evaluate(parts[0], table)
+        for part in parts[1:]:
+            result = combine(result, _evaluate(part, table))
+        return result
+
+    column = table.column(node.name)
+    if column is None:
+        return np.full(table.rows, bool(node.check(node.default)))
+    if node.op in NUMERIC_OPERATORS:
+        with np.errstate(invalid="ignore"):
+            per_value = NUMERIC_OPERATORS[node.op](column.floats(), node.literal)
+    else:
+        per_value = np.fromiter(
+            (
+                node.check(node.default if value is _MISSING else value)
+                for value in column.values
+            ),
+            dtype=bool,
+            count=len(column.values),
+        )
+    return column.gather(per_value)
+
+
+@dataclass
+class FactMatrix:
+    """Facts of many answer rows.
+
+    Attributes:
+        compiled: Rule network whose atoms index ``matrix`` columns.
+        matrix: ``(rows, atoms)`` boolean matrix of facts the rules mention.
+        extra_names: Facts no rule mentions (answer fields, unused facts).
+        extra: ``(rows, len(extra_names))`` boolean matrix for those.
+    """
+
+    compiled: CompiledRuleBase
+    matrix: "np.ndarray"
+    extra_names: List[str]
+    extra: "np.ndarray"
+
+    def __len__(self) -> int:
+        return int(self.matrix.shape[0])
+
+    def fact_set(self, row: int) -> Set[str]:
+        """The facts of ``row``; equal to ``extract_facts_from_form``'s."""
+
+        atoms = self.compiled.atoms
+        facts = {atoms[int(code)] for code in np.flatnonzero(self.matrix[row])}
+        facts.update(self.extra_names[int(i)] for i in np.flatnonzero(self.extra[row]))
+        return facts
+
+    def extra_facts(self) -> List[Set[str]]:
+        names = self.extra_names
+        return [{names[int(i)] for i in np.flatnonzero(row)} for row in self.extra]
+
+    def run_forward(self, *, goals: Iterable[str] = ()) -> BatchForwardResult:
+        """Forward-chain every row (see ``run_forward_batch``)."""
+
+        return run_forward_batch(
+            self.compiled, self.matrix, goals=goals, extra_facts=self.extra_facts()
+        )
+
+
+def extract_facts_batch(answers: Any, kb: Any) -> FactMatrix:
+    """Extract the facts of every answer row of ``answers`` at once.
+
+    Args:
+        answers: Either a list of answer dicts (as stored per interview) or
+            a mapping of field name to a column of values, one per row
+            (lists or NumPy arrays).
+        kb: MedicalKnowledgeBase instance.
+
+    Returns:
+        A ``FactMatrix`` aligned to ``kb.compiled``.
+    """
+
+    _require_numpy()
+    table = _AnswerColumns(answers)
+    compiled: CompiledRuleBase = kb.compiled
+    matrix = np.zeros((table.rows, len(compiled.atoms)), dtype=bool)
+    extra_columns: Dict[str, "np.ndarray"] = {}
+
+    def add(fact: str, rows: "np.ndarray") -> None:
+        code = compiled.atoms.code(normalize_atom(fact))
+        if code is not None:
+            matrix[:, code] |= rows
+        elif fact in extra_columns:
+            extra_columns[fact] |= rows
+        else:
+            extra_columns[fact] = rows.copy()
+
+    for rule in kb_fact_rules(kb):
+        add(rule.fact, _evaluate(rule.tree, table))
+
+    discharge = table.column("loai_dich_mui")
+    if discharge is not None:
+        per_value = [
+            discharge_facts(None if value is _MISSING else value)
+            for value in discharge.values
+        ]
+        for fact in sorted(set().union(*per_value)):
+            hits = np.fromiter((fact in facts for facts in per_value), dtype=bool)
+            add(fact, discharge.gather(hits))
+
+    for name in table.names():
+        column = table.column(name)
+        hits = np.fromiter(
+            (value is not _MISSING and is_checked(value) for value in column.values),
+            dtype=bool,
+            count=len(column.values),
+        )
+        if hits.any():
+            add(name, column.gather(hits))
+
+    names = sorted(extra_columns)
+    extra = np.zeros((table.rows, len(names)), dtype=bool)
+    for index, name in enumerate(names):
+        extra[:, index] = extra_columns[name]
+    return FactMatrix(compiled=compiled, matrix=matrix, extra_names=names, extra=extra)
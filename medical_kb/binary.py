@@ -0,0 +1,322 @@
+"""Precompiled binary knowledge-base format (``.kbc``) loaded with ``mmap``.
+
+Layout (all integers little-endian)::
+
+    header   magic b"MKBC", format version (u16), reserved (u16),
+             SHA-256 of the source JSON (32 bytes), section count (u32)
+    table    per section: name (8 bytes, NUL padded), offset (u64), size (u64)
+    sections 8-byte aligned blobs
+
+Sections:
+
+    ATOMOFF / ATOMSTR   atom table: u32 offsets into a UTF-8 blob
+    RULEID              i32 rule id per position (id order)
+    PREMOFF / PREMATM   i32 CSR: premise atom codes per rule
+    CONCL               i32 conclusion atom code per rule
+    WATCHOF / WATCHRL   i32 CSR: atom -> rules using it as a premise
+    PRODOFF / PRODRL    i32 CSR: atom -> rules concluding it
+    RDOCOFF / RDOCSTR   rule JSON documents (u32 offsets into a UTF-8 blob),
+                        decoded one at a time on access
+    DOCUMENT            the rest of the source JSON (everything but "rules")
+
+Integer sections are exposed as ``memoryview``s over the mapping, so every
+worker process that opens the same file shares its pages.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from inference_lab.compact import CompactRuleStore
+from inference_lab.compiled import CompiledRuleBase
+from inference_lab.knowledge_base import KnowledgeBase
+
+FORMAT_MAGIC = b"MKBC"
+FORMAT_VERSION = 1
+COMPILED_SUFFIX = ".kbc"
+
+_HEADER = struct.Struct("<4sHH32sI")
+_SECTION = struct.Struct("<8sQQ")
+
+
+class CompiledKBError(ValueError):
+    """Raised when a ``.kbc`` file is missing sections, stale or malformed."""
+
+
+def source_digest(path: Path) -> bytes:
+    return hashlib.sha256(Path(path).read_bytes()).digest()
+
+
+def compiled_path_for(json_path: Path) -> Path:
+    return Path(json_path).with_suffix(COMPILED_SUFFIX)
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+def _int32(values: Sequence[int]) -> bytes:
+    column = array("i", values)
+    if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+        column.byteswap()
+    return column.tobytes()
+
+
+def _string_table(strings: Sequence[str]) -> Tuple[bytes, bytes]:
+    offsets = array("I", [0])
+    blob = bytearray()
+    for text in strings:
+        blob += text.encode("utf-8")
+        offsets.append(len(blob))
+    if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+        offsets.byteswap()
+    return offsets.tobytes(), bytes(blob)
+
+
+def write_compiled_kb(
+    document: Mapping[str, Any],
+    compiled: CompiledRuleBase,
+    output: Path,
+    *,
+    digest: bytes = b"\0" * 32,
+) -> Path:
+    """Write ``compiled`` and its source ``document`` to ``output``.
+
+    ``document["rules"]`` must list the rules in the order ``compiled``
+    positions them (id order).
+    """
+
+    atom_offsets, atom_blob = _string_table(list(compiled.atoms))
+    rule_docs = [
+        json.dumps(rule, ensure_ascii=False, separators=(",", ":"))
+        for rule in document.get("rules", [])
+    ]
+    if len(rule_docs) != len(compiled):
+        raise CompiledKBError("Rule documents do not match the compiled rules.")
+    doc_offsets, doc_blob = _string_table(rule_docs)
+    rest = {key: value for key, value in document.items() if key != "rules"}
+
+    sections: List[Tuple[bytes, bytes]] = [
+        (b"ATOMOFF", atom_offsets),
+        (b"ATOMSTR", atom_blob),
+        (b"RULEID", _int32(compiled.rule_ids)),
+        (b"PREMOFF", _int32(compiled.premise_offsets)),
+        (b"PREMATM", _int32(compiled.premise_atoms)),
+        (b"CONCL", _int32(compiled.conclusions)),
+        (b"WATCHOF", _int32(compiled.watch_offsets)),
+        (b"WATCHRL", _int32(compiled.watch_rules)),
+        (b"PRODOFF", _int32(compiled.producer_offsets)),
+        (b"PRODRL", _int32(compiled.producer_rules)),
+        (b"RDOCOFF", doc_offsets),
+        (b"RDOCSTR", doc_blob),
+        (b"DOCUMENT", json.dumps(rest, ensure_ascii=False).encode("utf-8")),
+    ]
+
+    table_end = _HEADER.size + _SECTION.size * len(sections)
+    offset = _align(table_end)
+    entries: List[bytes] = []
+    for name, payload in sections:
+        entries.append(_SECTION.pack(name, offset, len(payload)))
+        offset = _align(offset + len(payload))
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_suffix(output.suffix + ".tmp")
+    with tmp.open("wb") as handle:
+        handle.write(_HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, 0, digest, len(sections)))
+        handle.write(b"".join(entries))
+        for _, payload in sections:
+            handle.write(b"\0" * (_align(handle.tell()) - handle.tell()))
+            handle.write(payload)
+    # Atomic replace: workers mapping the old file keep their pages.
+    tmp.replace(output)
+    return output
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+class _StringTable(Sequence[str]):
+    """UTF-8 strings decoded from the mapping on access."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return str(self._blob[start:end], "utf-8")
+
+
+class _RuleDocuments(Sequence[Dict[str, Any]]):
+    """``document["rules"]`` backed by the mapping; one JSON decode per rule."""
+
+    def __init__(self, table: _StringTable) -> None:
+        self._table = table
+        self._cache: List[Optional[Dict[str, Any]]] = [None] * len(table)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        rule = self._cache[index]
+        if rule is None:
+            rule = self._cache[index] = json.loads(self._table[index])
+        return rule
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+@dataclass
+class CompiledKB:
+    """A mapped ``.kbc`` file.
+
+    Attributes:
+        document: Source JSON; ``document["rules"]`` decodes lazily.
+        compiled: Rule network over the mapped columns.
+        rules: ``CompactRuleStore`` over the same columns (copied on edit).
+        digest: SHA-256 of the JSON the file was compiled from.
+    """
+
+    path: Path
+    document: Dict[str, Any]
+    compiled: CompiledRuleBase
+    rules: CompactRuleStore
+    digest: bytes
+    _mapping: mmap.mmap
+
+    def knowledge_base(self, name: str) -> KnowledgeBase:
+        return KnowledgeBase(rules=self.rules.fork(), name=name)
+
+
+def _check_header(path: Path, header: bytes) -> bytes:
+    if len(header) < _HEADER.size:
+        raise CompiledKBError(f"{path} is not a compiled knowledge base.")
+    magic, version, _, digest, _ = _HEADER.unpack_from(header)
+    if magic != FORMAT_MAGIC:
+        raise CompiledKBError(f"{path} is not a compiled knowledge base.")
+    if version != FORMAT_VERSION:
+        raise CompiledKBError(
+            f"{path} uses format version {version}; expected {FORMAT_VERSION}. "
+            "Recompile it."
+        )
+    if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+        raise CompiledKBError("Compiled knowledge bases require a little-endian host.")
+    return digest
+
+
+def read_digest(path: Path) -> bytes:
+    """Return the source digest stored in ``path`` (header only)."""
+
+    with Path(path).open("rb") as handle:
+        return _check_header(path, handle.read(_HEADER.size))
+
+
+def load_compiled_kb(path: Path, *, name: str = "Medical KB") -> CompiledKB:
+    """Map ``path`` and wrap its sections without copying them."""
+
+    path = Path(path)
+    with path.open("rb") as handle:
+        try:
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as exc:  # an empty file cannot be mapped
+            raise CompiledKBError(f"{path} is not a compiled knowledge base.") from exc
+    try:
+        return _wrap_mapping(path, mapping, name)
+    except CompiledKBError as exc:
+        message = str(exc)
+    # The failed attempt's views were dropped with its traceback, so the
+    # mapping can be closed instead of leaking one per damaged load.
+    mapping.close()
+    raise CompiledKBError(message)
+
+
+def _wrap_mapping(path: Path, mapping: mmap.mmap, name: str) -> CompiledKB:
+    view = memoryview(mapping)
+    digest = _check_header(path, view[: _HEADER.size])
+    count = _HEADER.unpack_from(view)[4]
+    if _HEADER.size + count * _SECTION.size > len(view):
+        raise CompiledKBError(f"{path} is truncated.")
+
+    sections: Dict[str, memoryview] = {}
+    for index in range(count):
+        raw_name, offset, size = _SECTION.unpack_from(
+            view, _HEADER.size + index * _SECTION.size
+        )
+        if offset + size > len(view):
+            raise CompiledKBError(f"{path} is truncated.")
+        sections[raw_name.rstrip(b"\0").decode("ascii")] = view[offset : offset + size]
+
+    def section(name: str) -> memoryview:
+        try:
+            return sections[name]
+        except KeyError as exc:
+            raise CompiledKBError(f"{path} has no {name} section.") from exc
+
+    def column(name: str, fmt: str = "i") -> memoryview:
+        try:
+            return section(name).cast(fmt)
+        except TypeError as exc:
+            raise CompiledKBError(f"{path} has a malformed {name} section.") from exc
+
+    atoms = _StringTable(column("ATOMOFF", "I"), section("ATOMSTR"))
+    ids = column("RULEID")
+    premise_offsets, premise_atoms = column("PREMOFF"), column("PREMATM")
+    conclusions = column("CONCL")
+    try:
+        compiled = CompiledRuleBase.from_buffers(
+            atoms=atoms,
+            rule_ids=ids,
+            premise_offsets=premise_offsets,
+            premise_atoms=premise_atoms,
+            conclusions=conclusions,
+            watch_offsets=column("WATCHOF"),
+            watch_rules=column("WATCHRL"),
+            producer_offsets=column("PRODOFF"),
+            producer_rules=column("PRODRL"),
+            name=name,
+        )
+        rules = CompactRuleStore.from_columns(
+            atoms=list(compiled.atoms),
+            ids=ids,
+            conclusions=conclusions,
+            offsets=premise_offsets,
+            premises=premise_atoms,
+        )
+        document = json.loads(str(section("DOCUMENT"), "utf-8"))
+    except (IndexError, ValueError) as exc:
+        # UnicodeDecodeError and JSONDecodeError are ValueErrors too.
+        raise CompiledKBError(f"{path} is corrupt: {exc}") from exc
+    document["rules"] = _RuleDocuments(
+        _StringTable(column("RDOCOFF", "I"), section("RDOCSTR"))
+    )
+    return CompiledKB(
+        path=path,
+        document=document,
+        compiled=compiled,
+        rules=rules,
+        digest=digest,
+        _mapping=mapping,
+    )
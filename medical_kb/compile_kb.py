@@ -0,0 +1,47 @@
+"""Compile a medical KB JSON file into the binary ``.kbc`` format.
+
+Usage::
+
+    python -m medical_kb.compile_kb data/sinusitis_kb.json [-o out.kbc]
+
+``MedicalKnowledgeBase`` maps the ``.kbc`` file next to the JSON instead of
+parsing the JSON whenever the file is up to date.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from .binary import compiled_path_for, source_digest, write_compiled_kb
+from .loader import MedicalKnowledgeBase
+
+
+def compile_kb(json_path: Path, output: Optional[Path] = None) -> Path:
+    json_path = Path(json_path)
+    kb = MedicalKnowledgeBase(kb_path=str(json_path), use_compiled=False)
+    return write_compiled_kb(
+        kb.data,
+        kb.compiled,
+        output or compiled_path_for(json_path),
+        digest=source_digest(json_path),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("json_path", nargs="?", default="data/sinusitis_kb.json")
+    parser.add_argument("-o", "--output", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    output = compile_kb(Path(args.json_path), args.output)
+    elapsed = time.perf_counter() - started
+    print(f"Đã biên dịch {args.json_path} -> {output} ({elapsed:.3f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,264 @@
+"""Compiled ``fact_rules`` conditions.
+
+A condition such as ``"nhiet_do > 38"`` or
+``"a === true || b === true && c !== 'x'"`` is parsed once into a small
+tree (``("or", parts)``, ``("and", parts)`` or a ``ConditionTest`` leaf) and
+then into nested closures; evaluating it is a few function calls over the
+request's answers. The tree is kept for column-wise evaluation (see
+``medical_kb.batch``). Grammar (``&&``/``^`` bind tighter than ``||``/``v``)::
+
+    expr    := and ( ('||' | 'v') and )*
+    and     := term ( ('&&' | '^') term )*
+    term    := '(' expr ')' | NAME [ OP literal ]
+    OP      := '>=' | '>' | '<=' | '<' | '===' | '!=='
+    literal := number | 'quoted' | "quoted" | word
+
+Comparison semantics are those of the former string-splitting evaluator:
+numeric operators compare ``float(value)`` (a missing variable counts as 0,
+a non-numeric value is False), ``=== true``/``=== false`` also accept the
+strings ``"true"``/``"false"``, other equality tests compare ``str(value)``
+(missing -> ``""``) and a bare name is the truthiness of its value.
+"""
+
+from __future__ import annotations
+
+import operator
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    FrozenSet,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+Condition = Callable[[Mapping[str, Any]], bool]
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<op>>=|<=|===|!==|>|<|&&|\|\||\^|\(|\))
+      | (?P<str>'[^']*'|"[^"]*")
+      | (?P<word>[^\s()<>=!&|^'"]+)
+    )""",
+    re.VERBOSE,
+)
+
+NUMERIC_OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+}
+_OR = ("||", "v")
+_AND = ("&&", "^")
+
+
+class ConditionSyntaxError(ValueError):
+    """A ``fact_rules`` condition that cannot be parsed."""
+
+    def __init__(self, condition: str, message: str) -> None:
+        super().__init__(f"{message} in condition {condition!r}")
+        self.condition = condition
+        self.message = message
+
+
+class ConditionTest(NamedTuple):
+    """Leaf test on one answer: ``check(answers.get(name, default))``.
+
+    ``op`` is ``None`` for a bare name, otherwise the comparison operator;
+    ``literal`` is a float for numeric operators and a string otherwise.
+    """
+
+    name: str
+    op: Optional[str]
+    literal: Union[float, str, None]
+    default: Any
+    check: Callable[[Any], bool]
+
+
+ConditionNode = Union[ConditionTest, Tuple[str, Tuple["ConditionNode", ...]]]
+
+
+@dataclass(frozen=True)
+class CompiledFactRule:
+    """One ``fact_rules`` entry: ``fact`` holds when ``test(answers)``."""
+
+    fact: str
+    condition: str
+    test: Condition
+    tree: ConditionNode
+
+
+def _tokenize(condition: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    position = 0
+    text = condition.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ConditionSyntaxError(
+                condition, f"Unexpected character {text[position:].lstrip()[:1]!r}"
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "word" and value in _OR + _AND:
+            kind = "op"
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, condition: str) -> None:
+        self.condition = condition
+        self.tokens = _tokenize(condition)
+        self.index = 0
+
+    def parse(self) -> ConditionNode:
+        if not self.tokens:
+            raise ConditionSyntaxError(self.condition, "Empty expression")
+        node = self._expr()
+        if self.index != len(self.tokens):
+            raise ConditionSyntaxError(
+                self.condition, f"Unexpected {self.tokens[self.index][1]!r}"
+            )
+        return node
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else None
+
+    def _take(self) -> Tuple[str, str]:
+        token = self._peek()
+        if token is None:
+            raise ConditionSyntaxError(self.condition, "Unexpected end of expression")
+        self.index += 1
+        return token
+
+    def _binary(
+        self, kind: str, operators: Sequence[str], operand: Callable[[], ConditionNode]
+    ) -> ConditionNode:
+        parts = [operand()]
+        while (token := self._peek()) is not None and token[0] == "op" and token[1] in operators:
+            self.index += 1
+            parts.append(operand())
+        return parts[0] if len(parts) == 1 else (kind, tuple(parts))
+
+    def _expr(self) -> ConditionNode:
+        return self._binary("or", _OR, self._and)
+
+    def _and(self) -> ConditionNode:
+        return self._binary("and", _AND, self._term)
+
+    def _term(self) -> ConditionNode:
+        kind, value = self._take()
+        if (kind, value) == ("op", "("):
+            node = self._expr()
+            if self._take() != ("op", ")"):
+                raise ConditionSyntaxError(self.condition, "Missing ')'")
+            return node
+        if kind != "word":
+            raise ConditionSyntaxError(self.condition, f"Expected a variable, got {value!r}")
+        token = self._peek()
+        if token is None or token[0] != "op" or token[1] not in (*NUMERIC_OPERATORS, "===", "!=="):
+            return ConditionTest(value, None, None, False, bool)
+        self.index += 1
+        literal_kind, literal = self._take()
+        if literal_kind == "op":
+            raise ConditionSyntaxError(self.condition, f"Expected a value after {token[1]!r}")
+        if literal_kind == "str":
+            literal = literal[1:-1]
+        if token[1] in NUMERIC_OPERATORS:
+            try:
+                number = float(literal)
+            except ValueError:
+                raise ConditionSyntaxError(
+                    self.condition, f"{token[1]!r} needs a number, got {literal!r}"
+                ) from None
+            return ConditionTest(value, token[1], number, 0, _numeric(token[1], number))
+        if token[1] == "===":
+            if literal in ("true", "false"):
+                return ConditionTest(value, "===", literal, None, _flag(literal))
+            return ConditionTest(value, "===", literal, "", lambda v: str(v) == literal)
+        return ConditionTest(value, "!==", literal, "", lambda v: str(v) != literal)
+
+
+def _numeric(op: str, number: float) -> Callable[[Any], bool]:
+    compare = NUMERIC_OPERATORS[op]
+
+    def check(value: Any) -> bool:
+        try:
+            return compare(float(value), number)
+        except (TypeError, ValueError):
+            return False
+
+    return check
+
+
+def _flag(literal: str) -> Callable[[Any], bool]:
+    flag = literal == "true"
+    return lambda value: value == flag or value == literal
+
+
+def _closure(node: ConditionNode) -> Condition:
+    if isinstance(node, ConditionTest):
+        name, default, check = node.name, node.default, node.check
+        return lambda answers: check(answers.get(name, default))
+    kind, parts = node
+    tests = tuple(_closure(part) for part in parts)
+    join = any if kind == "or" else all
+    return lambda answers: join(test(answers) for test in tests)
+
+
+def condition_variables(node: ConditionNode) -> FrozenSet[str]:
+    """Answer names a condition tree reads."""
+
+    if isinstance(node, ConditionTest):
+        return frozenset((node.name,))
+    return frozenset().union(*(condition_variables(part) for part in node[1]))
+
+
+def parse_condition(condition: str) -> ConditionNode:
+    """Return the tree of ``condition``; raises ``ConditionSyntaxError``."""
+
+    return _compiled(condition)[0]
+
+
+def compile_condition(condition: str) -> Condition:
+    """Parse ``condition`` once; raises ``ConditionSyntaxError`` if malformed."""
+
+    return _compiled(condition)[1]
+
+
+# Bounded: evaluate_condition also reaches here with arbitrary strings.
+@lru_cache(maxsize=1024)
+def _compiled(condition: str) -> Tuple[ConditionNode, Condition]:
+    tree = _Parser(condition).parse()
+    return tree, _closure(tree)
+
+
+def compile_fact_rules(rules: Sequence[Mapping[str, Any]]) -> Tuple[CompiledFactRule, ...]:
+    """Compile a KB's ``fact_rules``; the first malformed entry raises."""
+
+    compiled: List[CompiledFactRule] = []
+    for index, rule in enumerate(rules):
+        try:
+            fact, condition = rule["fact"], rule["condition"]
+        except KeyError as exc:
+            raise ConditionSyntaxError(
+                str(rule), f"fact_rules[{index}] has no {exc.args[0]!r}"
+            ) from None
+        try:
+            tree, test = _compiled(condition)
+        except ConditionSyntaxError as exc:
+            raise ConditionSyntaxError(
+                condition, f"fact_rules[{index}] ({fact}): {exc.message}"
+            ) from None
+        compiled.append(CompiledFactRule(fact, condition, test, tree))
+    return tuple(compiled)
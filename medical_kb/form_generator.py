@@ -5,7 +5,9 @@ Generates dynamic HTML forms and extracts facts from form data.
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, FrozenSet, List, Set, Tuple
+
+from .conditions import CompiledFactRule, compile_condition, compile_fact_rules
 
 
 def generate_form_html(fields: List[Dict[str, Any]]) -> str:
@@ -147,121 +149,58 @@ def extract_facts_from_form(form_data: Dict[str, Any], kb: Any) -> Set[str]:
     """
     facts = set()
 
-    # Get fact mapping rules from KB
-    fact_rules = kb.data.get("fact_rules", [])
-
-    for rule in fact_rules:
-        fact = rule["fact"]
-        condition = rule["condition"]
-
-        # Safely evaluate condition
-        try:
-            # Create a safe evaluation context with only form_data variables
-            context = {key: form_data.get(key) for key in form_data}
-
-            # Evaluate condition (simple conditions only for safety)
-            if evaluate_condition(condition, context):
-                facts.add(fact)
-        except Exception:
-            # Skip invalid conditions
-            continue
-
-    # Map specific categorical inputs to fact variables (domain-specific)
-    # Normalize strings to lowercase for robust matching
-    def _norm(v: Any) -> str:
-        return str(v).strip().lower() if v is not None else ""
+    for rule in kb_fact_rules(kb):
+        if rule.test(form_data):
+            facts.add(rule.fact)
 
     # Map 'loai_dich_mui' radio to chay_mui_trong / chay_mui_dac
-    muc_dich = _norm(form_data.get("loai_dich_mui"))
-    if muc_dich:
-        if any(key in muc_dich for key in ["không", "khong", "none", "khong co"]):
-            facts.add("khong_co_dich_mui")
-        else:
-            facts.add("co_dich_mui")
-        if "trong" in muc_dich:
-            facts.add("chay_mui_trong")
-        if any(key in muc_dich for key in ["đặc", "dac", "vàng", "vang", "xanh"]):
-            facts.add("chay_mui_dac")
+    facts |= discharge_facts(form_data.get("loai_dich_mui"))
 
     # Also add direct boolean fields
     for key, value in form_data.items():
-        if isinstance(value, bool) and value:
-            facts.add(key)
-        elif value == "true" or value == True:
+        if is_checked(value):
             facts.add(key)
 
     return facts
 
 
-def evaluate_condition(condition: str, context: Dict[str, Any]) -> bool:
-    """Safely evaluate a condition string.
+def kb_fact_rules(kb: Any) -> Tuple[CompiledFactRule, ...]:
+    """Compiled ``fact_rules`` of ``kb`` (compiled once when the KB loads)."""
+    fact_rules = getattr(kb, "fact_rules", None)
+    if fact_rules is None:
+        fact_rules = compile_fact_rules(kb.data.get("fact_rules", []))
+    return fact_rules
 
-    Args:
-        condition: Condition string like "nhiet_do > 38"
-        context: Dictionary of variable values
 
-    Returns:
-        Boolean result
+def discharge_facts(value: Any) -> FrozenSet[str]:
+    """Facts implied by the 'loai_dich_mui' (nasal discharge) answer."""
+    # Normalize strings to lowercase for robust matching
+    muc_dich = str(value).strip().lower() if value is not None else ""
+    if not muc_dich:
+        return frozenset()
+    facts = set()
+    if any(key in muc_dich for key in ["không", "khong", "none", "khong co"]):
+        facts.add("khong_co_dich_mui")
+    else:
+        facts.add("co_dich_mui")
+    if "trong" in muc_dich:
+        facts.add("chay_mui_trong")
+    if any(key in muc_dich for key in ["đặc", "dac", "vàng", "vang", "xanh"]):
+        facts.add("chay_mui_dac")
+    return frozenset(facts)
+
+
+def is_checked(value: Any) -> bool:
+    """Whether a direct answer value makes its field name a fact."""
+    if isinstance(value, bool) and value:
+        return True
+    return value == "true" or value == True
+
+
+def evaluate_condition(condition: str, context: Dict[str, Any]) -> bool:
+    """Evaluate a condition string like ``"nhiet_do > 38"``.
+
+    The condition is compiled on first use (see ``medical_kb.conditions``);
+    a malformed one raises ``ConditionSyntaxError``.
     """
-    # Replace variable names with context values
-    # This is a simple implementation - for production, use a proper expression parser
-
-    try:
-        # Simple comparisons
-        if ">=" in condition:
-            var, val = condition.split(">=")
-            var = var.strip()
-            val = float(val.strip())
-            return float(context.get(var, 0)) >= val
-
-        elif ">" in condition:
-            var, val = condition.split(">")
-            var = var.strip()
-            val = float(val.strip())
-            return float(context.get(var, 0)) > val
-
-        elif "<=" in condition:
-            var, val = condition.split("<=")
-            var = var.strip()
-            val = float(val.strip())
-            return float(context.get(var, 0)) <= val
-
-        elif "<" in condition:
-            var, val = condition.split("<")
-            var = var.strip()
-            val = float(val.strip())
-            return float(context.get(var, 0)) < val
-
-        elif "===" in condition:
-            var, val = condition.split("===")
-            var = var.strip()
-            val = val.strip().strip("'").strip('"')
-            if val == "true":
-                return context.get(var) == True or context.get(var) == "true"
-            elif val == "false":
-                return context.get(var) == False or context.get(var) == "false"
-            return str(context.get(var, "")) == val
-
-        elif "!==" in condition:
-            var, val = condition.split("!==")
-            var = var.strip()
-            val = val.strip().strip("'").strip('"')
-            return str(context.get(var, "")) != val
-
-        elif " && " in condition or " ^ " in condition:
-            # AND condition
-            parts = condition.replace(" ^ ", " && ").split(" && ")
-            return all(evaluate_condition(part.strip(), context) for part in parts)
-
-        elif " || " in condition or " v " in condition:
-            # OR condition
-            parts = condition.replace(" v ", " || ").split(" || ")
-            return any(evaluate_condition(part.strip(), context) for part in parts)
-
-        else:
-            # Simple boolean variable
-            var = condition.strip()
-            return bool(context.get(var, False))
-
-    except Exception:
-        return False
+    return compile_condition(condition)(context)
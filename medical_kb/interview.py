@@ -0,0 +1,177 @@
+"""Server-side interview state updated one answer at a time.
+
+``InterviewState`` holds the answers given so far, the facts they imply
+(always equal to ``extract_facts_from_form(answers, kb)``) and their
+deductive closure (``inference_lab.incremental.IncrementalClosure``). A new
+answer only re-evaluates the ``fact_rules`` that read it, its checkbox fact
+and, for ``loai_dich_mui``, the discharge mapping; the new facts are then
+pushed through the closure's rule counters. An answer that withdraws a
+fact (e.g. a duration that is no longer "under 10 days") rebuilds the
+closure instead.
+
+``InterviewSessionStore`` keeps states by id, in memory, with a TTL.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+from uuid import uuid4
+
+from inference_lab.incremental import IncrementalClosure
+
+from .conditions import condition_variables
+from .form_generator import discharge_facts, is_checked, kb_fact_rules
+
+# Where a base fact comes from: ("rule", index), ("field", name) or
+# ("discharge",) for the loai_dich_mui mapping.
+_Source = Tuple[Any, ...]
+
+_DISCHARGE = ("discharge",)
+DISCHARGE_VARIABLE = "loai_dich_mui"
+
+
+class InterviewState:
+    """Answers, extracted facts and their closure for one interview.
+
+    Attributes:
+        kb: The MedicalKnowledgeBase the interview started on; it is kept
+            for the whole interview even if the registry reloads.
+        answers: Answers received so far.
+        closure: Closure of ``facts`` under ``kb.compiled``.
+        rebuilds: How many answers withdrew a fact and forced a rebuild.
+        lock: Serialises requests that touch the same interview.
+        selector: Question selector the caller keeps with the interview
+            (``medical_kb.questions.QuestionSelector``), or ``None``.
+    """
+
+    def __init__(self, kb: Any, answers: Optional[Mapping[str, Any]] = None) -> None:
+        self.kb = kb
+        self.answers: Dict[str, Any] = {}
+        self.rebuilds = 0
+        self.lock = threading.Lock()
+        self.selector: Any = None
+        self._fact_rules = kb_fact_rules(kb)
+        self._rules_by_variable: Dict[str, List[int]] = {}
+        for index, rule in enumerate(self._fact_rules):
+            for name in condition_variables(rule.tree):
+                self._rules_by_variable.setdefault(name, []).append(index)
+        self._support: Dict[_Source, FrozenSet[str]] = {}
+        self._refs: Counter = Counter()
+        # Conditions can hold with no answers at all (missing counts as 0).
+        for index in range(len(self._fact_rules)):
+            self._update_source(("rule", index), {})
+        self.closure = IncrementalClosure(kb.compiled, self._refs)
+        if answers:
+            self.apply(answers)
+
+    @property
+    def facts(self) -> Set[str]:
+        """Facts extracted from the answers (before inference)."""
+
+        return set(self._refs)
+
+    @property
+    def final_facts(self) -> Set[str]:
+        """Extracted facts plus everything the rules derive from them."""
+
+        return self.closure.facts
+
+    def apply(self, delta: Mapping[str, Any]) -> None:
+        """Record new or changed answers and update facts and closure."""
+
+        affected: Set[_Source] = set()
+        for name, value in delta.items():
+            self.answers[name] = value
+            affected.add(("field", name))
+            affected.update(
+                ("rule", index) for index in self._rules_by_variable.get(name, ())
+            )
+            if name == DISCHARGE_VARIABLE:
+                affected.add(_DISCHARGE)
+
+        # fact -> whether it was known before this delta
+        changed: Dict[str, bool] = {}
+        for source in affected:
+            self._update_source(source, changed)
+        added = [fact for fact, was in changed.items() if not was and fact in self._refs]
+        if any(was and fact not in self._refs for fact, was in changed.items()):
+            self.closure.reset(self._refs)
+            self.rebuilds += 1
+        elif added:
+            self.closure.add(added)
+
+    def _update_source(self, source: _Source, changed: Dict[str, bool]) -> None:
+        new = self._evaluate(source)
+        old = self._support.get(source, frozenset())
+        for fact in old ^ new:
+            changed.setdefault(fact, fact in self._refs)
+        for fact in old - new:
+            self._refs[fact] -= 1
+            if not self._refs[fact]:
+                del self._refs[fact]
+        for fact in new - old:
+            self._refs[fact] += 1
+        self._support[source] = new
+
+    def _evaluate(self, source: _Source) -> FrozenSet[str]:
+        answers = self.answers
+        if source[0] == "rule":
+            rule = self._fact_rules[source[1]]
+            return frozenset((rule.fact,)) if rule.test(answers) else frozenset()
+        if source[0] == "field":
+            name = source[1]
+            return frozenset((name,)) if is_checked(answers.get(name)) else frozenset()
+        return discharge_facts(answers.get(DISCHARGE_VARIABLE))
+
+
+class InterviewSessionStore:
+    """In-memory ``InterviewState``s by id, dropped after ``ttl`` seconds idle.
+
+    At most ``max_sessions`` are kept; the least recently used go first.
+    """
+
+    def __init__(self, *, ttl: float = 1800.0, max_sessions: int = 1000) -> None:
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, InterviewState]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(
+        self, kb: Any, answers: Optional[Mapping[str, Any]] = None
+    ) -> Tuple[str, InterviewState]:
+        state = InterviewState(kb, answers)
+        session_id = uuid4().hex
+        with self._lock:
+            self._expire(time.monotonic())
+            self._sessions[session_id] = (time.monotonic(), state)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id, state
+
+    def get(self, session_id: str) -> Optional[InterviewState]:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _expire(self, now: float) -> None:
+        while self._sessions:
+            session_id, (touched, _) = next(iter(self._sessions.items()))
+            if now - touched < self.ttl:
+                return
+            del self._sessions[session_id]
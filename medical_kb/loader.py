@@ -6,12 +6,55 @@ Loads and manages medical KB from JSON file.
 from __future__ import annotations
 
 import json
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 
+from inference_lab.compiled import CompiledRuleBase
 from inference_lab.knowledge_base import KnowledgeBase
 from inference_lab.models import Rule
 
+from .binary import (
+    COMPILED_SUFFIX,
+    CompiledKB,
+    CompiledKBError,
+    compiled_path_for,
+    load_compiled_kb,
+    read_digest,
+    source_digest,
+)
+from .conditions import CompiledFactRule, compile_fact_rules
+
+# Legacy multi-disease KB, relative to the project root.
+DEFAULT_JSON_PATH = Path(__file__).parent.parent / "data" / "medical_kb.json"
+
+
+class _RuleMetaIndex(Mapping[int, Dict[str, Any]]):
+    """``_rule_meta_by_internal_id`` for a compiled KB, built per lookup."""
+
+    def __init__(self, compiled: CompiledRuleBase, documents) -> None:
+        self._compiled = compiled
+        self._documents = documents
+
+    def __getitem__(self, rule_id: int) -> Dict[str, Any]:
+        position = self._compiled.position_of(rule_id)
+        rule = self._compiled.rules[position]
+        rule_data = self._documents[position]
+        return {
+            "json_id": rule_data.get("id"),
+            "module": rule_data.get("module"),
+            "premises": list(rule.premises),
+            "conclusion": rule.conclusion,
+            "notes": rule_data.get("notes"),
+            "confidence": rule_data.get("confidence"),
+        }
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(rule_id) for rule_id in self._compiled.rule_ids)
+
+    def __len__(self) -> int:
+        return len(self._compiled.rule_ids)
+
 
 class MedicalKnowledgeBase:
     """Medical Knowledge Base loader for medical/specialized KBs.
@@ -20,23 +63,120 @@ class MedicalKnowledgeBase:
     structures. Accepts either 'json_path' or 'kb_path' for convenience.
     """
 
-    def __init__(self, json_path: Optional[str] = None, kb_path: Optional[str] = None):
+    def __init__(
+        self,
+        json_path: Optional[str] = None,
+        kb_path: Optional[str] = None,
+        *,
+        use_compiled: bool = True,
+    ):
         """Initialize Medical KB.
 
         Args:
             json_path: Path to KB JSON file (legacy name).
             kb_path: Alias for json_path. If both provided, kb_path takes precedence.
+            use_compiled: Map the precompiled ``.kbc`` file next to the JSON
+                (see ``python -m medical_kb.compile_kb``) when it is up to
+                date instead of parsing the JSON. A ``.kbc`` path is always
+                loaded directly.
         """
         # Support both parameter names
         chosen_path = kb_path or json_path
         if chosen_path is None:
-            # Default path relative to project root (legacy multi-disease KB)
-            base_path = Path(__file__).parent.parent
-            chosen_path = base_path / "data" / "medical_kb.json"
+            chosen_path = DEFAULT_JSON_PATH
 
         self.json_path = Path(chosen_path)
+        started = time.perf_counter()
+        compiled_file = self._find_compiled(use_compiled)
+        mapped = self._map_compiled(compiled_file) if compiled_file is not None else None
+        if mapped is not None:
+            self.compiled_path: Optional[Path] = compiled_file
+            self.data = mapped.document
+            self.kb = mapped.knowledge_base("Medical KB")
+            self.compiled = mapped.compiled
+            self._rule_meta_by_internal_id = _RuleMetaIndex(
+                mapped.compiled, mapped.document["rules"]
+            )
+            self._mapped = mapped
+            # Decoding every rule document would defeat the lazy mapping, so
+            # the module index is built on first use (see _module_index).
+            self._rule_ids_by_module: Optional[Dict[Any, List[int]]] = None
+            self._build_lookup_indexes()
+            self._record_load_time(started)
+            return
+
+        self.compiled_path = None
         self.data = self._load_json()
         self.kb = self._create_knowledge_base()
+        # Compiled once and shared by every request; pass this to the engines.
+        self.compiled = self.kb.compile()
+        self._build_lookup_indexes()
+        self._record_load_time(started)
+
+    def _build_lookup_indexes(self) -> None:
+        """Index the JSON lists once; the first entry wins, like a linear scan."""
+        self._symptom_labels: Dict[str, str] = {}
+        for symp in self.data.get("symptoms", []):
+            self._symptom_labels.setdefault(symp["variable"], symp["label"])
+        self._recommendations: Dict[str, str] = {}
+        for rec in self.data.get("recommendations", []):
+            self._recommendations.setdefault(rec["condition"], rec["recommendation"])
+        self._diseases_by_variable: Dict[str, Dict[str, Any]] = {}
+        for disease_data in self.data.get("diseases", []):
+            self._diseases_by_variable.setdefault(disease_data["variable"], disease_data)
+        # Malformed conditions fail the load instead of being skipped per request.
+        self.fact_rules: Tuple[CompiledFactRule, ...] = compile_fact_rules(
+            self.data.get("fact_rules", [])
+        )
+
+    def _module_index(self) -> Dict[Any, List[int]]:
+        if self._rule_ids_by_module is None:
+            index: Dict[Any, List[int]] = {}
+            for rule_id in self._rule_meta_by_internal_id:
+                module = self._rule_meta_by_internal_id[rule_id]["module"]
+                index.setdefault(module, []).append(rule_id)
+            self._rule_ids_by_module = index
+        return self._rule_ids_by_module
+
+    def _record_load_time(self, started: float) -> None:
+        self.load_stats: Dict[str, Any] = {
+            "source": str(self.compiled_path or self.json_path),
+            "format": "kbc" if self.compiled_path else "json",
+            "rules": len(self.compiled),
+            "seconds": round(time.perf_counter() - started, 6),
+        }
+
+    def _find_compiled(self, use_compiled: bool) -> Optional[Path]:
+        """Return the ``.kbc`` file to map, or None to load the JSON."""
+
+        if self.json_path.suffix == COMPILED_SUFFIX:
+            return self.json_path
+        if not use_compiled:
+            return None
+        candidate = compiled_path_for(self.json_path)
+        if not candidate.exists():
+            return None
+        if not self.json_path.exists():
+            return candidate
+        try:
+            mapped_digest = read_digest(candidate)
+        except CompiledKBError:
+            return None
+        # A stale file (JSON edited since compiling) is ignored.
+        return candidate if mapped_digest == source_digest(self.json_path) else None
+
+    def _map_compiled(self, compiled_file: Path) -> Optional[CompiledKB]:
+        """Map ``compiled_file``; None means fall back to the JSON source.
+
+        Only the header is checked when choosing the file, so a damaged body
+        surfaces here. It is fatal only when there is no JSON to load instead.
+        """
+        try:
+            return load_compiled_kb(compiled_file, name="Medical KB")
+        except CompiledKBError:
+            if compiled_file == self.json_path or not self.json_path.exists():
+                raise
+            return None
 
     def _load_json(self) -> Dict[str, Any]:
         """Load JSON data from file."""
@@ -54,14 +194,14 @@ class MedicalKnowledgeBase:
         kb = KnowledgeBase(name="Medical KB")
         # Map internal numeric rule.id -> original JSON rule metadata (id, notes, module...)
         self._rule_meta_by_internal_id: Dict[int, Dict[str, Any]] = {}
-
-        # Add all rules
-        for rule_data in self.data["rules"]:
-            # Convert premises to text format: "a ^ b ^ c"
-            premises_text = " ^ ".join(rule_data["premises"])
-            rule_text = f"{premises_text} -> {rule_data['conclusion']}"
-
-            rule = kb.add_rule_from_text(rule_text)
+        self._rule_ids_by_module = {}
+
+        # Premise lists go in as they are: no text round-trip through the parser
+        rule_rows = self.data["rules"]
+        rules = kb.add_rules(
+            (rule_data["premises"], rule_data["conclusion"]) for rule_data in rule_rows
+        )
+        for rule, rule_data in zip(rules, rule_rows):
             # Store mapping for explanations in results page
             self._rule_meta_by_internal_id[rule.id] = {
                 "json_id": rule_data.get("id"),
@@ -71,6 +211,9 @@ class MedicalKnowledgeBase:
                 "notes": rule_data.get("notes"),
                 "confidence": rule_data.get("confidence"),
             }
+            self._rule_ids_by_module.setdefault(rule_data.get("module"), []).append(
+                rule.id
+            )
 
         return kb
 
@@ -79,19 +222,8 @@ class MedicalKnowledgeBase:
         return list(self.kb.rules)
 
     def get_rules_by_module(self, module: str) -> List[Rule]:
-        """Get rules by module code (SYMP, RESP, DIGE, etc.)."""
-        matching_rules = []
-
-        for rule_data in self.data["rules"]:
-            if rule_data["module"] == module:
-                # Find corresponding Rule object
-                conclusion = rule_data["conclusion"]
-                for rule in self.kb.rules:
-                    if rule.conclusion == conclusion:
-                        matching_rules.append(rule)
-                        break
-
-        return matching_rules
+        """Get rules by module code (SYMP, RESP, DIGE, etc.), in JSON order."""
+        return [self.kb.get_rule(rule_id) for rule_id in self._module_index().get(module, [])]
 
     def get_form_fields(self) -> List[Dict[str, Any]]:
         """Get flattened form fields for backward compatibility.
@@ -122,18 +254,13 @@ class MedicalKnowledgeBase:
         Returns:
             Recommendation text or default message
         """
-        for rec in self.data["recommendations"]:
-            if rec["condition"] == disease:
-                return rec["recommendation"]
-
-        return "Cần khám bác sĩ để được tư vấn chi tiết."
+        return self._recommendations.get(
+            disease, "Cần khám bác sĩ để được tư vấn chi tiết."
+        )
 
     def get_disease_info(self, disease: str) -> Optional[Dict[str, Any]]:
         """Get detailed information about a disease."""
-        for disease_data in self.data["diseases"]:
-            if disease_data["variable"] == disease:
-                return disease_data
-        return None
+        return self._diseases_by_variable.get(disease)
 
     def get_diseases(self) -> List[Dict[str, Any]]:
         """Return disease list (used to build inference goals)."""
@@ -149,11 +276,14 @@ class MedicalKnowledgeBase:
 
     def get_symptom_label(self, symptom: str) -> str:
         """Get human-readable label for a symptom variable."""
-        for symp in self.data["symptoms"]:
-            if symp["variable"] == symptom:
-                return symp["label"]
+        if symptom in self._symptom_labels:
+            return self._symptom_labels[symptom]
         return symptom.replace("_", " ").title()
 
+    def get_load_stats(self) -> Dict[str, Any]:
+        """Cold-load report: source file, format, rule count and seconds."""
+        return dict(self.load_stats)
+
     def get_metadata(self) -> Dict[str, Any]:
         """Get KB metadata (version, counts, etc.)."""
         return self.data["metadata"]
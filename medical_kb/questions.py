@@ -0,0 +1,435 @@
+"""Question-selection index and information-gain question choice.
+
+``QuestionIndex`` is built once per KB version. It maps every fact to the
+questions whose answers can produce it and to the rules that need it, and
+it expands each target diagnosis into its *derivations*: minimal sets of
+answerable facts that prove it through the rule network. For every
+question it also stores the distinct outcomes an answer can have (the set
+of facts that answer produces).
+
+``QuestionSelector`` follows one interview. Answers that refute a fact
+retire every derivation using it, and a per-(diagnosis, question) counter
+of live derivations the question cannot affect is kept up to date. The next
+question is the one with the highest expected information gain over the
+remaining diagnoses plus a "none of them" hypothesis. Each diagnosis is
+equally likely, and an answer is uniform over the outcomes the diagnosis
+can still be proven under. When no question can change that distribution,
+there is nothing left worth asking.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from .conditions import NUMERIC_OPERATORS, ConditionTest, condition_variables
+from .form_generator import discharge_facts, extract_facts_from_form, kb_fact_rules
+from .interview import DISCHARGE_VARIABLE
+
+# Cap on derivations kept per fact while expanding the rule network; a
+# target that hits it can no longer be ruled out by answers.
+MAX_DERIVATIONS = 2000
+
+
+def _numeric_thresholds(kb: Any, variable: str) -> List[float]:
+    thresholds: Set[float] = set()
+
+    def walk(node) -> None:
+        if isinstance(node, ConditionTest):
+            if node.name == variable and node.op in NUMERIC_OPERATORS:
+                thresholds.add(float(node.literal))
+            return
+        for part in node[1]:
+            walk(part)
+
+    for rule in kb_fact_rules(kb):
+        walk(rule.tree)
+    return sorted(thresholds)
+
+
+def _sample_answers(kb: Any, question: Mapping[str, Any]) -> List[Any]:
+    """Answers that cover every outcome of ``question``."""
+
+    kind = question.get("type")
+    if kind == "radio" and question.get("options"):
+        return list(question["options"])
+    if kind == "number":
+        values: List[float] = []
+        for threshold in _numeric_thresholds(kb, question["variable"]):
+            values.extend((threshold - 1, threshold, threshold + 1))
+        return sorted(set(values)) or [0]
+    return [True, False]
+
+
+class QuestionIndex:
+    """Per-KB index behind interview question selection.
+
+    Attributes:
+        questions: Question bank in priority order (ties go to the earlier).
+        sources: fact -> variables of the questions that can produce it.
+        outcomes: variable -> distinct fact sets an answer produces.
+        rules_needing: fact -> ids of the KB rules that use it as a premise.
+        targets: Diagnoses the interview tries to tell apart.
+        derivations: ``(target index, facts)`` pairs; each fact set proves
+            the target and only holds answerable facts.
+        incomplete: Indexes of targets with more than ``MAX_DERIVATIONS``
+            derivations somewhere in their expansion. Answers cannot rule
+            them out, so they stay candidates.
+    """
+
+    def __init__(
+        self,
+        kb: Any,
+        questions: Sequence[Mapping[str, Any]],
+        *,
+        targets: Iterable[str],
+        derived: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self.questions: List[Mapping[str, Any]] = list(questions)
+        self.by_variable: Dict[str, Mapping[str, Any]] = {}
+        for question in self.questions:
+            self.by_variable.setdefault(question["variable"], question)
+        self.derived: Dict[str, str] = dict(derived or {})
+        self.targets: List[str] = list(dict.fromkeys(targets))
+
+        rules_by_variable: Dict[str, List[str]] = {}
+        for rule in kb_fact_rules(kb):
+            for name in condition_variables(rule.tree):
+                rules_by_variable.setdefault(name, []).append(rule.fact)
+
+        self.sources: Dict[str, Tuple[str, ...]] = {}
+        self.outcomes: Dict[str, List[FrozenSet[str]]] = {}
+        for variable, question in self.by_variable.items():
+            samples = _sample_answers(kb, question)
+            produced = {variable, *rules_by_variable.get(variable, ())}
+            if variable == DISCHARGE_VARIABLE:
+                for sample in samples:
+                    produced |= discharge_facts(sample)
+            outcomes: List[FrozenSet[str]] = []
+            for sample in samples:
+                facts = frozenset(extract_facts_from_form({variable: sample}, kb) & produced)
+                if facts not in outcomes:
+                    outcomes.append(facts)
+            self.outcomes[variable] = outcomes
+            for fact in produced:
+                self.sources[fact] = self.sources.get(fact, ()) + (variable,)
+
+        self.rules_needing: Dict[str, Tuple[int, ...]] = {}
+        for rule in kb.compiled.iter_rules():
+            for premise in rule.premises:
+                self.rules_needing[premise] = self.rules_needing.get(premise, ()) + (rule.id,)
+
+        self.derivations: List[Tuple[int, FrozenSet[str]]] = []
+        self.incomplete: Set[int] = set()
+        expanded: Dict[str, Tuple[List[FrozenSet[str]], bool]] = {}
+        for target_index, target in enumerate(self.targets):
+            found, _, truncated = self._expand(kb.compiled, target, expanded, ())
+            if truncated:
+                self.incomplete.add(target_index)
+            for facts in found:
+                if all(fact in self.sources for fact in facts):
+                    self.derivations.append((target_index, facts))
+        self.derivations_with: Dict[str, List[int]] = {}
+        # Variables of the questions that can affect each derivation.
+        self.touched_by: List[Tuple[str, ...]] = []
+        for position, (_, facts) in enumerate(self.derivations):
+            for fact in facts:
+                self.derivations_with.setdefault(fact, []).append(position)
+            touched = {v for fact in facts for v in self.sources[fact]}
+            self.touched_by.append(tuple(v for v in self.outcomes if v in touched))
+
+        # Selector counters before any answer; every interview starts from a copy.
+        self.live_per_target = [0] * len(self.targets)
+        self.untouched: Dict[Tuple[int, str], int] = {}
+        self.weights: Dict[Tuple[int, str], List[float]] = {}
+        self.narrowing: Dict[Tuple[int, str], int] = {}
+        self.shares: Dict[Tuple[int, str], Tuple[int, ...]] = {}
+        for position, (target, _) in enumerate(self.derivations):
+            self.live_per_target[target] += 1
+            touched = self.touched_by[position]
+            for variable in self.outcomes:
+                if variable not in touched:
+                    key = (target, variable)
+                    self.untouched[key] = self.untouched.get(key, 0) + 1
+            for variable in touched:
+                allowed = self.allowed(position, variable)
+                self.shares[(position, variable)] = allowed
+                width = len(self.outcomes[variable])
+                _credit(self.weights, self.narrowing, (target, variable), width, allowed, 1)
+
+    def allowed(
+        self, position: int, variable: str, known: AbstractSet[str] = frozenset()
+    ) -> Tuple[int, ...]:
+        """Outcomes of ``variable`` that keep derivation ``position`` provable.
+
+        Facts in ``known`` (produced by another question) need nothing from
+        this one.
+        """
+
+        needed = [
+            fact
+            for fact in self.derivations[position][1]
+            if variable in self.sources[fact] and fact not in known
+        ]
+        return tuple(
+            bit
+            for bit, outcome in enumerate(self.outcomes[variable])
+            if all(fact in outcome for fact in needed)
+        )
+
+    def _expand(
+        self,
+        compiled: Any,
+        fact: str,
+        expanded: Dict[str, Tuple[List[FrozenSet[str]], bool]],
+        stack: Tuple[str, ...],
+    ) -> Tuple[List[FrozenSet[str]], FrozenSet[str], bool]:
+        """Minimal answerable fact sets proving ``fact`` (AND/OR expansion).
+
+        Also returns the facts of ``stack`` where a cycle was cut and whether
+        a list had to be truncated to ``MAX_DERIVATIONS``. A result cut at an
+        outer fact lacks the derivations through that fact, so only results
+        cut at ``fact`` itself (or not at all) are memoised.
+        """
+
+        producers = compiled.rules_concluding(fact)
+        if not producers:
+            return [frozenset((fact,))], frozenset(), False
+        if fact in stack:
+            return [], frozenset((fact,)), False
+        cached = expanded.get(fact)
+        if cached is not None:
+            return cached[0], frozenset(), cached[1]
+        found: Set[FrozenSet[str]] = set()
+        cuts: Set[str] = set()
+        truncated = False
+        for rule in producers:
+            combos = [frozenset()]
+            for premise in rule.premises:
+                options, cut, short = self._expand(
+                    compiled, premise, expanded, stack + (fact,)
+                )
+                cuts |= cut
+                truncated |= short
+                combos = [c | o for c in combos for o in options]
+                if len(combos) > MAX_DERIVATIONS:
+                    combos, truncated = combos[:MAX_DERIVATIONS], True
+            found.update(combos)
+        minimal = [c for c in found if not any(other < c for other in found)]
+        minimal.sort(key=lambda c: (len(c), sorted(c)))
+        if len(minimal) > MAX_DERIVATIONS:
+            minimal, truncated = minimal[:MAX_DERIVATIONS], True
+        # A derivation through ``fact`` itself is never minimal.
+        cuts.discard(fact)
+        if not cuts:
+            expanded[fact] = (minimal, truncated)
+        return minimal, frozenset(cuts), truncated
+
+    def question_for_fact(self, fact: str) -> Optional[Mapping[str, Any]]:
+        """The question asked to learn ``fact``.
+
+        Its own question first, then the ``derived`` mapping, then the first
+        question whose answer can produce it.
+        """
+
+        variable = fact if fact in self.by_variable else self.derived.get(fact)
+        if variable is None and fact in self.sources:
+            variable = self.sources[fact][0]
+        return self.by_variable.get(variable) if variable is not None else None
+
+
+class QuestionSelector:
+    """Information-gain question choice for one interview.
+
+    For every (diagnosis, question) pair the selector keeps the summed
+    outcome distribution of the diagnosis' live derivations the question can
+    affect, and how many live derivations it cannot affect (those allow
+    every outcome). Retiring a derivation subtracts its share, so scoring a
+    question costs one pass over the diagnoses' outcome weights.
+    """
+
+    def __init__(self, index: QuestionIndex) -> None:
+        self.index = index
+        self._seen: Dict[str, Any] = {}
+        self._reset()
+
+    def _reset(self) -> None:
+        index = self.index
+        self._answered: Set[str] = set()
+        self._known: Set[str] = set()
+        self._alive = bytearray(b"\x01") * len(index.derivations)
+        self._live_per_target = list(index.live_per_target)
+        self._untouched = dict(index.untouched)
+        # (diagnosis, variable) -> summed outcome shares of live derivations
+        self._weights = {key: list(weights) for key, weights in index.weights.items()}
+        # Live derivations that rule out at least one outcome of the question.
+        self._narrowing = dict(index.narrowing)
+        self._shares = dict(index.shares)
+
+    def _reshare(self, position: int, variable: str, allowed: Optional[Tuple[int, ...]]) -> None:
+        """Replace (or, with ``None``, drop) a derivation's outcome share."""
+
+        key = (self.index.derivations[position][0], variable)
+        width = len(self.index.outcomes[variable])
+        old = self._shares.pop((position, variable))
+        _credit(self._weights, self._narrowing, key, width, old, -1)
+        if allowed is not None:
+            _credit(self._weights, self._narrowing, key, width, allowed, 1)
+            self._shares[(position, variable)] = allowed
+
+    def observe(self, answers: Mapping[str, Any], facts: Set[str]) -> None:
+        """Account for answers and facts not seen before.
+
+        A changed answer can withdraw facts, so it starts over.
+        """
+
+        seen = self._seen
+        if any(name in seen and seen[name] != value for name, value in answers.items()):
+            self._seen = {}
+            self._reset()
+        index = self.index
+        new = [name for name in answers if name not in self._seen]
+        self._seen.update((name, answers[name]) for name in new)
+        self._answered.update(name for name in new if name in index.outcomes)
+
+        # A fact one question produced needs nothing from the others.
+        learned = [fact for fact in facts if fact not in self._known and fact in index.sources]
+        self._known.update(learned)
+        for fact in learned:
+            if len(index.sources[fact]) < 2:
+                continue
+            for position in index.derivations_with.get(fact, ()):
+                if not self._alive[position]:
+                    continue
+                for variable in index.touched_by[position]:
+                    if variable in self._answered:
+                        continue
+                    allowed = index.allowed(position, variable, self._known)
+                    if allowed != self._shares[(position, variable)]:
+                        self._reshare(position, variable, allowed)
+
+        for name in new:
+            for outcome in index.outcomes.get(name, ()):
+                for fact in outcome:
+                    if fact not in facts and self._refuted(fact):
+                        self._retire(fact)
+
+    def _refuted(self, fact: str) -> bool:
+        return all(variable in self._answered for variable in self.index.sources[fact])
+
+    def _retire(self, fact: str) -> None:
+        index = self.index
+        for position in index.derivations_with.get(fact, ()):
+            if not self._alive[position]:
+                continue
+            self._alive[position] = 0
+            target = index.derivations[position][0]
+            self._live_per_target[target] -= 1
+            touched = index.touched_by[position]
+            for variable in index.outcomes:
+                if variable not in touched:
+                    self._untouched[(target, variable)] -= 1
+            for variable in touched:
+                self._reshare(position, variable, None)
+
+    def candidates(self) -> List[str]:
+        """Diagnoses that can still be proven, in target order."""
+
+        return [
+            target
+            for position, (target, live) in enumerate(
+                zip(self.index.targets, self._live_per_target)
+            )
+            if live or position in self.index.incomplete
+        ]
+
+    def information_gain(self, variable: str) -> float:
+        """Expected entropy drop over the live diagnoses from asking ``variable``.
+
+        A diagnosis predicts each outcome with the average, over its live
+        derivations, of a uniform choice among the outcomes that keep the
+        derivation provable. A "none of them" hypothesis predicts every
+        outcome equally.
+        """
+
+        width = len(self.index.outcomes[variable])
+        likelihoods = [[1.0 / width] * width]
+        informative = False
+        for target, live in enumerate(self._live_per_target):
+            if not live:
+                continue
+            key = (target, variable)
+            if self._narrowing.get(key, 0) > 0:
+                informative = True
+            base = self._untouched.get(key, 0) / width
+            weights = self._weights.get(key)
+            if weights is None:
+                likelihoods.append([base / live] * width)
+            else:
+                likelihoods.append([(base + w) / live for w in weights])
+        if not informative:
+            return 0.0
+
+        prior = 1.0 / len(likelihoods)
+        expected = 0.0
+        for bit in range(width):
+            joint = [prior * likelihood[bit] for likelihood in likelihoods]
+            total = sum(joint)
+            if total > 0:
+                expected += total * _entropy(joint, total)
+        return math.log2(len(likelihoods)) - expected
+
+    def choose(
+        self, answers: Mapping[str, Any], facts: Set[str]
+    ) -> Optional[Mapping[str, Any]]:
+        """Unanswered question with the highest information gain, if any.
+
+        ``None`` means no live derivation depends on an unanswered question.
+        """
+
+        self.observe(answers, facts)
+        best: Optional[Mapping[str, Any]] = None
+        best_gain = 1e-9
+        for question in self.index.questions:
+            variable = question["variable"]
+            if variable in answers or variable not in self.index.outcomes:
+                continue
+            gain = self.information_gain(variable)
+            if gain > best_gain:
+                best, best_gain = question, gain
+        return best
+
+
+def _credit(
+    weights: Dict[Tuple[int, str], List[float]],
+    narrowing: Dict[Tuple[int, str], int],
+    key: Tuple[int, str],
+    width: int,
+    allowed: Tuple[int, ...],
+    sign: int,
+) -> None:
+    """Add (``sign=1``) or remove one derivation's uniform share over ``allowed``."""
+
+    row = weights.get(key)
+    if row is None:
+        row = weights[key] = [0.0] * width
+    for bit in allowed:
+        row[bit] += sign / len(allowed)
+    if len(allowed) < width:
+        narrowing[key] = narrowing.get(key, 0) + sign
+
+
+def _entropy(weights: Sequence[float], total: float) -> float:
+    return -sum((w / total) * math.log2(w / total) for w in weights if w > 0)
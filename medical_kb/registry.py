@@ -0,0 +1,179 @@
+"""Hot-reloading registry of loaded medical knowledge bases.
+
+Each KB file gets one ``KBRegistry``. ``get()`` returns the active
+``MedicalKnowledgeBase`` and, at most every ``check_interval`` seconds,
+looks at the file's mtime and size. When they change, a background thread
+hashes the file and, if the content really changed, builds a new KB and
+swaps it in with a single reference assignment. Callers that already hold
+the old instance (in-flight requests) keep using it untouched.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .loader import DEFAULT_JSON_PATH, MedicalKnowledgeBase
+
+_FileStamp = Tuple[int, int]  # (mtime_ns, size)
+
+
+def _stamp(path: Path) -> Optional[_FileStamp]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class _ActiveKB:
+    """One loaded version; replaced as a whole on reload."""
+
+    __slots__ = ("kb", "digest", "stamp", "number", "loaded_at")
+
+    def __init__(
+        self, kb: MedicalKnowledgeBase, digest: str, stamp: Optional[_FileStamp], number: int
+    ) -> None:
+        self.kb = kb
+        self.digest = digest
+        self.stamp = stamp
+        self.number = number
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+
+
+class KBRegistry:
+    """Serve one KB file and reload it in the background when it changes."""
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        check_interval: float = 2.0,
+        factory: Optional[Callable[[Path], MedicalKnowledgeBase]] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._factory = factory or (lambda p: MedicalKnowledgeBase(kb_path=str(p)))
+        self._lock = threading.Lock()
+        self._active: Optional[_ActiveKB] = None
+        self._worker: Optional[threading.Thread] = None
+        self._next_check = 0.0
+        self._reloads = 0
+        self._last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+    def get(self) -> MedicalKnowledgeBase:
+        """Return the active KB, loading it synchronously the first time."""
+
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = self._build(number=1)
+                active = self._active
+        elif time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            if _stamp(self.path) != active.stamp:
+                self.reload()
+        return active.kb
+
+    def reload(self, *, wait: bool = False) -> bool:
+        """Start a background rebuild unless one is running.
+
+        Returns True if a rebuild was started. With ``wait=True`` the call
+        blocks until the rebuild (new or already running) has finished.
+        """
+
+        with self._lock:
+            worker = self._worker
+            started = worker is None or not worker.is_alive()
+            if started:
+                worker = threading.Thread(
+                    target=self._reload_in_background,
+                    name=f"kb-reload:{self.path.name}",
+                    daemon=True,
+                )
+                self._worker = worker
+                worker.start()
+        if wait and worker is not None:
+            worker.join()
+        return started
+
+    def _reload_in_background(self) -> None:
+        try:
+            current = self._active
+            stamp = _stamp(self.path)
+            digest = _digest(self.path)
+            if current is not None and digest == current.digest:
+                current.stamp = stamp  # touched but unchanged: nothing to rebuild
+                return
+            number = current.number + 1 if current is not None else 1
+            replacement = self._build(number=number, digest=digest, stamp=stamp)
+        except Exception as exc:  # keep serving the old version
+            self._last_error = f"{type(exc).__name__}: {exc}"
+            return
+        with self._lock:
+            self._active = replacement
+            self._reloads += 1
+            self._last_error = None
+
+    def _build(
+        self,
+        *,
+        number: int,
+        digest: Optional[str] = None,
+        stamp: Optional[_FileStamp] = None,
+    ) -> _ActiveKB:
+        stamp = stamp if stamp is not None else _stamp(self.path)
+        digest = digest if digest is not None else _digest(self.path)
+        kb = self._factory(self.path)
+        return _ActiveKB(kb, digest, stamp, number)
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def status(self) -> Dict[str, Any]:
+        active = self._active
+        worker = self._worker
+        info: Dict[str, Any] = {
+            "path": str(self.path),
+            "loaded": active is not None,
+            "reloading": worker is not None and worker.is_alive(),
+            "reloads": self._reloads,
+            "last_error": self._last_error,
+        }
+        if active is not None:
+            info.update(
+                {
+                    "version": active.number,
+                    "content_sha256": active.digest,
+                    "loaded_at": active.loaded_at,
+                    "load": active.kb.get_load_stats(),
+                }
+            )
+        return info
+
+
+_registries: Dict[Path, KBRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path: Optional[Path] = None) -> KBRegistry:
+    """Return the process-wide registry for ``path`` (default medical KB)."""
+
+    resolved = Path(path or DEFAULT_JSON_PATH).resolve()
+    with _registries_lock:
+        registry = _registries.get(resolved)
+        if registry is None:
+            registry = _registries[resolved] = KBRegistry(resolved)
+        return registry
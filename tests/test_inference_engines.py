@@ -0,0 +1,708 @@
+"""Engine-level regression tests for the inference toolkit.
+
+The optimised engines must stay observably identical to the reference
+implementations that the lab UI and the sinusitis diagnosis rely on.
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+import sys
+from pathlib import Path
+from typing import List, Set, Tuple
+
+import pytest
+
+
+def _ensure_project_root_on_path() -> None:
+    project_root = Path(__file__).resolve().parents[1]
+    root_str = str(project_root)
+    if root_str not in sys.path:
+        sys.path.insert(0, root_str)
+
+
+_ensure_project_root_on_path()
+
+from inference_lab import (
+    CompactRuleStore,
+    CompiledRuleBase,
+    KnowledgeBase,
+    run_backward_inference,
+    run_forward_inference,
+)
+from inference_lab.sample_data import (
+    TRIANGLE_DEFAULT_FACTS,
+    TRIANGLE_DEFAULT_GOALS,
+    TRIANGLE_RULES,
+)
+
+
+def _triangle_kb() -> KnowledgeBase:
+    kb = KnowledgeBase(name="triangle")
+    kb.load_rules_from_text("\n".join(TRIANGLE_RULES))
+    kb.set_facts(TRIANGLE_DEFAULT_FACTS)
+    return kb
+
+
+def _random_kb(seed: int) -> Tuple[KnowledgeBase, Set[str], List[str]]:
+    rnd = random.Random(seed)
+    atoms = [f"x{i}" for i in range(30)]
+    kb = KnowledgeBase(name=f"random-{seed}")
+    for _ in range(80):
+        kb.add_rule(rnd.sample(atoms, rnd.randint(1, 3)), rnd.choice(atoms))
+    return kb, set(rnd.sample(atoms, 4)), rnd.sample(atoms, 2)
+
+
+def _build_case(case: str) -> Tuple[KnowledgeBase, Set[str] | None, List[str]]:
+    if case == "triangle":
+        return _triangle_kb(), None, sorted(TRIANGLE_DEFAULT_GOALS)
+    return _random_kb(int(case.split("-")[1]))
+
+
+CASES = ["triangle", *[f"random-{seed}" for seed in range(8)]]
+
+
+def test_knowledge_base_indexes_follow_edits():
+    """Indexes, ordering and the compiled cache must track every edit."""
+
+    kb, _, _ = _random_kb(5)
+    rnd = random.Random(11)
+    for step in range(200):
+        ids = [rule.id for rule in kb.iter_rules()]
+        action = rnd.choice(["add", "update", "remove"])
+        before = kb.version
+        if action == "add" or not ids:
+            kb.add_rule(rnd.sample(["x1", "x2", "x3", "y"], 2), f"z{step % 7}")
+        elif action == "update":
+            kb.update_rule(rnd.choice(ids), conclusion=f"z{step % 5}")
+        else:
+            kb.remove_rule(rnd.choice(ids))
+        assert kb.version > before
+
+    rules = list(kb.iter_rules())
+    assert [rule.id for rule in rules] == sorted(rule.id for rule in rules)
+    atoms = {atom for rule in rules for atom in (*rule.premises, rule.conclusion)}
+    for atom in atoms | {"unknown"}:
+        assert kb.rules_concluding(atom) == tuple(
+            rule for rule in rules if rule.conclusion == atom
+        )
+        assert kb.rules_with_premise(atom) == tuple(
+            rule for rule in rules if atom in rule.premises
+        )
+
+    compiled = kb.compile()
+    assert kb.compile() is compiled
+    assert compiled.rules == tuple(rules)
+    kb.add_fact("x1")
+    assert kb.compile() is not compiled
+
+
+def test_compact_rule_store_matches_rule_store():
+    """The packed store must answer like the default one after any edits."""
+
+    kb, facts, goals = _random_kb(6)
+    compact = KnowledgeBase(rules=CompactRuleStore(kb.iter_rules()), name="compact")
+    snapshot = compact.snapshot()
+    before = list(snapshot.iter_rules())
+    rnd = random.Random(3)
+    for step in range(100):
+        rule_id = rnd.choice([rule.id for rule in kb.iter_rules()])
+        for target in (kb, compact):
+            if step % 3 == 0:
+                target.add_rule(["x1", f"x{step % 9}"], f"x{step % 11}")
+            elif step % 3 == 1:
+                target.update_rule(rule_id, premises=["x2", "x3"])
+            else:
+                target.remove_rule(rule_id)
+
+    assert list(compact.iter_rules()) == list(kb.iter_rules())
+    assert list(snapshot.iter_rules()) == before
+    for atom in ("x1", "x2", "x5", "unknown"):
+        assert compact.rules_concluding(atom) == kb.rules_concluding(atom)
+        assert compact.rules_with_premise(atom) == kb.rules_with_premise(atom)
+    expected = run_forward_inference(kb, goals=goals, initial_facts=facts)
+    actual = run_forward_inference(compact, goals=goals, initial_facts=facts)
+    assert actual.fired_rules == expected.fired_rules
+    usage = compact.memory_usage()
+    assert usage["rules"] == len(kb.rules)
+    assert 0 < usage["total_bytes"] < kb.memory_usage()["total_bytes"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_streaming_loader_matches_line_by_line_loading(tmp_path: Path, workers: int):
+    lines = [*TRIANGLE_RULES, "", "no arrow here", "a ^ b -> ", *TRIANGLE_RULES]
+    path = tmp_path / "rules.txt"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    expected = KnowledgeBase()
+    expected.add_rule(["seed"], "kept")
+    for text in lines:
+        try:
+            expected.add_rule_from_text(text)
+        except ValueError:
+            pass
+    loaded = KnowledgeBase()
+    loaded.add_rule(["seed"], "kept")
+    report = loaded.load_rules_streaming(path, workers=workers, chunk_lines=5)
+
+    assert list(loaded.iter_rules()) == list(expected.iter_rules())
+    assert [error.line for error in report.errors] == [
+        len(TRIANGLE_RULES) + 2,
+        len(TRIANGLE_RULES) + 3,
+    ]
+    assert report.rules_loaded == 2 * len(TRIANGLE_RULES)
+    assert (report.first_id, report.last_id) == (2, 1 + report.rules_loaded)
+    assert report.lines == len(lines)
+    assert loaded.add_rule(["x"], "y").id == report.last_id + 1
+
+
+def test_structured_add_rules_keeps_atoms_verbatim():
+    kb = KnowledgeBase()
+    kb.add_rule(["seed"], "kept")
+    rules = kb.add_rules(
+        [
+            ([" salt and pepper ", "a&b", "a&b"], "x?y"),
+            (["standard"], "brand, new"),
+        ]
+    )
+    assert [rule.id for rule in rules] == [2, 3]
+    assert rules[0].premises == ("salt and pepper", "a&b")
+    assert rules[0].conclusion == "x?y"
+    assert kb.rules_concluding("brand, new") == (rules[1],)
+
+    version = kb.version
+    with pytest.raises(ValueError, match="#2"):
+        kb.add_rules([(["ok"], "fine"), (["ok", "  "], "broken")])
+    assert kb.version == version
+    assert len(kb.rules) == 3
+
+
+def test_snapshots_and_clones_are_isolated_from_edits():
+    kb, _, _ = _random_kb(2)
+    kb.set_facts(["x1"])
+    before = list(kb.iter_rules())
+    snapshot = kb.snapshot()
+    clone = kb.clone()
+    assert snapshot.rules._data is kb.rules._data  # shared until a write
+
+    removed = kb.remove_rule(before[0].id)
+    kb.add_rule(["x1"], "fresh")
+    kb.add_fact("x2")
+    clone.update_rule(before[1].id, conclusion="cloned")
+
+    assert list(snapshot.iter_rules()) == before
+    assert snapshot.rules_concluding(removed.conclusion) == tuple(
+        rule for rule in before if rule.conclusion == removed.conclusion
+    )
+    assert snapshot.facts == {"x1"}
+    assert kb.rules_concluding("cloned") == ()
+    assert clone.rules_concluding("fresh") == ()
+    assert [rule.id for rule in clone.rules_concluding("cloned")] == [before[1].id]
+    with pytest.raises(RuntimeError):
+        snapshot.add_rule(["x1"], "nope")
+    with pytest.raises(RuntimeError):
+        snapshot.add_fact("nope")
+
+
+def test_snapshots_stay_consistent_under_concurrent_edits():
+    import threading
+
+    kb, _, _ = _random_kb(4)
+    stop = threading.Event()
+
+    def edit() -> None:
+        rnd = random.Random(1)
+        while not stop.is_set():
+            rule = kb.add_rule(["x1", "x2"], "edited")
+            kb.update_rule(rule.id, conclusion=f"e{rnd.randint(0, 3)}")
+            kb.remove_rule(rnd.choice([r.id for r in kb.iter_rules()]))
+
+    writer = threading.Thread(target=edit)
+    writer.start()
+    try:
+        for _ in range(200):
+            view = kb.snapshot()
+            rules = list(view.iter_rules())
+            for atom in ("edited", "e0", "x1"):
+                assert view.rules_concluding(atom) == tuple(
+                    rule for rule in rules if rule.conclusion == atom
+                )
+    finally:
+        stop.set()
+        writer.join()
+
+
+@pytest.mark.parametrize("strategy", ["stack", "queue"])
+@pytest.mark.parametrize("index_mode", ["min", "max"])
+@pytest.mark.parametrize("case", CASES)
+def test_incremental_agenda_matches_scan(case: str, strategy: str, index_mode: str):
+    """The premise-indexed agenda must fire rules in the reference order."""
+
+    kb, facts, goals = _build_case(case)
+    reference, incremental = (
+        run_forward_inference(
+            kb,
+            goals=goals,
+            strategy=strategy,
+            index_mode=index_mode,
+            initial_facts=facts,
+            agenda=agenda,
+        )
+        for agenda in ("scan", "incremental")
+    )
+    assert incremental.fired_rules == reference.fired_rules
+    assert incremental.final_facts == reference.final_facts
+    assert incremental.success == reference.success
+    assert incremental.history == reference.history
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_compiled_rule_base_is_reusable(case: str):
+    """A base compiled once must answer like the source KB on every call."""
+
+    kb, facts, goals = _build_case(case)
+    compiled = CompiledRuleBase.from_knowledge_base(kb)
+    for _ in range(2):
+        expected = run_forward_inference(kb, goals=goals, initial_facts=facts)
+        actual = run_forward_inference(compiled, goals=goals, initial_facts=facts)
+        assert actual.fired_rules == expected.fired_rules
+        assert actual.final_facts == expected.final_facts
+
+        expected_b = run_backward_inference(
+            kb, goals=goals, initial_facts=facts, make_graph=False
+        )
+        actual_b = run_backward_inference(
+            compiled, goals=goals, initial_facts=facts, make_graph=False
+        )
+        assert actual_b.used_rules == expected_b.used_rules
+        assert list(actual_b.steps) == list(expected_b.steps)
+
+
+@pytest.mark.parametrize("strategy", ["stack", "queue"])
+@pytest.mark.parametrize("case", CASES)
+def test_trace_levels_agree_with_full_history(case: str, strategy: str):
+    """Delta traces must rebuild the full history; other levels keep the count."""
+
+    kb, facts, goals = _build_case(case)
+    runs = {
+        level: run_forward_inference(
+            kb, goals=goals, strategy=strategy, initial_facts=facts, trace=level
+        )
+        for level in ("full", "delta", "summary", "none")
+    }
+    full = runs["full"]
+    assert list(runs["delta"].history) == full.history
+    assert runs["delta"].history[-1] == full.history[-1]
+    # Indexed access replays the deltas once, not once per index.
+    history = runs["delta"].history
+    assert [history[i] for i in range(len(history))] == full.history
+    assert history[-len(history):] == full.history
+    with pytest.raises(IndexError):
+        history[len(history)]
+    assert runs["summary"].history == [full.history[0], full.history[-1]][
+        : len(full.history)
+    ]
+    assert runs["none"].history == []
+    for result in runs.values():
+        assert result.step_count == len(full.history)
+        assert result.fired_rules == full.fired_rules
+
+
+@pytest.mark.parametrize("index_mode", ["min", "max"])
+@pytest.mark.parametrize("case", CASES)
+def test_tabled_backward_matches_dfs(case: str, index_mode: str):
+    """Tabling may shorten the explanation but never changes the proof."""
+
+    kb, facts, goals = _build_case(case)
+    dfs, tabled = (
+        run_backward_inference(
+            kb,
+            goals=goals,
+            index_mode=index_mode,
+            initial_facts=facts,
+            make_graph=False,
+            engine=engine,
+        )
+        for engine in ("dfs", "tabled")
+    )
+    assert tabled.success == dfs.success
+    assert tabled.used_rules == dfs.used_rules
+    assert tabled.final_known == dfs.final_known
+    if tabled.cache_stats["failure_hits"] == 0:
+        assert tabled.steps == dfs.steps
+
+
+@pytest.mark.parametrize("engine", ["dfs", "tabled"])
+def test_backward_handles_chains_deeper_than_recursion_limit(engine: str):
+    kb = KnowledgeBase(name="deep-chain")
+    depth = 3 * sys.getrecursionlimit()
+    for i in range(depth):
+        kb.add_rule([f"a{i}"], f"a{i + 1}")
+    deep = run_backward_inference(
+        kb, goals=[f"a{depth}"], initial_facts=["a0"], make_graph=False, engine=engine
+    )
+    assert deep.success
+    assert len(deep.used_rules) == depth
+    assert deep.steps.events[-1].kind == "goal_done"
+    assert deep.steps[-1] == f"+++ Hoàn tất mục tiêu 'a{depth}'."
+
+
+def test_tabled_backward_caches_shared_failures():
+    shared = KnowledgeBase(name="shared-failure")
+    for i in range(40):
+        shared.add_rule([f"b{i}", "missing"], f"b{i + 1}")
+        shared.add_rule([f"b{i}", "missing"], f"c{i + 1}")
+        shared.add_rule([f"c{i + 1}"], f"b{i + 1}")
+    result = run_backward_inference(
+        shared, goals=["b40"], initial_facts=[], make_graph=False, engine="tabled"
+    )
+    assert not result.success
+    assert result.cache_stats["failure_hits"] > 0
+    assert len(result.steps) < 5000
+
+
+@pytest.mark.parametrize("index_mode", ["min", "max"])
+@pytest.mark.parametrize("case", CASES)
+def test_forest_goal_status_matches_single_goal_proofs(case: str, index_mode: str):
+    """Every goal is decided as if proved alone, and its proof is sound."""
+
+    kb, facts, _ = _build_case(case)
+    goals = sorted({rule.conclusion for rule in kb.iter_rules()})[:8] + ["missing"]
+    forest = run_backward_inference(
+        kb,
+        goals=goals,
+        index_mode=index_mode,
+        initial_facts=facts,
+        make_graph=False,
+        goal_mode="forest",
+    )
+    for goal in goals:
+        alone = run_backward_inference(
+            kb, goals=[goal], initial_facts=facts, make_graph=False
+        )
+        assert forest.goal_status[goal] == alone.success
+    assert forest.success == all(forest.goal_status.values())
+
+    given = set(facts if facts is not None else kb.facts)
+    derived = set(given)
+    rules = {rule.id: rule for rule in kb.iter_rules()}
+    assert len(set(forest.used_rules)) == len(forest.used_rules)
+    for rule_id in forest.used_rules:
+        assert set(rules[rule_id].premises) <= derived
+        derived.add(rules[rule_id].conclusion)
+    proven = {goal for goal, ok in forest.goal_status.items() if ok}
+    assert proven <= derived
+
+
+def test_batch_fixpoint_matches_sequential_closure():
+    """Every batch row must reach the closure the sequential engine reaches."""
+
+    pytest.importorskip("numpy")
+    from inference_lab.batch import run_forward_batch
+
+    kb, _, _ = _random_kb(3)
+    rnd = random.Random(7)
+    atoms = sorted({atom for rule in kb.iter_rules() for atom in rule.premises})
+    fact_sets = [set(rnd.sample(atoms, rnd.randint(0, 6))) | {"extra"} for _ in range(50)]
+    goals = ["x1", "x2"]
+
+    batch = run_forward_batch(kb, fact_sets, goals=goals)
+    assert len(batch) == len(fact_sets)
+    for facts, summary in zip(fact_sets, batch):
+        closure = run_forward_inference(
+            kb, goals=["__unreachable__"], initial_facts=facts
+        )
+        targeted = run_forward_inference(kb, goals=goals, initial_facts=facts)
+        assert summary.final_facts == closure.final_facts
+        assert summary.success == targeted.success
+        assert set(summary.fired_rules) <= {rule.id for rule in kb.iter_rules()}
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_closure_matches_full_closure(seed):
+    """Feeding facts one by one must reach the same closure as one run."""
+
+    from inference_lab.incremental import IncrementalClosure
+
+    kb, _, _ = _random_kb(seed)
+    compiled = kb.compile()
+    rnd = random.Random(seed)
+    closure = IncrementalClosure(compiled)
+    given: Set[str] = set()
+    for fact in rnd.sample([f"x{i}" for i in range(30)], 10) + ["unknown"]:
+        added = closure.add([fact])
+        given.add(fact)
+        expected = run_forward_inference(
+            kb, goals=["__unreachable__"], initial_facts=given, trace="none"
+        )
+        assert closure.facts == set(expected.final_facts)
+        assert set(added) <= closure.facts
+    rules = {rule.id: rule for rule in kb.iter_rules()}
+    for rule_id in closure.fired:
+        assert set(rules[rule_id].premises) <= closure.facts
+
+    closure.reset({"x0"})
+    assert closure.facts == set(
+        run_forward_inference(kb, goals=["__unreachable__"], initial_facts={"x0"}).final_facts
+    )
+
+
+def test_inference_cache_hits_evicts_and_invalidates(monkeypatch):
+    import gc
+
+    from inference_lab import cache as cache_module
+    from inference_lab.cache import InferenceCache
+
+    clock = [0.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: clock[0])
+    cache = InferenceCache(max_entries=2, ttl=10)
+    kb, facts, goals = _random_kb(3)
+
+    first = cache.forward(kb, goals=goals, initial_facts=facts)
+    expected = run_forward_inference(kb, goals=goals, initial_facts=facts, trace="none")
+    assert first.final_facts == expected.final_facts
+    assert first.fired_rules == expected.fired_rules
+    # Same facts in another order (and spelling) hit the cache.
+    assert cache.forward(kb, goals=goals, initial_facts=[f" {f} " for f in facts]) is first
+    assert cache.backward(kb, goals=goals, initial_facts=facts).success == (
+        run_backward_inference(kb, goals=goals, initial_facts=facts, make_graph=False).success
+    )
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    cache.forward(kb, goals=goals, initial_facts=facts, strategy="queue")
+    assert cache.evictions == 1 and len(cache) == 2
+
+    clock[0] = 11.0
+    assert cache.forward(kb, goals=goals, initial_facts=facts, strategy="queue") is not first
+    assert cache.expirations == 1
+
+    # A rule change bumps the KB version and drops its entries.
+    kb.add_rule(["x0"], "x1")
+    cache.forward(kb, goals=goals, initial_facts=facts)
+    assert cache.invalidations == 2 and len(cache) == 1
+
+    # A collected KB (e.g. replaced by a reload) is dropped as well.
+    compiled = kb.compile()
+    cache.forward(compiled, goals=goals, initial_facts=facts)
+    del compiled, kb
+    gc.collect()
+    other, other_facts, other_goals = _random_kb(4)
+    cache.forward(other, goals=other_goals, initial_facts=other_facts)
+    assert len(cache) == 1
+    assert cache.discard(other) == 1 and len(cache) == 0
+
+
+def test_graph_render_pool_bounds_and_cancels(tmp_path):
+    import threading
+
+    from inference_lab.graph_jobs import GraphRenderPool
+
+    pool = GraphRenderPool(workers=1, max_pending=2)
+    gate, started = threading.Event(), threading.Event()
+
+    def render(name):
+        def task():
+            started.set()
+            gate.wait(5)
+            path = tmp_path / name
+            path.write_text(name)
+            return path
+
+        return task
+
+    running = pool.submit({"fpg": render("fpg.svg"), "rpg": render("rpg.svg")})
+    queued = pool.submit({"fpg": lambda: None})
+    assert pool.submit({}) is None and pool.rejected == 1
+
+    # Shutting down drops queued jobs; a running one stops after its
+    # current render and keeps what it wrote (the cache owns the files).
+    assert started.wait(5)
+    pool.shutdown()
+    gate.set()
+    pool.wait(running.id, timeout=5)
+    assert running.status == "cancelled" and set(running.files) == {"fpg"}
+    assert queued.status == "cancelled"
+
+    pool = GraphRenderPool(workers=1, max_pending=2)
+    done = pool.submit({"fpg": render("fpg.svg")})
+    failed = pool.submit({"fpg": lambda: 1 / 0})
+    pool.wait(done.id, timeout=5)
+    pool.wait(failed.id, timeout=5)
+    pool.shutdown()
+    assert done.status == "done" and set(done.files) == {"fpg"}
+    assert failed.status == "failed" and "ZeroDivisionError" in failed.error
+    assert pool.get(done.id) is done
+
+
+def test_lab_infer_returns_graph_job(tmp_path, monkeypatch):
+    from web import create_app
+    from web.routes import lab_routes
+
+    monkeypatch.setattr(lab_routes, "_graph_pool", None)
+    app = create_app()
+    app.config["GRAPH_OUTPUT_ROOT"] = str(tmp_path)
+    client = app.test_client()
+    reply = client.post(
+        "/lab/api/infer",
+        json={
+            "mode": "forward",
+            "rules": TRIANGLE_RULES,
+            "facts": sorted(TRIANGLE_DEFAULT_FACTS),
+            "goals": sorted(TRIANGLE_DEFAULT_GOALS),
+        },
+    ).get_json()
+    assert reply["ok"] and reply["result"]["success"]
+    job = reply["result"]["graphJob"]
+    assert reply["result"]["graphs"] == {}
+    # Renders go to the content-addressed cache, not per-request folders.
+    assert [p.name for p in tmp_path.iterdir()] == ["cache"]
+
+    assert client.get(job["statusUrl"]).get_json()["id"] == job["id"]
+    lab_routes._graph_pool.wait(job["id"], timeout=30)
+    status = client.get(job["statusUrl"]).get_json()
+    # Without the dot executable the in-process SVG renderer takes over.
+    assert status["status"] == "done", status
+    assert set(status["graphs"]) == {"fpg", "rpg"}
+    assert client.get("/lab/api/graphs/unknown").status_code == 404
+
+    # A render evicted from the cache is reported instead of a dead URL.
+    lab_routes._graph_pool.get(job["id"]).files["fpg"].unlink()
+    expired = client.get(job["statusUrl"])
+    assert expired.status_code == 410
+    assert expired.get_json()["status"] == "expired"
+    lab_routes._graph_pool.shutdown()
+
+
+def test_render_cache_stores_each_graph_once(tmp_path, monkeypatch):
+    from inference_lab import graphs
+    from inference_lab.render_cache import RenderCache
+
+    renders = []
+
+    def fake_dot(graph, target, fmt, **style):
+        renders.append(target)
+        output = Path(f"{target}.{fmt}")
+        output.write_text("x" * 600)
+        return output
+
+    monkeypatch.setattr(graphs, "graphviz_ready", lambda: True)
+    monkeypatch.setattr(graphs, "_render_dot", fake_dot)
+    cache = RenderCache(tmp_path / "cache", max_bytes=1500)
+    kb = _triangle_kb()
+    rules = list(kb.compile().rules)
+
+    def fpg(facts, **extra):
+        return graphs.render_fpg(
+            rules,
+            known_facts=facts,
+            goal_facts=TRIANGLE_DEFAULT_GOALS,
+            given_facts=TRIANGLE_DEFAULT_FACTS,
+            output=tmp_path / "ignored" / "forward_fpg.svg",
+            cache=cache,
+            **extra,
+        )
+
+    first = fpg(set(TRIANGLE_DEFAULT_FACTS))
+    # Same graph built from differently ordered input: served, not rendered.
+    assert fpg(sorted(TRIANGLE_DEFAULT_FACTS, reverse=True)) == first
+    assert len(renders) == 1 and (cache.hits, cache.misses) == (1, 1)
+    assert first.parent.parent == cache.root and first.suffix == ".svg"
+    assert not (tmp_path / "ignored").exists()
+
+    # Other facts change node roles, hence the key.
+    second = fpg(set(TRIANGLE_DEFAULT_FACTS) | {"ma"})
+    assert second != first and len(renders) == 2
+    # The store is bounded by size: the least recently used render goes.
+    graphs.render_rpg(rules, output=tmp_path / "forward_rpg.svg", cache=cache)
+    assert cache.bytes <= cache.max_bytes and cache.evictions >= 1
+    assert not first.exists()
+    assert not [p for p in cache.root.rglob(".*")]
+
+    # A fresh cache over the same directory picks the renders up again.
+    reopened = RenderCache(cache.root, max_bytes=1500)
+    assert len(reopened) == len(cache) and reopened.bytes == cache.bytes
+
+
+def test_svg_renderer_draws_layered_graph_without_graphviz(tmp_path):
+    import xml.etree.ElementTree as ET
+
+    from inference_lab import graphs
+
+    rules = list(_triangle_kb().compile().rules)
+    graph = graphs.build_fpg_graph(
+        rules, TRIANGLE_DEFAULT_FACTS, TRIANGLE_DEFAULT_GOALS, given_facts=TRIANGLE_DEFAULT_FACTS
+    )
+    output = graphs.render_graph(
+        graph, tmp_path / "fpg.svg", renderer="svg", highlight_nodes={"a", "b"}
+    )
+    assert output == tmp_path / "fpg.svg"
+    assert graphs.render_graph(graph, tmp_path / "fpg.png", renderer="svg") is None
+
+    ns = {"svg": "http://www.w3.org/2000/svg"}
+    root = ET.parse(output).getroot()
+    circles = {
+        node.find("svg:title", ns).text: node.find("svg:circle", ns)
+        for node in root.iterfind(".//svg:g[@class='node']", ns)
+    }
+    assert set(circles) == set(graph.nodes)
+    assert len(root.findall(".//svg:g[@class='edge']", ns)) == graph.number_of_edges()
+    assert circles["a"].get("fill") == "#dbeafe" and circles["r"].get("fill") == "#f8fafc"
+
+    # Left to right by level, and no two nodes of a level overlap.
+    levels = graphs.graph_levels(graph)
+    centre = {
+        node: (float(c.get("cx")), float(c.get("cy"))) for node, c in circles.items()
+    }
+    for source, target in graph.edges:
+        assert centre[source][0] < centre[target][0]
+    for first, second in itertools.combinations(graph.nodes, 2):
+        if levels[first] == levels[second]:
+            assert abs(centre[first][1] - centre[second][1]) >= 0.7 * 72
+
+    rpg = graphs.render_rpg(rules, output=tmp_path / "rpg.svg", renderer="svg")
+    assert ET.parse(rpg).getroot().find(".//svg:rect[@rx]", ns) is not None
+
+
+def test_graph_levels_layer_condensation_in_linear_time(tmp_path):
+    import networkx as nx
+
+    from inference_lab import graphs
+
+    rnd = random.Random(5)
+    for _ in range(20):
+        dag = nx.DiGraph()
+        dag.add_nodes_from(range(25))
+        dag.add_edges_from(
+            (i, j) for i in range(25) for j in range(i + 1, 25) if rnd.random() < 0.15
+        )
+        levels = graphs.graph_levels(dag)
+        for node in dag:
+            longest = max(
+                (levels[p] + 1 for p in dag.predecessors(node)), default=0
+            )
+            assert levels[node] == longest
+        assert all(data["level"] == levels[n] for n, data in dag.nodes(data=True))
+
+    # A cycle shares one layer; edges leaving it still go down a layer.
+    cyclic = nx.DiGraph([("s", "a"), ("a", "b"), ("b", "a"), ("b", "c"), ("s", "x"), ("x", "c")])
+    assert graphs.graph_levels(cyclic) == {"s": 0, "a": 1, "b": 1, "x": 1, "c": 2}
+    assert graphs.render_graph(cyclic, tmp_path / "cycle.svg", renderer="svg").exists()
+
+    # Shortcuts to every node of a chain: quadratic for a label-correcting
+    # search, one pass here.
+    staircase = nx.DiGraph()
+    for i in range(20000):
+        staircase.add_edge(i, i + 1)
+        staircase.add_edge(0, i + 1)
+    assert graphs.graph_levels(staircase)[20000] == 20000
+
+    # Stored levels are reused until refreshed; closing the chain into a
+    # cycle then puts all of it on one layer.
+    staircase.add_edge(20000, 1)
+    assert graphs.graph_levels(staircase)[20000] == 20000
+    assert graphs.graph_levels(staircase, refresh=True)[20000] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-v", __file__]))
@@ -7,6 +7,8 @@ available for downstream UI rendering.
 
 from __future__ import annotations
 
+import random
+import statistics
 from pathlib import Path
 from typing import Dict, Iterable, Optional, Sequence, Tuple
 
@@ -249,5 +251,407 @@ def test_recommendations_remain_structured(
         assert marker in recommendation, f"Marker {marker} absent for {disease}"
 
 
+def test_rules_by_module_returns_each_module_rule(
+    sinusitis_kb: MedicalKnowledgeBase,
+) -> None:
+    """Rules sharing a conclusion must not be conflated across modules."""
+
+    rows = sinusitis_kb.data["rules"]
+    for module in {row["module"] for row in rows}:
+        rules = sinusitis_kb.get_rules_by_module(module)
+        expected = [row for row in rows if row["module"] == module]
+        assert [sinusitis_kb.get_rule_info(rule.id)["json_id"] for rule in rules] == [
+            row["id"] for row in expected
+        ]
+        assert [list(rule.premises) for rule in rules] == [
+            row["premises"] for row in expected
+        ]
+    assert sinusitis_kb.get_rules_by_module("UNKNOWN") == []
+    assert sinusitis_kb.get_symptom_label("khong_co") == "Khong Co"
+
+
+def test_compiled_kb_file_matches_json(tmp_path: Path) -> None:
+    """The mmap-loaded .kbc file must answer exactly like the JSON source."""
+
+    from medical_kb.compile_kb import compile_kb
+
+    source = tmp_path / "sinusitis_kb.json"
+    source.write_bytes(Path("data/sinusitis_kb.json").read_bytes())
+    from_json = MedicalKnowledgeBase(kb_path=str(source))
+    compiled_file = compile_kb(source)
+    mapped = MedicalKnowledgeBase(kb_path=str(source))
+
+    assert from_json.compiled_path is None
+    assert mapped.compiled_path == compiled_file
+    assert list(mapped.kb.iter_rules()) == list(from_json.kb.iter_rules())
+    assert list(mapped.data["rules"]) == from_json.data["rules"]
+    assert mapped.get_diseases() == from_json.get_diseases()
+    for rule in from_json.kb.iter_rules():
+        assert mapped.get_rule_info(rule.id) == from_json.get_rule_info(rule.id)
+    for module in ("ACUTE_DIAGNOSIS", "UNKNOWN"):
+        assert mapped.get_rules_by_module(module) == from_json.get_rules_by_module(module)
+    for param in SCENARIOS:
+        scenario = param.values[0]
+        expected = _infer_diagnosis(from_json, scenario["answers"])
+        actual = _infer_diagnosis(mapped, scenario["answers"])
+        assert list(actual[0]) == list(expected[0])
+
+    # Editing the JSON makes the compiled file stale; it is then ignored.
+    source.write_text(source.read_text(encoding="utf-8") + "\n", encoding="utf-8")
+    assert MedicalKnowledgeBase(kb_path=str(source)).compiled_path is None
+
+
+def test_damaged_compiled_kb_falls_back_to_json(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A .kbc whose header is intact but whose body is not loads the JSON."""
+
+    import mmap
+
+    from medical_kb import binary
+    from medical_kb.binary import CompiledKBError, load_compiled_kb
+    from medical_kb.compile_kb import compile_kb
+
+    mappings = []
+
+    class TrackedMap(mmap.mmap):
+        def __init__(self, *args, **kwargs) -> None:
+            mappings.append(self)
+
+    monkeypatch.setattr(binary.mmap, "mmap", TrackedMap)
+
+    source = tmp_path / "sinusitis_kb.json"
+    source.write_bytes(Path("data/sinusitis_kb.json").read_bytes())
+    compiled_file = compile_kb(source)
+    payload = compiled_file.read_bytes()
+    # Header and section table survive; the section bodies do not.
+    compiled_file.write_bytes(payload[:1024] + b"\xff" * (len(payload) - 1024))
+
+    with pytest.raises(CompiledKBError):
+        load_compiled_kb(compiled_file)
+    kb = MedicalKnowledgeBase(kb_path=str(source))
+    assert kb.compiled_path is None
+    reference = MedicalKnowledgeBase(kb_path=str(source), use_compiled=False)
+    assert list(kb.kb.iter_rules()) == list(reference.kb.iter_rules())
+    # Without a JSON to fall back on the error is still reported.
+    with pytest.raises(CompiledKBError):
+        MedicalKnowledgeBase(kb_path=str(compiled_file))
+    # Failed loads unmap the file instead of leaking the mapping.
+    assert mappings and all(mapping.closed for mapping in mappings)
+
+
+def test_fact_rule_conditions_follow_and_or_precedence(
+    sinusitis_kb: MedicalKnowledgeBase,
+) -> None:
+    from medical_kb.conditions import compile_condition
+
+    mixed = compile_condition("a === true || b === true && c === true")
+    assert mixed({"a": True})
+    assert not mixed({"b": True})
+    assert mixed({"b": "true", "c": True})
+    assert compile_condition("(a || b) && c")({"b": 1, "c": 1})
+    assert compile_condition("nhiet_do > 38")({"nhiet_do": "38.5"})
+    assert not compile_condition("nhiet_do > 38")({"nhiet_do": None})
+
+    # Each sinus area alone is enough for facial pain (an OR of three tests).
+    for area in ("dau_vung_xoang_ham", "dau_vung_xoang_tran", "dau_vung_xoang_sang"):
+        assert "dau_nang_mat" in extract_facts_from_form({area: True}, sinusitis_kb)
+    assert "dau_nang_mat" not in extract_facts_from_form({}, sinusitis_kb)
+
+
+def test_batch_fact_extraction_matches_per_form(sinusitis_kb: MedicalKnowledgeBase) -> None:
+    np = pytest.importorskip("numpy")
+    import random
+
+    from inference_lab.batch import run_forward_batch
+    from medical_kb.batch import extract_facts_batch
+
+    rnd = random.Random(5)
+    variables = [symptom["variable"] for symptom in sinusitis_kb.data["symptoms"]]
+    rows = []
+    for _ in range(300):
+        row: Dict[str, object] = {
+            name: rnd.choice([True, False, "true", "false", 1, 0, None, "x", [1]])
+            for name in rnd.sample(variables, rnd.randint(0, 6))
+        }
+        for name, choices in (
+            ("thoi_gian_trieu_chung", [3, 10, "12", 84, 90.5, None, "abc"]),
+            ("nhiet_do", [37, 38, 38.5, "39.2", 40, None]),
+            ("loai_dich_mui", ["trong", "đặc vàng", "không có", "Xanh", "", None]),
+        ):
+            if rnd.random() < 0.7:
+                row[name] = rnd.choice(choices)
+        rows.append(row)
+
+    batch = extract_facts_batch(rows, sinusitis_kb)
+    expected = [extract_facts_from_form(row, sinusitis_kb) for row in rows]
+    assert [batch.fact_set(i) for i in range(len(rows))] == expected
+    assert batch.matrix.shape == (len(rows), len(sinusitis_kb.compiled.atoms))
+
+    forward = batch.run_forward()
+    reference = run_forward_batch(sinusitis_kb.compiled, expected)
+    assert [r.final_facts for r in forward] == [r.final_facts for r in reference]
+
+    # Column arrays give the same facts as the equivalent answer dicts.
+    columns = {
+        "nhiet_do": np.array([37.0, 38.5, 39.5, 40.0]),
+        "thoi_gian_trieu_chung": np.array([5, 10, 84, 100]),
+        "dau_vung_xoang_tran": np.array([False, True, False, True]),
+        "loai_dich_mui": ["trong", "vàng", "không", "trong"],
+    }
+    by_column = extract_facts_batch(columns, sinusitis_kb)
+    for i in range(4):
+        row = {name: values[i] for name, values in columns.items()}
+        row = {k: v.item() if hasattr(v, "item") else v for k, v in row.items()}
+        assert by_column.fact_set(i) == extract_facts_from_form(row, sinusitis_kb)
+
+
+def test_interview_state_applies_answers_incrementally(
+    sinusitis_kb: MedicalKnowledgeBase,
+) -> None:
+    import random
+
+    from medical_kb.interview import InterviewSessionStore, InterviewState
+
+    rnd = random.Random(9)
+    variables = [symptom["variable"] for symptom in sinusitis_kb.data["symptoms"]]
+    choices = {
+        "thoi_gian_trieu_chung": [3, 10, "12", 90],
+        "nhiet_do": [37, 38.5, 40],
+        "loai_dich_mui": ["Trong, loãng", "Đặc, vàng/xanh", "Không có"],
+    }
+    names = variables + list(choices)
+    rebuilds = 0
+    for _ in range(40):
+        state = InterviewState(sinusitis_kb)
+        answers: Dict[str, object] = {}
+        for _ in range(12):
+            name = rnd.choice(names)
+            answers[name] = rnd.choice(choices.get(name, [True, False]))
+            state.apply({name: answers[name]})
+            facts = extract_facts_from_form(answers, sinusitis_kb)
+            closure = run_forward_inference(
+                sinusitis_kb.compiled,
+                goals=["__unreachable__"],
+                initial_facts=facts,
+                trace="none",
+            )
+            assert state.facts == facts
+            assert state.final_facts == set(closure.final_facts)
+        rebuilds += state.rebuilds
+    # Withdrawn facts (e.g. a changed duration) take the rebuild path.
+    assert rebuilds > 0
+
+    store = InterviewSessionStore(ttl=60, max_sessions=2)
+    first, _ = store.create(sinusitis_kb)
+    second, state = store.create(sinusitis_kb, {"nghet_mui": True})
+    assert "nghet_mui" in state.facts and store.get(first) is not None
+    store.create(sinusitis_kb)
+    assert store.get(second) is None  # least recently used is evicted
+    store.ttl = 0
+    assert store.get(first) is None
+
+
+@pytest.mark.parametrize(
+    "condition", ["a &&", "nhiet_do > cao", "(a || b", "a b", "", "a === ||"]
+)
+def test_malformed_fact_rule_fails_at_load(tmp_path: Path, condition: str) -> None:
+    import json
+
+    from medical_kb.conditions import ConditionSyntaxError
+
+    document = json.loads(Path("data/sinusitis_kb.json").read_text(encoding="utf-8"))
+    document["fact_rules"].append({"fact": "hong", "condition": condition})
+    source = tmp_path / "sinusitis_kb.json"
+    source.write_text(json.dumps(document, ensure_ascii=False), encoding="utf-8")
+    with pytest.raises(ConditionSyntaxError, match="hong"):
+        MedicalKnowledgeBase(kb_path=str(source))
+
+
+def test_registry_reloads_changed_kb_in_background(tmp_path: Path) -> None:
+    import json
+
+    from medical_kb import KBRegistry
+
+    source = tmp_path / "sinusitis_kb.json"
+    source.write_bytes(Path("data/sinusitis_kb.json").read_bytes())
+    registry = KBRegistry(source, check_interval=0.0)
+    first = registry.get()
+    assert registry.status()["version"] == 1
+
+    # Touching the file without changing it does not rebuild.
+    source.write_bytes(source.read_bytes())
+    registry.get()
+    registry.reload(wait=True)
+    assert registry.get() is first
+
+    document = json.loads(source.read_text(encoding="utf-8"))
+    document["rules"] = document["rules"][:-1]
+    source.write_text(json.dumps(document, ensure_ascii=False), encoding="utf-8")
+    registry.reload(wait=True)
+    second = registry.get()
+    status = registry.status()
+    assert second is not first
+    assert len(second.compiled) == len(first.compiled) - 1
+    assert status["version"] == 2 and status["reloads"] == 1
+    assert status["load"]["rules"] == len(second.compiled)
+    # The instance an in-flight request holds is left untouched.
+    assert len(first.compiled) == len(document["rules"]) + 1
+
+    # A broken file keeps the last good version and reports the error.
+    source.write_text("{ not json", encoding="utf-8")
+    registry.reload(wait=True)
+    assert registry.get() is second
+    assert registry.status()["last_error"]
+
+
+def test_kb_admin_routes_require_configured_token() -> None:
+    from web import create_app
+
+    app = create_app()
+    app.config["KB_ADMIN_TOKEN"] = None
+    client = app.test_client()
+    assert client.get("/sinusitis/admin/kb").status_code == 404
+    assert client.post("/sinusitis/admin/kb/reload").status_code == 404
+
+    app.config["KB_ADMIN_TOKEN"] = "s3cret"
+    assert client.get("/sinusitis/admin/kb").status_code == 403
+    wrong = {"X-Admin-Token": "guess"}
+    assert client.post("/sinusitis/admin/kb/reload", headers=wrong).status_code == 403
+    reply = client.get("/sinusitis/admin/kb", headers={"X-Admin-Token": "s3cret"})
+    assert reply.status_code == 200 and reply.get_json()["kb"]["load"]
+
+
+def test_next_question_rejects_non_object_answers() -> None:
+    from web import create_app
+
+    client = create_app().test_client()
+    started = client.post("/sinusitis/api/next_question", json={"answers": {}}).get_json()
+    assert started["ok"], started
+    bad_bodies = [
+        [1, 2],
+        {"answers": ["sot"]},
+        {"interview_id": started["interview_id"], "delta": ["sot"]},
+        {"interview_id": [1]},
+        {"interview_id": {"a": 1}},
+    ]
+    for body in bad_bodies:
+        reply = client.post("/sinusitis/api/next_question", json=body)
+        assert reply.status_code == 400
+        assert reply.get_json()["ok"] is False
+
+
+def test_question_selector_asks_less_and_keeps_diagnosis(
+    sinusitis_kb: MedicalKnowledgeBase,
+) -> None:
+    from medical_kb.questions import QuestionIndex, QuestionSelector
+    from web.routes.medical_routes import INTERVIEW_QUESTIONS, TARGET_DIAGNOSES
+
+    index = QuestionIndex(sinusitis_kb, INTERVIEW_QUESTIONS, targets=TARGET_DIAGNOSES)
+    assert index.question_for_fact("chay_mui_dac")["variable"] == "loai_dich_mui"
+    assert index.question_for_fact("sot_rat_cao")["variable"] == "nhiet_do"
+
+    def diagnosis(answers: Dict[str, object]) -> str:
+        _, final_facts, _ = _infer_diagnosis(sinusitis_kb, answers)
+        return next((d for d in TARGET_DIAGNOSES if d in final_facts), "none")
+
+    rnd = random.Random(3)
+    asked = []
+    for _ in range(150):
+        truth: Dict[str, object] = {}
+        for question in INTERVIEW_QUESTIONS:
+            if question["type"] == "boolean":
+                truth[question["variable"]] = rnd.random() < 0.3
+            elif question["type"] == "radio":
+                truth[question["variable"]] = rnd.choice(question["options"])
+        truth["thoi_gian_trieu_chung"] = rnd.choice([3, 7, 15, 30, 100])
+        truth["nhiet_do"] = rnd.choice([36.8, 38.5, 39.5])
+
+        selector = QuestionSelector(index)
+        answers: Dict[str, object] = {}
+        while True:
+            facts = extract_facts_from_form(answers, sinusitis_kb)
+            question = selector.choose(answers, facts)
+            if question is None:
+                break
+            answers[question["variable"]] = truth[question["variable"]]
+        # Stopping early never changes the most urgent provable diagnosis.
+        assert diagnosis(answers) == diagnosis(truth)
+        asked.append(len(answers))
+    assert statistics.median(asked) < len(INTERVIEW_QUESTIONS) / 2
+
+
+def test_question_selector_keeps_derivations_through_cycles(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import json
+
+    from medical_kb import questions
+    from medical_kb.questions import QuestionIndex, QuestionSelector
+
+    rules = [("b", "a"), ("a", "b"), ("x", "a"), ("y", "b"), ("a", "T1"), ("b", "T2")]
+    document = {
+        "symptoms": [],
+        "diseases": [],
+        "fact_rules": [],
+        "recommendations": [],
+        "rules": [
+            {"id": f"R{i}", "module": "M", "premises": [premise], "conclusion": conclusion}
+            for i, (premise, conclusion) in enumerate(rules, 1)
+        ],
+    }
+    source = tmp_path / "cyclic_kb.json"
+    source.write_text(json.dumps(document), encoding="utf-8")
+    kb = MedicalKnowledgeBase(kb_path=str(source))
+    bank = [{"variable": "x", "type": "boolean"}, {"variable": "y", "type": "boolean"}]
+
+    def candidates(targets: Sequence[str], answers: Dict[str, object]) -> Sequence[str]:
+        selector = QuestionSelector(QuestionIndex(kb, bank, targets=targets))
+        selector.observe(answers, extract_facts_from_form(answers, kb))
+        return selector.candidates()
+
+    # Whichever target is expanded first, x still proves both after y=False.
+    for targets in (("T1", "T2"), ("T2", "T1")):
+        assert sorted(candidates(targets, {"y": False})) == ["T1", "T2"]
+    assert candidates(("T1", "T2"), {"x": False, "y": False}) == []
+
+    # A target whose derivations were truncated is never ruled out.
+    monkeypatch.setattr(questions, "MAX_DERIVATIONS", 1)
+    assert candidates(("T1", "T2"), {"x": False, "y": False}) == ["T1", "T2"]
+
+
+def test_interview_request_infers_each_answer_state_once(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from inference_lab.cache import InferenceCache
+    from web import create_app
+    from web.routes import medical_routes
+
+    cache = InferenceCache()
+    monkeypatch.setattr(medical_routes, "_inference_cache", lambda: cache)
+    # Without server-side sessions every request re-sends all answers.
+    monkeypatch.setattr(medical_routes, "InterviewSessionStore", None)
+    app = create_app()
+    app.config["GRAPH_OUTPUT_ROOT"] = str(tmp_path)
+    client = app.test_client()
+
+    answers = {
+        name: False for name in ("sung_quanh_mat", "nhin_mo", "dau_dau_du_doi", "cung_gay")
+    }
+    answers.update(thoi_gian_trieu_chung=5, loai_dich_mui="Không có")
+    requests = 0
+    while True:
+        reply = client.post("/sinusitis/api/next_question", json={"answers": answers})
+        payload = reply.get_json()
+        requests += 1
+        assert payload["ok"], payload
+        if payload["done"]:
+            break
+        answers[payload["question"]["variable"]] = False
+    # Every request looks its answer state up once, and each state is new.
+    assert cache.misses == requests and cache.hits == 0
+    assert (tmp_path / payload["result_url"].rsplit("/", 1)[-1] / "result.json").exists()
+
+
 if __name__ == "__main__":
     sys.exit(pytest.main(["-v", __file__]))
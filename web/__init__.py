@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import atexit
+import os
 from pathlib import Path
 
 from flask import Flask, render_template
@@ -68,7 +69,11 @@ def create_app() -> Flask:
     graph_root = static_dir / "generated"
     graph_root.mkdir(parents=True, exist_ok=True)
     app.config["GRAPH_OUTPUT_ROOT"] = graph_root
-    app.config.setdefault("GRAPH_MAX_HISTORY", 12)
+    # Rendered graphs are content-addressed under graph_root/cache and the
+    # least recently used are deleted past this size.
+    app.config.setdefault("GRAPH_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    # /sinusitis/admin/* stays disabled (404) unless a token is configured.
+    app.config.setdefault("KB_ADMIN_TOKEN", os.environ.get("KB_ADMIN_TOKEN"))
 
     # Register blueprints
     app.register_blueprint(lab_bp)
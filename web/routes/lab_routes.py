@@ -5,15 +5,24 @@ This blueprint provides the original inference lab interface where users can:
 - Test forward and backward chaining
 - View FPG and RPG graphs
 - Debug inference processes
+
+Graphs are rendered by a background ``GraphRenderPool`` (``GRAPH_ASYNC``,
+on by default): ``/api/infer`` answers as soon as inference is done, with a
+``graphJob`` the page polls at ``/api/graphs/<job_id>``. Rendered files are
+kept in a content-addressed ``RenderCache`` under ``GRAPH_OUTPUT_ROOT``, so
+repeating a query serves the stored SVGs instead of rendering again. The
+cache may evict a finished job's files; the job then reports ``expired``
+and the page has to run the query again.
 """
 
 from __future__ import annotations
 
+import atexit
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Tuple
-from uuid import uuid4
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 from flask import (
     Blueprint,
@@ -26,7 +35,15 @@ from flask import (
 
 from inference_lab.backward import run_backward_inference
 from inference_lab.forward import run_forward_inference
-from inference_lab.graphs import GRAPHVIZ_AVAILABLE
+from inference_lab.graph_jobs import GraphJob, GraphRenderPool
+from inference_lab.graphs import (
+    RenderTask,
+    backward_graph_tasks,
+    forward_graph_tasks,
+    graphviz_ready,
+    run_graph_tasks,
+)
+from inference_lab.render_cache import RenderCache
 from inference_lab.knowledge_base import KnowledgeBase
 from inference_lab.results import BackwardResult, ForwardResult, StepTrace
 from inference_lab.sample_data import (
@@ -44,6 +61,10 @@ lab_bp = Blueprint(
     url_prefix="/lab",
 )
 
+_graph_pool: Optional[GraphRenderPool] = None
+_graph_pool_lock = threading.Lock()
+_render_cache_lock = threading.Lock()
+
 
 @lab_bp.get("/")
 def index() -> str:
@@ -56,7 +77,7 @@ def index() -> str:
     return render_template(
         "index.html",
         sample=sample_payload,
-        graphviz_available=GRAPHVIZ_AVAILABLE,
+        graphviz_available=graphviz_ready(),
         current_year=datetime.now().year,
     )
 
@@ -70,29 +91,49 @@ def api_infer():
     except ValueError as exc:
         return jsonify({"ok": False, "error": str(exc)}), 400
 
-    session_id = uuid4().hex
-    output_root: Path = Path(current_app.config["GRAPH_OUTPUT_ROOT"])
-    output_dir = output_root / session_id
-    output_dir.mkdir(parents=True, exist_ok=True)
-
+    cache = _render_cache()
     try:
         if request_data["mode"] == "forward":
-            result = _handle_forward(request_data, output_dir)
+            result, tasks = _handle_forward(request_data, cache)
         else:
-            result = _handle_backward(request_data, output_dir)
+            result, tasks = _handle_backward(request_data, cache)
     except ValueError as exc:
         # domain validation from inference layer
-        _cleanup_dir(output_dir)
         return jsonify({"ok": False, "error": str(exc)}), 400
 
+    if current_app.config.get("GRAPH_ASYNC", True):
+        job = _graph_renderer().submit(tasks)
+        result["graphJob"] = _graph_job_ref(job)
+        if job is None:
+            result["graphNote"] = "Máy chủ đang bận vẽ đồ thị, vui lòng thử lại sau."
+    else:
+        result["graphs"] = _graph_urls(run_graph_tasks(tasks))
     response = {"ok": True, "mode": request_data["mode"], "result": result}
-
-    _cleanup_old_directories(
-        output_root, keep=current_app.config.get("GRAPH_MAX_HISTORY", 12)
-    )
     return jsonify(response)
 
 
+@lab_bp.get("/api/graphs/<job_id>")
+def api_graph_job(job_id: str):
+    """Status of a background render; graph URLs once it is done."""
+    job = _graph_renderer().get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Không tìm thấy tác vụ vẽ đồ thị."}), 404
+    payload: Dict[str, Any] = {"ok": True, "id": job.id, "status": job.status}
+    if job.status == "done":
+        if not all(path.exists() for path in job.files.values()):
+            # Evicted from the render cache since the job finished.
+            payload.update(
+                ok=False,
+                status="expired",
+                error="Đồ thị đã bị xoá khỏi bộ nhớ đệm, vui lòng chạy lại suy diễn.",
+            )
+            return jsonify(payload), 410
+        payload["graphs"] = _graph_urls(job.files)
+    elif job.error:
+        payload["error"] = job.error
+    return jsonify(payload)
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
@@ -145,7 +186,9 @@ def _build_kb(rules: Iterable[str], facts: Iterable[str]) -> KnowledgeBase:
     return kb
 
 
-def _handle_forward(request_data: Dict[str, Any], output_dir: Path) -> Dict[str, Any]:
+def _handle_forward(
+    request_data: Dict[str, Any], cache: RenderCache
+) -> Tuple[Dict[str, Any], Dict[str, RenderTask]]:
     options = request_data["options"]
     structure = (options.get("structure") or "stack").lower()
     index_mode = (options.get("index_mode") or "min").lower()
@@ -156,50 +199,108 @@ def _handle_forward(request_data: Dict[str, Any], output_dir: Path) -> Dict[str,
         goals=request_data["goals"],
         strategy=structure,
         index_mode=index_mode,
-        make_graphs=True,
-        output_dir=output_dir,
+        trace="delta",
+    )
+    compiled = kb.compile()
+    tasks = forward_graph_tasks(
+        list(compiled.rules),
+        known_facts=result.final_facts,
+        goal_facts=result.goals,
+        given_facts=compiled.facts,
+        output_dir=cache.root,
+        producers=compiled.rules_concluding,
+        cache=cache,
+        renderer=current_app.config.get("GRAPH_RENDERER", "auto"),
     )
-    return _serialize_forward_result(result, output_dir)
+    return _serialize_forward_result(result), tasks
 
 
-def _handle_backward(request_data: Dict[str, Any], output_dir: Path) -> Dict[str, Any]:
+def _handle_backward(
+    request_data: Dict[str, Any], cache: RenderCache
+) -> Tuple[Dict[str, Any], Dict[str, RenderTask]]:
     options = request_data["options"]
     index_mode = (options.get("index_mode") or "min").lower()
+    goal_mode = (options.get("goal_mode") or "sequential").lower()
 
     kb = _build_kb(request_data["rules"], request_data["facts"])
     result = run_backward_inference(
         kb,
         goals=request_data["goals"],
         index_mode=index_mode,
-        make_graph=True,
-        output_dir=output_dir,
+        goal_mode=goal_mode,
+        make_graph=False,
     )
-    return _serialize_backward_result(result, output_dir)
+    compiled = kb.compile()
+    tasks = backward_graph_tasks(
+        list(compiled.rules),
+        known_facts=result.final_known,
+        goal_facts=result.goals,
+        given_facts=compiled.facts,
+        output_dir=cache.root,
+        cache=cache,
+        renderer=current_app.config.get("GRAPH_RENDERER", "auto"),
+    )
+    return _serialize_backward_result(result), tasks
+
+
+def _render_cache() -> RenderCache:
+    """This app's render cache, under ``GRAPH_OUTPUT_ROOT/cache``."""
+    cache = current_app.extensions.get("graph_render_cache")
+    if cache is None:
+        with _render_cache_lock:
+            cache = current_app.extensions.get("graph_render_cache")
+            if cache is None:
+                cache = RenderCache(
+                    Path(current_app.config["GRAPH_OUTPUT_ROOT"]) / "cache",
+                    max_bytes=current_app.config.get("GRAPH_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+                )
+                current_app.extensions["graph_render_cache"] = cache
+    return cache
+
+
+def _graph_renderer() -> GraphRenderPool:
+    """The process-wide render pool, sized from the app config on first use."""
+    global _graph_pool
+    with _graph_pool_lock:
+        if _graph_pool is None:
+            _graph_pool = GraphRenderPool(
+                workers=current_app.config.get("GRAPH_RENDER_WORKERS", 2),
+                max_pending=current_app.config.get("GRAPH_RENDER_QUEUE", 16),
+            )
+            atexit.register(_graph_pool.shutdown)
+        return _graph_pool
+
+
+def _graph_job_ref(job: Optional[GraphJob]) -> Optional[Dict[str, str]]:
+    if job is None:
+        return None
+    return {
+        "id": job.id,
+        "status": job.status,
+        "statusUrl": url_for("lab.api_graph_job", job_id=job.id),
+    }
 
 
-def _serialize_forward_result(
-    result: ForwardResult, output_dir: Path
-) -> Dict[str, Any]:
+def _serialize_forward_result(result: ForwardResult) -> Dict[str, Any]:
     return {
         "success": result.success,
         "goals": result.goals,
         "finalFacts": result.final_facts,
         "firedRules": result.fired_rules,
         "history": [_trace_to_dict(trace) for trace in result.history],
-        "graphs": _graph_urls(result.graph_files, output_dir),
+        "graphs": {},
     }
 
 
-def _serialize_backward_result(
-    result: BackwardResult, output_dir: Path
-) -> Dict[str, Any]:
+def _serialize_backward_result(result: BackwardResult) -> Dict[str, Any]:
     return {
         "success": result.success,
         "goals": result.goals,
         "finalKnown": result.final_known,
         "usedRules": result.used_rules,
-        "steps": result.steps,
-        "graphs": _graph_urls(result.graph_files, output_dir),
+        "goalStatus": result.goal_status,
+        "steps": list(result.steps),
+        "graphs": {},
     }
 
 
@@ -215,7 +316,7 @@ def _trace_to_dict(trace: StepTrace) -> Dict[str, Any]:
     }
 
 
-def _graph_urls(graph_files: Dict[str, Path], output_dir: Path) -> Dict[str, str]:
+def _graph_urls(graph_files: Dict[str, Path]) -> Dict[str, str]:
     urls: Dict[str, str] = {}
     for key, path in graph_files.items():
         urls[key] = _static_url(path)
@@ -229,37 +330,3 @@ def _static_url(path: Path) -> str:
         # fallback: recompute from output directory
         relative = path
     return url_for("static", filename=str(relative).replace("\\", "/"))
-
-
-def _cleanup_dir(path: Path) -> None:
-    if not path.exists():
-        return
-    for child in path.iterdir():
-        try:
-            if child.is_file():
-                child.unlink()
-            else:
-                _cleanup_dir(child)
-        except OSError:
-            continue
-    try:
-        path.rmdir()
-    except OSError:
-        pass
-
-
-def _cleanup_old_directories(root: Path, *, keep: int = 10) -> None:
-    if keep <= 0:
-        keep = 1
-    if not root.exists():
-        return
-    entries: List[Tuple[float, Path]] = []
-    for child in root.iterdir():
-        if child.is_dir():
-            try:
-                entries.append((child.stat().st_mtime, child))
-            except OSError:
-                continue
-    entries.sort(reverse=True)
-    for _, folder in entries[keep:]:
-        _cleanup_dir(folder)
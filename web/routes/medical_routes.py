@@ -9,32 +9,44 @@ This blueprint provides a user-friendly medical diagnosis system where users can
 
 from __future__ import annotations
 
+import hmac
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Set
 from uuid import uuid4
+from weakref import WeakKeyDictionary
 
 from flask import (
     Blueprint,
     current_app,
+    g,
+    has_app_context,
     jsonify,
     render_template,
     request,
     url_for,
 )
 
-from inference_lab.forward import run_forward_inference
+from inference_lab.cache import get_inference_cache
+from inference_lab.utils import normalize_atom
 
 # Import Smart Diagnosis Scorer
 # from web.diagnosis_scorer import SmartDiagnosisScorer - BỎ TÍNH NĂNG TÍNH ĐIỂM
 
 # Import Medical KB
 try:
-    from medical_kb import MedicalKnowledgeBase, extract_facts_from_form
+    from medical_kb import MedicalKnowledgeBase, extract_facts_from_form, get_registry
+    from medical_kb.interview import InterviewSessionStore
+    from medical_kb.questions import QuestionIndex, QuestionSelector
 except ImportError:
     MedicalKnowledgeBase = None
     extract_facts_from_form = None
+    get_registry = None
+    InterviewSessionStore = None
+    QuestionIndex = None
+    QuestionSelector = None
 
 
 # Create blueprint
@@ -48,21 +60,82 @@ medical_bp = Blueprint(
 )
 
 
-# Global KB instance (loaded once)
-_sinusitis_kb = None
+SINUSITIS_KB_PATH = Path("data/sinusitis_kb.json")
+
+
+def _sinusitis_registry() -> Any:
+    if get_registry is None:
+        raise RuntimeError(
+            "Medical KB not available. Please ensure medical_kb module is installed."
+        )
+    return get_registry(SINUSITIS_KB_PATH)
 
 
 def get_sinusitis_kb() -> Any:
-    """Get or create Sinusitis KB instance."""
-    global _sinusitis_kb
-    if _sinusitis_kb is None:
-        if MedicalKnowledgeBase is None:
-            raise RuntimeError(
-                "Medical KB not available. Please ensure medical_kb module is installed."
-            )
-        # TẢI KB MỚI (chấp nhận kb_path hoặc json_path)
-        _sinusitis_kb = MedicalKnowledgeBase(kb_path="data/sinusitis_kb.json")
-    return _sinusitis_kb
+    """Get the active Sinusitis KB, pinned for the rest of the request.
+
+    The registry reloads the JSON in the background when it changes; a
+    request that already holds a version keeps it until it finishes.
+    """
+    if has_app_context() and "sinusitis_kb" in g:
+        return g.sinusitis_kb
+    kb = _sinusitis_registry().get()
+    if has_app_context():
+        g.sinusitis_kb = kb
+    return kb
+
+
+def _inference_cache() -> Any:
+    """Process-wide inference result cache (sized by the app config)."""
+    return get_inference_cache(
+        max_entries=current_app.config.get("INFERENCE_CACHE_SIZE", 1024),
+        ttl=current_app.config.get("INFERENCE_CACHE_TTL", 600),
+    )
+
+
+def _admin_denied() -> Optional[Any]:
+    """Refuse admin calls unless ``KB_ADMIN_TOKEN`` is set and sent.
+
+    Without a configured token the endpoints answer 404 as if they did not
+    exist; callers pass the token in the ``X-Admin-Token`` header.
+    """
+    token = current_app.config.get("KB_ADMIN_TOKEN")
+    if not token:
+        return jsonify({"ok": False, "error": "Không tìm thấy."}), 404
+    sent = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(sent.encode("utf-8"), str(token).encode("utf-8")):
+        return jsonify({"ok": False, "error": "Sai mã quản trị."}), 403
+    return None
+
+
+@medical_bp.get("/admin/kb")
+def admin_kb_status():
+    """Report the loaded KB version, load time, reload and cache state."""
+    denied = _admin_denied()
+    if denied is not None:
+        return denied
+    try:
+        registry = _sinusitis_registry()
+        registry.get()
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify(
+        {"ok": True, "kb": registry.status(), "inference_cache": _inference_cache().stats()}
+    )
+
+
+@medical_bp.post("/admin/kb/reload")
+def admin_kb_reload():
+    """Rebuild the KB now (``?wait=1`` blocks until the swap is done)."""
+    denied = _admin_denied()
+    if denied is not None:
+        return denied
+    try:
+        registry = _sinusitis_registry()
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    started = registry.reload(wait=request.args.get("wait") in ("1", "true"))
+    return jsonify({"ok": True, "started": started, "kb": registry.status()})
 
 
 # ---------------------------------------------------------------------------
@@ -210,148 +283,156 @@ def _choose_next_question(current_answers: Dict[str, Any]) -> Dict[str, Any] | N
     return None
 
 
-def _get_question_for_fact(fact: str) -> Dict[str, Any] | None:
-    """Map an inferred/required fact to a concrete question definition."""
-    # Direct one-to-one mapping when variable == fact
-    for q in INTERVIEW_QUESTIONS:
-        if q["variable"] == fact:
-            return q
+# Derived fact → source question mapping
+DERIVED_QUESTION_MAP: Dict[str, str] = {
+    # Time-derived facts
+    "trieu_chung_duoi_10_ngay": "thoi_gian_trieu_chung",
+    "trieu_chung_tren_10_ngay": "thoi_gian_trieu_chung",
+    "trieu_chung_keo_dai_12_tuan": "thoi_gian_trieu_chung",
+    # Nasal discharge to radio
+    "chay_mui_trong": "loai_dich_mui",
+    "chay_mui_dac": "loai_dich_mui",
+    # Face pain aggregates → ask a concrete site first
+    "dau_nang_mat": "dau_vung_xoang_ham",
+    "co_bang_chung_thoi_gian_cap": "thoi_gian_trieu_chung",
+    "co_bang_chung_dich_cap": "loai_dich_mui",
+    "dieu_kien_cap_day_du": "loai_dich_mui",
+}
+
+_QUESTIONS_BY_VARIABLE: Dict[str, Dict[str, Any]] = {}
+for _q in INTERVIEW_QUESTIONS:
+    _QUESTIONS_BY_VARIABLE.setdefault(_q["variable"], _q)
+
+# Diagnoses the interview tries to settle, most urgent first
+TARGET_DIAGNOSES = (
+    "nguy_co_bien_chung",
+    "viem_xoang_do_nam",
+    "viem_xoang_cap_do_vi_khuan",
+    "viem_xoang_tai_phat",
+    "viem_xoang_man_tinh",
+    "viem_xoang_cap_do_virus",
+    "viem_xoang_cap",
+)
+# Order in which an inferred diagnosis is reported (the negative one last)
+DIAGNOSIS_PRIORITY = TARGET_DIAGNOSES + ("khong_phai_viem_xoang",)
 
-    # Derived fact → source question mapping
-    derived_map = {
-        # Time-derived facts
-        "trieu_chung_duoi_10_ngay": "thoi_gian_trieu_chung",
-        "trieu_chung_tren_10_ngay": "thoi_gian_trieu_chung",
-        "trieu_chung_keo_dai_12_tuan": "thoi_gian_trieu_chung",
-        # Nasal discharge to radio
-        "chay_mui_trong": "loai_dich_mui",
-        "chay_mui_dac": "loai_dich_mui",
-        # Face pain aggregates → ask a concrete site first
-        "dau_nang_mat": "dau_vung_xoang_ham",
-        "co_bang_chung_thoi_gian_cap": "thoi_gian_trieu_chung",
-        "co_bang_chung_dich_cap": "loai_dich_mui",
-        "dieu_kien_cap_day_du": "loai_dich_mui",
-    }
-    var = derived_map.get(fact)
-    if var:
-        for q in INTERVIEW_QUESTIONS:
-            if q["variable"] == var:
-                return q
-    return None
+
+# One QuestionIndex per loaded KB object (a reload builds a new one)
+_question_indexes: "WeakKeyDictionary[Any, Any]" = WeakKeyDictionary()
+_question_indexes_lock = threading.Lock()
+
+
+def _question_index(kb: Any) -> Any:
+    # Held while building so concurrent first requests share one index.
+    with _question_indexes_lock:
+        index = _question_indexes.get(kb)
+        if index is None:
+            index = _question_indexes[kb] = QuestionIndex(
+                kb,
+                INTERVIEW_QUESTIONS,
+                targets=TARGET_DIAGNOSES,
+                derived=DERIVED_QUESTION_MAP,
+            )
+        return index
+
+
+def _question_selector(kb: Any, state: Any = None) -> Any:
+    """The interview's question selector (a fresh one without a session)."""
+    if QuestionSelector is None:
+        return None
+    if state is not None:
+        if state.selector is None:
+            state.selector = QuestionSelector(_question_index(state.kb))
+        return state.selector
+    return QuestionSelector(_question_index(kb))
 
 
 def _choose_next_question_dynamic(
-    kb: Any, answers: Dict[str, Any]
+    kb: Any,
+    answers: Dict[str, Any],
+    known_facts: Set[str] | None = None,
+    selector: Any = None,
 ) -> Dict[str, Any] | None:
     """Chọn câu hỏi tiếp theo theo kiểu 'ít nhưng trúng'.
 
     Chiến lược:
-    - Luôn ưu tiên phát hiện sớm red flags và các chẩn đoán nguy hiểm.
-    - Chỉ hỏi những fact còn thiếu của các luật đang 'gần được kích hoạt' (partially satisfied).
-    - Bỏ qua các câu hỏi không còn ảnh hưởng đến chẩn đoán ưu tiên.
-    - Nếu KB không gợi ý được gì thêm, fallback sang danh sách tĩnh tối giản.
+    - Các chẩn đoán mục tiêu được khai triển sẵn (một lần cho mỗi KB) thành
+      các tổ hợp facts trả lời được; câu trả lời bác bỏ fact nào thì loại
+      các tổ hợp chứa fact đó.
+    - Chọn câu hỏi có information gain lớn nhất trên các chẩn đoán còn khả
+      năng (xem ``medical_kb.questions``).
+    - Trả về None khi không câu hỏi nào còn ảnh hưởng đến chẩn đoán.
+    - Không có bộ chọn (thiếu medical_kb) thì fallback sang danh sách tĩnh.
     """
-    # Bước 1: nếu chưa có câu nào -> hỏi thời gian (trục phân loại chính)
-    if not answers:
-        for q in INTERVIEW_QUESTIONS:
-            if q.get("variable") == "thoi_gian_trieu_chung":
-                return q
-
     if extract_facts_from_form is None:
         return _choose_next_question(current_answers=answers)
+    if selector is None:
+        selector = _question_selector(kb)
+        if selector is None:
+            return _choose_next_question(current_answers=answers)
 
-    # Bước 2: tính các facts đã biết từ câu trả lời hiện tại
-    try:
-        known_facts = set(extract_facts_from_form(answers, kb))
-    except Exception:
-        known_facts = set()
-
-    # Mục tiêu chẩn đoán cần quan tâm
-    target_conclusions = {
-        "nguy_co_bien_chung",
-        "viem_xoang_do_nam",
-        "viem_xoang_cap_do_vi_khuan",
-        "viem_xoang_tai_phat",
-        "viem_xoang_man_tinh",
-        "viem_xoang_cap_do_virus",
-        "viem_xoang_cap",
-    }
+    # Facts đã biết (phiên phỏng vấn giữ sẵn, chỉ tính lại khi gọi không có phiên)
+    if known_facts is None:
+        try:
+            known_facts = set(extract_facts_from_form(answers, kb))
+        except Exception:
+            known_facts = set()
+    return selector.choose(answers, known_facts)
+
+
+def _interview_inference(kb: Any, facts: Any) -> Any:
+    """Forward inference over an interview's facts, at most once per request.
+
+    Early stop, finalization and the stored result all read the same
+    result; the memo lives in ``g`` and is keyed by the normalized facts.
+    Across requests, answers seen before are served by the inference cache.
+    """
+    key = (id(kb), frozenset(filter(None, map(normalize_atom, facts))))
+    memo = g.setdefault("interview_inference", {}) if has_app_context() else {}
+    result = memo.get(key)
+    if result is None:
+        result = memo[key] = _inference_cache().forward(
+            kb.compiled,
+            initial_facts=facts,
+            goals=[d["variable"] for d in kb.get_diseases()],
+            strategy="stack",
+            index_mode="min",
+            trace="none",
+        )
+    return result
 
-    # Bước 3: duyệt rules để tìm những premises còn thiếu nhưng quan trọng
-    missing_facts: Dict[str, int] = {}
-    for rule in kb.data.get("rules", []):
-        conclusion = rule.get("conclusion")
-        if conclusion not in target_conclusions:
-            # Không dùng các rule ngoài mục tiêu chính để quyết định câu hỏi
-            continue
-
-        premises = set(rule.get("premises", []))
-        if not premises:
-            continue
-
-        missing = premises - known_facts
-
-        # Chỉ quan tâm:
-        # - ĐÃ có ít nhất 1 tiền đề đúng (rule đang "gần bắn")
-        # - CÒN thiếu nhưng không phải thiếu toàn bộ
-        if 0 < len(missing) < len(premises):
-            for fact in missing:
-                missing_facts[fact] = missing_facts.get(fact, 0) + 1
-
-    # Bước 4: nếu có các fact thiếu quan trọng -> chọn fact xuất hiện nhiều nhất
-    if missing_facts:
-        # Lấy fact có tần suất cao nhất (ảnh hưởng nhiều rule nhất)
-        fact = max(missing_facts.items(), key=lambda kv: kv[1])[0]
-        q = _get_question_for_fact(fact)
-        if q:
-            # Chỉ hỏi nếu user chưa trả lời biến này
-            if q["variable"] not in answers or answers.get(q["variable"]) in (None, ""):
-                # Đảm bảo có options cho radio nếu cần
-                if q.get("type") == "radio" and "options" not in q:
-                    q = {**q, "options": ["Không có", "Trong, loãng", "Đặc, vàng/xanh"]}
-                return q
-
-    # Bước 5: nếu không còn fact quan trọng cần hỏi:
-    # dùng fallback tối giản (theo thứ tự đã được rút gọn trong INTERVIEW_QUESTIONS)
-    return _choose_next_question(current_answers=answers)
-
-
-def _try_early_stop(kb: Any, answers: Dict[str, Any]) -> Dict[str, Any] | None:
+
+def _try_early_stop(
+    kb: Any,
+    answers: Dict[str, Any],
+    state: Any = None,
+    selector: Any = None,
+    facts: Set[str] | None = None,
+) -> Dict[str, Any] | None:
     """Run inference with current answers; if a prioritized diagnosis is determined, return result payload.
 
+    With an interview ``state`` the diagnosis is read from its incrementally
+    maintained closure, and the traced inference for the stored result only
+    runs once a diagnosis is reached. With a question ``selector`` the
+    interview goes on while a more urgent diagnosis can still be proven.
+    ``facts`` are the extracted facts when the caller already has them.
+
     Returns None if more information should be asked.
     """
     if extract_facts_from_form is None:
         return None
 
     try:
-        facts = extract_facts_from_form(answers, kb)
-        goals = [d["variable"] for d in kb.get_diseases()]
-        result = run_forward_inference(
-            kb.kb,
-            initial_facts=facts,
-            goals=goals,
-            strategy="stack",
-            index_mode="min",
-            make_graphs=False,
-        )
+        if state is not None:
+            facts = state.facts
+            final_facts = state.final_facts
+        else:
+            if facts is None:
+                facts = extract_facts_from_form(answers, kb)
+            final_facts = _interview_inference(kb, facts).final_facts
 
         # Determine diagnosis only if any disease fact was actually inferred
-        priority_order = [
-            "nguy_co_bien_chung",
-            "viem_xoang_do_nam",
-            "viem_xoang_cap_do_vi_khuan",
-            "viem_xoang_tai_phat",
-            "viem_xoang_man_tinh",
-            "viem_xoang_cap_do_virus",
-            "viem_xoang_cap",
-            "khong_phai_viem_xoang",
-        ]
-        diagnosed: str | None = None
-        for disease in priority_order:
-            if disease in result.final_facts:
-                diagnosed = disease
-                break
+        diagnosed = next((d for d in DIAGNOSIS_PRIORITY if d in final_facts), None)
 
         # If nothing inferred yet, or only negative conclusion, keep asking
         if diagnosed is None or diagnosed == "khong_phai_viem_xoang":
@@ -362,65 +443,75 @@ def _try_early_stop(kb: Any, answers: Dict[str, Any]) -> Dict[str, Any] | None:
             if "thoi_gian_trieu_chung" not in answers or "loai_dich_mui" not in answers:
                 return None
 
-        # Build and persist a full result to reuse existing results page
-        disease_info = kb.get_disease_info(diagnosed)
-        recommendation = kb.get_recommendation(diagnosed)
-        severity_map = {
-            "Mild": "low",
-            "Moderate": "medium",
-            "Severe": "high",
-            "Critical": "critical",
-            "Info": "info",
-        }
-        disease_label = (
-            disease_info.get("label", "Không xác định") if disease_info else diagnosed
-        )
-        severity_raw = (
-            disease_info.get("severity", "Unknown") if disease_info else "Unknown"
-        )
-        severity = severity_map.get(severity_raw, "low")
+        # Keep asking while a more urgent diagnosis is still possible
+        if selector is not None and diagnosed in TARGET_DIAGNOSES:
+            selector.observe(answers, set(facts))
+            rank = TARGET_DIAGNOSES.index(diagnosed)
+            if any(TARGET_DIAGNOSES.index(d) < rank for d in selector.candidates()):
+                return None
 
-        session_id = uuid4().hex
-        output_root = Path(
-            current_app.config.get("GRAPH_OUTPUT_ROOT", "web/static/generated")
-        )
-        output_dir = output_root / session_id
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        response = {
-            "ok": True,
-            "session_id": session_id,
-            "diagnosis": {
-                "disease": diagnosed,
-                "disease_label": disease_label,
-                "severity": severity,
-                "severity_raw": severity_raw,
-                "confidence": 100 if result.success else 0,
-                "success": result.success,
-            },
-            "symptoms": {"input": answers, "extracted_facts": list(facts)},
-            "recommendation": recommendation,
-            "inference": {
-                "fired_rules": result.fired_rules,
-                "final_facts": result.final_facts,
-                "steps": len(result.history),
-            },
-            "graphs": {"fpg": None, "rpg": None},
-        }
-        _save_result(session_id, response)
-        return {
-            "done": True,
-            "result_url": url_for("medical.results", session_id=session_id),
-            "summary": {
-                "label": disease_label,
-                "severity": severity,
-            },
-        }
+        # Build and persist a full result to reuse existing results page
+        return _save_interview_result(kb, answers, facts, diagnosed)
 
     except Exception:
         return None
 
 
+def _save_interview_result(
+    kb: Any, answers: Dict[str, Any], facts: Set[str], diagnosed: str
+) -> Dict[str, Any]:
+    """Store the results-page payload for ``diagnosed``; returns the 'done' reply."""
+    result = _interview_inference(kb, facts)
+    disease_info = kb.get_disease_info(diagnosed)
+    recommendation = kb.get_recommendation(diagnosed)
+    severity_map = {
+        "Mild": "low",
+        "Moderate": "medium",
+        "Severe": "high",
+        "Critical": "critical",
+        "Info": "info",
+    }
+    disease_label = (
+        disease_info.get("label", "Không xác định") if disease_info else diagnosed
+    )
+    severity_raw = disease_info.get("severity", "Unknown") if disease_info else "Unknown"
+    severity = severity_map.get(severity_raw, "low")
+
+    session_id = uuid4().hex
+    output_root = Path(
+        current_app.config.get("GRAPH_OUTPUT_ROOT", "web/static/generated")
+    )
+    output_dir = output_root / session_id
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    response = {
+        "ok": True,
+        "session_id": session_id,
+        "diagnosis": {
+            "disease": diagnosed,
+            "disease_label": disease_label,
+            "severity": severity,
+            "severity_raw": severity_raw,
+            "confidence": 100 if result.success else 0,
+            "success": result.success,
+        },
+        "symptoms": {"input": answers, "extracted_facts": list(facts)},
+        "recommendation": recommendation,
+        "inference": {
+            "fired_rules": result.fired_rules,
+            "final_facts": result.final_facts,
+            "steps": result.step_count,
+        },
+        "graphs": {"fpg": None, "rpg": None},
+    }
+    _save_result(session_id, response)
+    return {
+        "done": True,
+        "result_url": url_for("medical.results", session_id=session_id),
+        "summary": {"label": disease_label, "severity": severity},
+    }
+
+
 def _generate_symptom_based_recommendation(
     input_facts: Set[str], final_facts: List[str], analysis: Dict[str, Any]
 ) -> str:
@@ -515,116 +606,135 @@ def interview():
     )
 
 
+_interview_store = None
+_interview_store_lock = threading.Lock()
+
+
+def _interview_sessions() -> Any:
+    """In-memory interview sessions (created on first use)."""
+    global _interview_store
+    with _interview_store_lock:
+        if _interview_store is None:
+            _interview_store = InterviewSessionStore(
+                ttl=current_app.config.get("INTERVIEW_SESSION_TTL", 1800),
+                max_sessions=current_app.config.get("INTERVIEW_MAX_SESSIONS", 1000),
+            )
+        return _interview_store
+
+
 @medical_bp.post("/api/next_question")
 def api_next_question():
-    """Return the next interview question or conclude with a result when ready."""
+    """Return the next interview question or conclude with a result when ready.
+
+    Body: ``{"answers": {...}}`` starts an interview (the full answers, if
+    any); ``{"interview_id": ..., "delta": {...}}`` then sends only the new
+    answers. An unknown or expired id gets ``409`` with ``expired: true``
+    so the client can start over with its full answers.
+    """
     payload = request.get_json(silent=True) or {}
-    answers: Dict[str, Any] = payload.get("answers") or {}
+    if not isinstance(payload, dict):
+        return jsonify({"ok": False, "error": "Dữ liệu gửi lên phải là object JSON."}), 400
+    answers = payload.get("answers") or {}
+    delta = payload.get("delta") or {}
+    if not isinstance(answers, dict) or not isinstance(delta, dict):
+        return (
+            jsonify({"ok": False, "error": "Trường 'answers' và 'delta' phải là object JSON."}),
+            400,
+        )
+    interview_id = payload.get("interview_id")
+    if interview_id is not None and not isinstance(interview_id, str):
+        return jsonify({"ok": False, "error": "Trường 'interview_id' phải là chuỗi."}), 400
+
+    if InterviewSessionStore is None:
+        try:
+            kb = get_sinusitis_kb()
+        except Exception as e:
+            return jsonify({"ok": False, "error": str(e)}), 500
+        return _interview_step(kb, answers, None, None)
+
+    store = _interview_sessions()
+    if interview_id:
+        state = store.get(interview_id)
+        if state is None:
+            return (
+                jsonify(
+                    {
+                        "ok": False,
+                        "expired": True,
+                        "error": "Phiên phỏng vấn đã hết hạn, vui lòng gửi lại toàn bộ câu trả lời.",
+                    }
+                ),
+                409,
+            )
+        with state.lock:
+            state.apply(delta)
+            return _interview_step(state.kb, state.answers, state, interview_id)
 
     try:
         kb = get_sinusitis_kb()
+        interview_id, state = store.create(kb, answers)
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
+    with state.lock:
+        return _interview_step(kb, state.answers, state, interview_id)
+
+
+def _interview_step(
+    kb: Any, answers: Dict[str, Any], state: Any, interview_id: str | None
+) -> Any:
+    """Conclude early, ask the next question or finalize the interview.
+
+    Facts are extracted once and the forward inference over them runs at
+    most once (see ``_interview_inference``), whichever branch is taken.
+    """
+    if state is not None:
+        facts = state.facts
+    elif extract_facts_from_form is not None:
+        try:
+            facts = extract_facts_from_form(answers, kb)
+        except Exception:
+            facts = None
+    else:
+        facts = None
+    selector = _question_selector(kb, state)
 
     # Try early conclusion only when a concrete disease is inferred
-    early = _try_early_stop(kb, answers)
+    early = _try_early_stop(kb, answers, state, selector, facts)
     if early:
-        return jsonify({"ok": True, "done": True, **early})
+        if interview_id:
+            _interview_sessions().discard(interview_id)
+        return jsonify({"ok": True, **early})
 
     # Otherwise, serve the next question (dynamic by KB, with fallback)
-    q = _choose_next_question_dynamic(kb, answers)
+    q = _choose_next_question_dynamic(kb, answers, facts, selector)
     if q:
         question_payload = {
             k: v
             for k, v in q.items()
             if k in {"id", "variable", "type", "label", "options", "min", "max", "step"}
         }
-        return jsonify({"ok": True, "done": False, "question": question_payload})
+        return jsonify(
+            {
+                "ok": True,
+                "done": False,
+                "interview_id": interview_id,
+                "question": question_payload,
+            }
+        )
 
     # No more questions; finalize regardless of outcome
     try:
-        if extract_facts_from_form is None:
+        if facts is None:
             return jsonify({"ok": False, "error": "Fact extraction not available"}), 500
 
-        facts = extract_facts_from_form(answers, kb)
-        goals = [d["variable"] for d in kb.get_diseases()]
-        result = run_forward_inference(
-            kb.kb,
-            initial_facts=facts,
-            goals=goals,
-            strategy="stack",
-            index_mode="min",
-            make_graphs=False,
-        )
-
-        priority_order = [
-            "nguy_co_bien_chung",
-            "viem_xoang_do_nam",
-            "viem_xoang_cap_do_vi_khuan",
-            "viem_xoang_tai_phat",
-            "viem_xoang_man_tinh",
-            "viem_xoang_cap_do_virus",
-            "viem_xoang_cap",
-            "khong_phai_viem_xoang",
-        ]
+        if interview_id:
+            _interview_sessions().discard(interview_id)
+        final_facts = _interview_inference(kb, facts).final_facts
         diagnosed = next(
-            (d for d in priority_order if d in result.final_facts),
+            (d for d in DIAGNOSIS_PRIORITY if d in final_facts),
             "khong_phai_viem_xoang",
         )
-
-        disease_info = kb.get_disease_info(diagnosed)
-        recommendation = kb.get_recommendation(diagnosed)
-        severity_map = {
-            "Mild": "low",
-            "Moderate": "medium",
-            "Severe": "high",
-            "Critical": "critical",
-            "Info": "info",
-        }
-        disease_label = (
-            disease_info.get("label", "Không xác định") if disease_info else diagnosed
-        )
-        severity_raw = (
-            disease_info.get("severity", "Unknown") if disease_info else "Unknown"
-        )
-        severity = severity_map.get(severity_raw, "low")
-
-        session_id = uuid4().hex
-        output_root = Path(
-            current_app.config.get("GRAPH_OUTPUT_ROOT", "web/static/generated")
-        )
-        output_dir = output_root / session_id
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        response = {
-            "ok": True,
-            "session_id": session_id,
-            "diagnosis": {
-                "disease": diagnosed,
-                "disease_label": disease_label,
-                "severity": severity,
-                "severity_raw": severity_raw,
-                "confidence": 100 if result.success else 0,
-                "success": result.success,
-            },
-            "symptoms": {"input": answers, "extracted_facts": list(facts)},
-            "recommendation": recommendation,
-            "inference": {
-                "fired_rules": result.fired_rules,
-                "final_facts": result.final_facts,
-                "steps": len(result.history),
-            },
-            "graphs": {"fpg": None, "rpg": None},
-        }
-        _save_result(session_id, response)
-        return jsonify(
-            {
-                "ok": True,
-                "done": True,
-                "result_url": url_for("medical.results", session_id=session_id),
-                "summary": {"label": disease_label, "severity": severity},
-            }
-        )
+        return jsonify({"ok": True, **_save_interview_result(kb, answers, facts, diagnosed)})
     except Exception as e:
         return jsonify({"ok": False, "error": f"Finalize error: {e}"}), 500
 
@@ -37,6 +37,12 @@
         sources: {},
     };
 
+    const GRAPH_POLL_INTERVAL = 500;
+    const GRAPH_POLL_LIMIT = 240;
+
+    // Incremented per run so a stale poll never overwrites newer graphs.
+    let graphPollToken = 0;
+
     let rulesState = [];
 
     function safeParseJson(raw, fallback) {
@@ -158,6 +164,7 @@
     }
 
     function clearResults() {
+        graphPollToken += 1;
         summaryBadges.innerHTML = "";
         forwardResult.hidden = true;
         backwardResult.hidden = true;
@@ -277,7 +284,51 @@
             renderBackwardSteps(result.steps);
         }
 
-        configureGraphTabs(data.mode, result.graphs || {});
+        graphPollToken += 1;
+        if (result.graphJob) {
+            showGraphPlaceholder("Đang vẽ đồ thị...");
+            pollGraphJob(data.mode, result.graphJob.statusUrl, graphPollToken);
+        } else if (result.graphNote) {
+            showGraphPlaceholder(result.graphNote);
+        } else {
+            configureGraphTabs(data.mode, result.graphs || {});
+        }
+    }
+
+    async function pollGraphJob(mode, statusUrl, token) {
+        for (let attempt = 0; attempt < GRAPH_POLL_LIMIT; attempt += 1) {
+            await new Promise((resolve) => setTimeout(resolve, GRAPH_POLL_INTERVAL));
+            if (token !== graphPollToken) {
+                return;
+            }
+            let data;
+            try {
+                const response = await fetch(statusUrl);
+                data = await response.json();
+                if (!response.ok || !data.ok) {
+                    throw new Error(data.error || "Không thể lấy đồ thị.");
+                }
+            } catch (error) {
+                if (token === graphPollToken) {
+                    showGraphPlaceholder(error.message || "Không thể lấy đồ thị.");
+                }
+                return;
+            }
+            if (token !== graphPollToken) {
+                return;
+            }
+            if (data.status === "done") {
+                configureGraphTabs(mode, data.graphs || {});
+                return;
+            }
+            if (data.status === "failed" || data.status === "cancelled") {
+                showGraphPlaceholder(data.error ? `Không vẽ được đồ thị: ${data.error}` : "Không vẽ được đồ thị.");
+                return;
+            }
+        }
+        if (token === graphPollToken) {
+            showGraphPlaceholder("Quá thời gian chờ vẽ đồ thị.");
+        }
     }
 
     function renderSummaryBadges(mode, result) {
@@ -2,6 +2,9 @@
     const chat = document.getElementById('chat');
     const controls = document.getElementById('controls');
     let answers = {};
+    // Phiên phỏng vấn phía server: sau câu đầu chỉ gửi câu trả lời mới (delta)
+    let interviewId = null;
+    let pending = {};
 
     function appendBot(text) {
         const el = document.createElement('div');
@@ -71,13 +74,28 @@
         }
     }
 
-    async function fetchNext() {
+    async function postNext(body) {
         const res = await fetch('/sinusitis/api/next_question', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ answers })
+            body: JSON.stringify(body)
         });
-        const data = await res.json();
+        return res.json();
+    }
+
+    async function fetchNext() {
+        let data = interviewId
+            ? await postNext({ interview_id: interviewId, delta: pending })
+            : await postNext({ answers });
+        if (data.expired) {
+            // Phiên đã hết hạn: bắt đầu phiên mới với toàn bộ câu trả lời
+            interviewId = null;
+            data = await postNext({ answers });
+        }
+        pending = {};
+        if (data.interview_id) {
+            interviewId = data.interview_id;
+        }
 
         if (!data.ok) {
             appendBot('Xin lỗi, hiện tại hệ thống chưa đủ dữ liệu để đưa ra nhận định an toàn. Bạn nên trao đổi trực tiếp với bác sĩ để được thăm khám đầy đủ hơn.');
@@ -101,6 +119,7 @@
     function submitAnswer(q, value, rendered) {
         appendUser(rendered);
         answers[q.variable] = value;
+        pending[q.variable] = value;
         fetchNext();
     }
 